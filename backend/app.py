@@ -7,10 +7,23 @@ import csv
 import subprocess
 import platform
 import base64
+import json
 import shutil
+import re
 import time
 import threading
+from functools import wraps
 from scanner import DirectoryScanner
+from catalog import CollectionCatalog
+from listing_cache import ListingCache
+from watcher import CollectionWatcher
+from search_index import TrigramIndex, relevance
+from ingest_plan import PlanStore
+from batch_planner import BatchPlanner
+from copy_engine import INCREMENTAL_MODES
+from copy_executor import CopyTask, SKIPPED
+from tree_copy import TreeCopier, TreeCopyProgress
+from jobs import JobRegistry, JobCancelled, CANCELLED_MESSAGE, FINISHED_STATES
 
 # Determinar el directorio base (donde está app.py = backend/)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -27,16 +40,52 @@ CONFIG = {
     'TEMP_PATH': os.environ.get('ZX_TEMP_PATH', r'c:\ZX\TEMP'),
     'TS_TOSEC_SUBPATH': os.environ.get('ZX_TS_TOSEC_SUBPATH', 'TOSEC_v41'),
     'BACKUP_PATH': os.environ.get('ZX_BACKUP_PATH', r'C:\ZX\Backups'),
-    'UPDATES_TOSEC_PATH': os.environ.get('ZX_UPDATES_TOSEC_PATH', r'C:\ZX\UPDATES_TOSEC')
+    'UPDATES_TOSEC_PATH': os.environ.get('ZX_UPDATES_TOSEC_PATH', r'C:\ZX\UPDATES_TOSEC'),
+    'CATALOG_PATH': os.environ.get('ZX_CATALOG_PATH', os.path.join(BASE_DIR, 'zx_catalog.db')),
+    'CACHE_MAX_ENTRIES': int(os.environ.get('ZX_CACHE_MAX_ENTRIES', '50000')),
+    # Hilos para los recorridos completos del árbol (1 = en serie)
+    'WALK_WORKERS': int(os.environ.get('ZX_WALK_WORKERS', '4')),
+    # Carpeta de juego existente: 'exact' (nombre idéntico) o 'loose' (ignora acentos y puntuación)
+    'GAME_FOLDER_MATCH': os.environ.get('ZX_GAME_FOLDER_MATCH', 'exact'),
+    # Planificación de TEMP en varios procesos a partir de PLAN_PROCESS_THRESHOLD archivos (1 = siempre en serie)
+    'PLAN_WORKERS': int(os.environ.get('ZX_PLAN_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    'PLAN_PROCESS_THRESHOLD': int(os.environ.get('ZX_PLAN_PROCESS_THRESHOLD', '5000')),
+    # Copias en paralelo: hilos del ejecutor y escrituras simultáneas como máximo por dispositivo destino
+    'COPY_WORKERS': int(os.environ.get('ZX_COPY_WORKERS', '8')),
+    'COPY_PER_DEVICE': int(os.environ.get('ZX_COPY_PER_DEVICE', '4')),
+    # Destinos repetidos de un mismo archivo en un dispositivo: 'copy', 'hardlink' o 'reflink' (ver copy_executor)
+    'PLACEMENT_MODE': os.environ.get('ZX_PLACEMENT_MODE', 'copy'),
+    # Copias reales de un archivo a varios destinos leyendo el origen una sola vez (0 = copy2 por destino)
+    'COPY_FANOUT': os.environ.get('ZX_COPY_FANOUT', '1') != '0',
+    # Motor de copia: copy_file_range/sendfile (0 = solo búfer), tamaño del búfer y preasignación del destino
+    'COPY_ZERO_COPY': os.environ.get('ZX_COPY_ZERO_COPY', '1') != '0',
+    'COPY_BUFFER_SIZE': int(os.environ.get('ZX_COPY_BUFFER_KB', '1024')) * 1024,
+    'COPY_PREALLOCATE': os.environ.get('ZX_COPY_PREALLOCATE', '0') == '1',
+    # Copia incremental por defecto de /api/copy-folder y multicopy: 'off', 'mtime' (tamaño + fecha) o 'hash'
+    'INCREMENTAL_COPY': os.environ.get('ZX_INCREMENTAL_COPY', 'off'),
+    # Margen en segundos al comparar fechas (2 para destinos FAT/exFAT; 0 = fecha exacta)
+    'COPY_MTIME_WINDOW': float(os.environ.get('ZX_COPY_MTIME_WINDOW', '0')),
+    # Vigilancia de cambios externos: 'off', 'auto' (inotify en Linux, si no sondeo), 'inotify' o 'poll'
+    'WATCH_MODE': os.environ.get('ZX_WATCH', 'off'),
+    'WATCH_POLL_INTERVAL': float(os.environ.get('ZX_WATCH_POLL_INTERVAL', '10')),
+    # Trabajos en segundo plano terminados que se conservan para consultar su resultado
+    'JOBS_KEEP': int(os.environ.get('ZX_JOBS_KEEP', '50')),
+    # Intervalo mínimo en segundos entre eventos de progreso de /api/jobs/events (se funden los intermedios)
+    'EVENTS_INTERVAL': float(os.environ.get('ZX_EVENTS_INTERVAL', '0.25')),
+    # Servidor: 'dev' (app.run con debug y recargador) o 'production' (server.py, pool de hilos)
+    'SERVER': os.environ.get('ZX_SERVER', 'dev'),
+    'HOST': os.environ.get('ZX_HOST', '0.0.0.0'),
+    'PORT': int(os.environ.get('ZX_PORT', '5000')),
+    # Hilos que atienden peticiones en modo production (cada flujo de eventos abierto ocupa uno)
+    'SERVER_THREADS': int(os.environ.get('ZX_SERVER_THREADS', '16'))
 }
 
-cache = {'FE': None, 'TS': None, 'TEMP': None, 'stats': None}
-scanner = DirectoryScanner(CONFIG)
-
-# Estado global para compresión
-compress_status = {'running': False, 'progress': '', 'percent': 0, 'done': False, 'error': None}
-compress_cancel_flag = False
-compress_process = None
+def response_payload(rv):
+    """(JSON, código HTTP) de lo que devuelve un endpoint: jsonify(...) o (jsonify(...), código)"""
+    response, status = rv if isinstance(rv, tuple) else (rv, None)
+    if isinstance(response, Response):
+        return response.get_json(), status or response.status_code
+    return response, status or 200
 
 def get_collection_base_path(collection):
     if collection == 'FE':
@@ -47,6 +96,161 @@ def get_collection_base_path(collection):
         return CONFIG.get('UPDATES_TOSEC_PATH', r'C:\ZX\UPDATES_TOSEC')
     return None
 
+def notify_changes(paths, recursive=False):
+    """Mantiene catálogo y conteos al día tras una operación de escritura de la aplicación"""
+    scanner.notify_changes(paths, recursive=recursive)
+
+# Colecciones que guarda el catálogo
+CATALOG_COLLECTIONS = ['FE', 'TS', 'UPD']
+
+# Servicios de la aplicación. Importar este archivo no los crea: batch_planner reparte la
+# planificación entre procesos 'spawn', que vuelven a importar el script principal, y en
+# ellos no se debe abrir el catálogo ni crear escáner, índice, vigilante o trabajos. Los crea
+# init_services() al arrancar el servidor (__main__) o quien sirva 'app' por su cuenta.
+cache = scanner = catalog = search_index = watcher = jobs = plans = planner = tree_copier = None
+
+def init_services():
+    """Crea caché, escáner, catálogo, índice, vigilante, trabajos y planificador (una sola vez)"""
+    global cache, scanner, catalog, search_index, watcher, jobs, plans, planner, tree_copier
+    if scanner is not None:
+        return
+    # Caché LRU de listados y conteos por ruta (invalidación dirigida con notify_changes)
+    cache = ListingCache(CONFIG['CACHE_MAX_ENTRIES'])
+    scanner = DirectoryScanner(CONFIG, cache=cache)
+
+    # Catálogo persistente de FE, TS y UPDATES_TOSEC (se construye con /api/catalog/rebuild)
+    catalog = CollectionCatalog(CONFIG['CATALOG_PATH'], scanner._parse_tosec_filename, DirectoryScanner.VALID_EXTENSIONS,
+                                walker=scanner.walker)
+    scanner.catalog = catalog
+    # Índice de trigramas de /api/search (se construye en segundo plano la primera vez que se usa)
+    search_index = TrigramIndex(scanner.walker, scanner._parse_tosec_filename, DirectoryScanner.FILE_TYPES)
+    scanner.search_index = search_index
+
+    # Vigilante opcional de las raíces (se arranca en __main__ si WATCH_MODE != 'off')
+    watcher = CollectionWatcher(
+        scanner,
+        [CONFIG['FE_PATH'], os.path.join(CONFIG['TS_PATH'], CONFIG['TS_TOSEC_SUBPATH']),
+         CONFIG['TEMP_PATH'], CONFIG['UPDATES_TOSEC_PATH']],
+        mode=CONFIG['WATCH_MODE'],
+        poll_interval=CONFIG['WATCH_POLL_INTERVAL']
+    )
+
+    # Trabajos en segundo plano: copias de TEMP, paquetes de actualización, copia de carpetas,
+    # multicopia, búsqueda y compresión (varios a la vez, cada uno con su progreso)
+    jobs = JobRegistry(CONFIG['JOBS_KEEP'], context=app.app_context, result=response_payload)
+
+    # Planes de ingesta de TEMP calculados en la previsualización y ejecutados por copy/generate
+    plans = PlanStore()
+    planner = BatchPlanner(scanner, CONFIG['PLAN_WORKERS'], CONFIG['PLAN_PROCESS_THRESHOLD'])
+    # Copia de carpetas: esqueleto de carpetas de una pasada y archivos en paralelo por tamaño
+    tree_copier = TreeCopier(scanner.copier.engine, CONFIG['COPY_WORKERS'], scanner.walker)
+
+def plan_preview_response(plan, target_collection):
+    """Respuesta de previsualización a partir de un plan (misma forma que antes + plan_id y huella)"""
+    files_preview = []
+    for f in plan.files:
+        paths_for_collection = f['suggested_paths'].get(target_collection, [])
+        item = {
+            'filename': f['filename'],
+            'tosec_info': f['tosec_info'],
+            'dest_paths': paths_for_collection,
+            'has_destinations': len(paths_for_collection) > 0
+        }
+        if f['error']:
+            item['error'] = f['error']
+        files_preview.append(item)
+    return jsonify({
+        'success': True,
+        'files': files_preview,
+        'target_collection': target_collection,
+        'total_files': len(files_preview),
+        'plan_id': plan.id,
+        'fingerprint': plan.fingerprint
+    })
+
+def resolve_plan(data, temp_path, target_collection, job=None):
+    """
+    Plan a ejecutar: el de la previsualización si llega 'plan_id' (rechazado si TEMP o las carpetas
+    destino cambiaron desde entonces) o uno nuevo si no. Devuelve (plan, respuesta_de_error).
+    """
+    plan_id = data.get('plan_id')
+    if not plan_id:
+        if job:
+            job.set_phase('planning', 'Calculando destinos...')
+        return planner.plan(temp_path), None
+    plan = plans.get(plan_id)
+    if plan is None:
+        return None, (jsonify({'success': False, 'stale': True,
+                               'error': 'Plan no encontrado o caducado: vuelve a previsualizar'}), 404)
+    reason = plan.check(get_collection_base_path(target_collection))
+    if reason:
+        plans.discard(plan_id)
+        print(f"[PLAN] Plan {plan_id} rechazado: {reason}")
+        return None, (jsonify({'success': False, 'stale': True,
+                               'error': f'El plan ya no es válido ({reason}): vuelve a previsualizar'}), 409)
+    return plan, None
+
+def copy_plan_files(plan, temp_path, base_path, target_collection, job=None):
+    """
+    Copia los archivos del plan a sus destinos de 'target_collection' bajo 'base_path' con el
+    ejecutor compartido (en paralelo entre archivos y destinos). Devuelve, en el orden del plan,
+    (archivo, destinos_copiados, [(destino, error)...], error_del_plan) por cada archivo, y el
+    resumen del lote (copias, enlaces, bytes y tiempo ahorrados). 'job' recibe el progreso.
+    """
+    tasks = []
+    for i, f in enumerate(plan.files):
+        if f['error']:
+            continue
+        for dest_subpath in f['suggested_paths'].get(target_collection, []):
+            tasks.append(CopyTask(os.path.join(temp_path, f['filename']), os.path.join(base_path, dest_subpath), (i, dest_subpath)))
+    copied = {}
+    failed = {}
+    if job:
+        job.set_phase('copying', f'Copiando {len(tasks)} destinos...')
+    copy_results = scanner.copier.run(tasks, progress=job)
+    for result in copy_results:
+        i, dest_subpath = result.task.tag
+        if result.ok:
+            copied.setdefault(i, []).append(dest_subpath)
+        else:
+            failed.setdefault(i, []).append((dest_subpath, result.error))
+    notify_changes([os.path.join(base_path, p) for paths in copied.values() for p in paths])
+    copies = [(f['filename'], copied.get(i, []), failed.get(i, []), f['error']) for i, f in enumerate(plan.files)]
+    return copies, scanner.copier.summary(copy_results)
+
+def incremental_mode(data):
+    """Modo de copia incremental de la petición ('incremental') o el de la configuración; None si no es válido"""
+    mode = data.get('incremental', CONFIG['INCREMENTAL_COPY'])
+    if mode is True:
+        mode = 'mtime'
+    elif mode is False or mode is None:
+        mode = 'off'
+    return mode if mode in INCREMENTAL_MODES else None
+
+def with_batch_snapshot(view):
+    """Los endpoints que sugieren destinos para todo TEMP listan cada carpeta destino una sola vez"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with scanner.batch_snapshot():
+            return view(*args, **kwargs)
+    return wrapper
+
+def wants_background(value):
+    return value in (True, 1, '1', 'true')
+
+def job_response(data, kind, description, work):
+    """
+    Con 'background' en la petición lanza work(job) como trabajo y responde 202 con su id
+    (progreso en /api/jobs/<id>, respuesta final en /api/jobs/<id>/result); si no, lo ejecuta
+    en esta petición (registrado igualmente: se ve su progreso y se puede cancelar).
+    """
+    if wants_background(data.get('background')):
+        job = jobs.submit(kind, description, work)
+        return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}',
+                        'result_url': f'/api/jobs/{job.id}/result'}), 202
+    job = jobs.run(kind, description, work)
+    return jsonify(job.result), job.status_code
+
 @app.route('/')
 def index():
     return send_from_directory(FRONTEND_DIR, 'index.html')
@@ -72,7 +276,6 @@ def scan_collection(collection):
         return jsonify({'error': f'La ruta {path} no existe'}), 404
     try:
         structure = scanner.scan_root_folders(path, max_depth=3)
-        cache[collection] = structure
         return jsonify(structure)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -110,8 +313,11 @@ def scan_temp():
     if not os.path.exists(CONFIG['TEMP_PATH']):
         return jsonify({'error': 'La carpeta TEMP no existe'}), 404
     try:
-        files = scanner.scan_temp_files(CONFIG['TEMP_PATH'])
-        cache['TEMP'] = files
+        # El escaneo deja un plan: /api/temp/copy puede ejecutarlo con su plan_id
+        plan = plans.put(planner.plan(CONFIG['TEMP_PATH']))
+        files = scanner.scan_temp_files(CONFIG['TEMP_PATH'], plan)
+        if 'error' not in files:
+            files['plan_id'] = plan.id
         return jsonify(files)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -121,6 +327,7 @@ def preview_temp_copy():
     """
     Muestra vista previa de los destinos antes de copiar a FE/TS real.
     Solo procesa archivos TOSEC válidos (sin .zip, .rar, etc.)
+    Devuelve un plan_id: /api/temp/copy con ese plan_id copia exactamente lo previsualizado.
     """
     data = request.get_json()
     target_collection = data.get('target_collection', 'TS')
@@ -129,44 +336,45 @@ def preview_temp_copy():
     if not temp_path or not os.path.exists(temp_path):
         return jsonify({'success': False, 'error': 'Carpeta TEMP no existe'})
     
-    files_preview = []
+    plan = plans.put(planner.plan(temp_path))
+    return plan_preview_response(plan, target_collection)
+
+@app.route('/api/temp/plan', methods=['POST'])
+def plan_temp():
+    """
+    Planifica TEMP (en varios procesos si es muy grande). Con stream=true devuelve NDJSON:
+    una línea por archivo según se planifica (con 'index', su posición en el listado) y una
+    última línea {'done': true, 'plan_id', 'fingerprint', 'total_files'}. Sin stream, igual
+    que /api/temp/preview.
+    """
+    data = request.get_json() or {}
+    target_collection = data.get('target_collection', 'TS')
     
-    for filename in os.listdir(temp_path):
-        file_path = os.path.join(temp_path, filename)
-        if not os.path.isfile(file_path):
-            continue
-        
-        ext = os.path.splitext(filename)[1].lower()
-        # Solo procesar archivos TOSEC válidos (sin .zip ni otros comprimidos)
-        if ext not in scanner.TOSEC_EXTENSIONS:
-            continue
-        
-        try:
-            tosec_info = scanner._parse_tosec_filename(filename)
-            suggested_paths = scanner._suggest_destination(tosec_info, ext, filename)
-            paths_for_collection = suggested_paths.get(target_collection, [])
-            
-            files_preview.append({
-                'filename': filename,
-                'tosec_info': tosec_info,
-                'dest_paths': paths_for_collection,
-                'has_destinations': len(paths_for_collection) > 0
-            })
-        except Exception as e:
-            files_preview.append({
-                'filename': filename,
-                'tosec_info': None,
-                'dest_paths': [],
-                'has_destinations': False,
-                'error': str(e)
-            })
+    temp_path = CONFIG.get('TEMP_PATH', '')
+    if not temp_path or not os.path.exists(temp_path):
+        return jsonify({'success': False, 'error': 'Carpeta TEMP no existe'})
     
-    return jsonify({
-        'success': True,
-        'files': files_preview,
-        'target_collection': target_collection,
-        'total_files': len(files_preview)
-    })
+    if not data.get('stream'):
+        plan = plans.put(planner.plan(temp_path))
+        return plan_preview_response(plan, target_collection)
+    
+    def generate():
+        for kind, index, value in planner.iter_plan(temp_path):
+            if kind == 'file':
+                paths_for_collection = value['suggested_paths'].get(target_collection, [])
+                yield json.dumps({
+                    'index': index,
+                    'filename': value['filename'],
+                    'tosec_info': value['tosec_info'],
+                    'dest_paths': paths_for_collection,
+                    'has_destinations': len(paths_for_collection) > 0,
+                    'error': value['error']
+                }, ensure_ascii=False) + '\n'
+            else:
+                plan = plans.put(value)
+                yield json.dumps({'done': True, 'plan_id': plan.id, 'fingerprint': plan.fingerprint,
+                                  'total_files': index, 'target_collection': target_collection}) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
 
 @app.route('/api/temp/delete', methods=['POST'])
 def delete_temp_file():
@@ -177,7 +385,7 @@ def delete_temp_file():
     try:
         result = scanner.delete_temp_file(filename)
         if result['success']:
-            cache['TEMP'] = None
+            notify_changes([os.path.join(CONFIG['TEMP_PATH'], filename)])
             return jsonify(result)
         return jsonify(result), 400
     except Exception as e:
@@ -188,8 +396,15 @@ def copy_temp_to_collection():
     """
     Copia archivos de TEMP a FE/TS usando las rutas sugeridas.
     Solo procesa archivos TOSEC válidos (sin .zip, .rar, etc.)
+    Con 'plan_id' ejecuta el plan de la previsualización sin recalcular destinos.
+    Con 'background': true responde al momento con un job_id (ver /api/jobs).
     """
     data = request.get_json()
+    return job_response(data, 'temp-copy', f"TEMP -> {data.get('target_collection', 'TS')}",
+                        lambda job: temp_copy_job(data, job))
+
+@with_batch_snapshot
+def temp_copy_job(data, job):
     target_collection = data.get('target_collection', 'TS')
     
     temp_path = CONFIG.get('TEMP_PATH', '')
@@ -200,60 +415,43 @@ def copy_temp_to_collection():
     if not base_path:
         return jsonify({'success': False, 'error': f'Colección {target_collection} no configurada'})
     
+    plan, error_response = resolve_plan(data, temp_path, target_collection, job)
+    if error_response:
+        return error_response
+    
     results = []
     
-    for filename in os.listdir(temp_path):
-        file_path = os.path.join(temp_path, filename)
-        if not os.path.isfile(file_path):
-            continue
-        
-        ext = os.path.splitext(filename)[1].lower()
-        # Solo procesar archivos TOSEC válidos (sin .zip ni otros comprimidos)
-        if ext not in scanner.TOSEC_EXTENSIONS:
-            continue
-        
-        try:
-            tosec_info = scanner._parse_tosec_filename(filename)
-            suggested_paths = scanner._suggest_destination(tosec_info, ext, filename)
-            paths_for_collection = suggested_paths.get(target_collection, [])
-            
-            if not paths_for_collection:
-                results.append({
-                    'filename': filename,
-                    'success': False,
-                    'error': 'Sin destinos sugeridos'
-                })
-                continue
-            
-            copied_to = []
-            for dest_subpath in paths_for_collection:
-                full_dest = os.path.join(base_path, dest_subpath)
-                os.makedirs(os.path.dirname(full_dest), exist_ok=True)
-                shutil.copy2(file_path, full_dest)
-                copied_to.append(dest_subpath)
-            
+    # Todas las copias del lote en paralelo; las respuestas se montan por archivo en el orden del plan
+    copies, placement = copy_plan_files(plan, temp_path, base_path, target_collection, job)
+    for filename, copied_to, errors, plan_error in copies:
+        if plan_error or errors:
             results.append({
                 'filename': filename,
-                'success': True,
-                'dest_paths': copied_to
+                'success': False,
+                'error': plan_error or errors[0][1]
             })
-            
-        except Exception as e:
+        elif not copied_to:
             results.append({
                 'filename': filename,
                 'success': False,
-                'error': str(e)
+                'error': 'Sin destinos sugeridos'
+            })
+        else:
+            results.append({
+                'filename': filename,
+                'success': True,
+                'dest_paths': copied_to
             })
     
-    # Invalidar caches
-    cache['FE'] = None
-    cache['TS'] = None
+    # Las carpetas destino ya cambiaron: el plan no se puede volver a usar
+    plans.discard(plan.id)
     
     return jsonify({
         'success': True,
         'results': results,
         'total': len(results),
-        'copied': sum(1 for r in results if r.get('success'))
+        'copied': sum(1 for r in results if r.get('success')),
+        'placement': placement
     })
 
 @app.route('/api/open-file', methods=['POST'])
@@ -301,10 +499,8 @@ def copy_between_collections():
         dest_full = os.path.join(dest_base, dest_folder, filename) if dest_folder else os.path.join(dest_base, filename)
         
         os.makedirs(os.path.dirname(dest_full), exist_ok=True)
-        shutil.copy2(source_path, dest_full)
-        
-        cache['FE'] = None
-        cache['TS'] = None
+        scanner.copier.engine.copy(source_path, dest_full)
+        notify_changes([dest_full])
         
         return jsonify({'success': True, 'message': f'Copiado: {filename}'})
     except Exception as e:
@@ -312,7 +508,10 @@ def copy_between_collections():
 
 @app.route('/api/copy-folder', methods=['POST'])
 def copy_folder_between_collections():
-    """Copia una carpeta completa entre colecciones"""
+    """
+    Copia una carpeta completa entre colecciones (progreso en /api/copy-folder/status).
+    Con 'background': true responde al momento con un job_id (ver /api/jobs).
+    """
     data = request.get_json()
     source_path = data.get('source_path')
     dest_collection = data.get('dest_collection')
@@ -321,50 +520,78 @@ def copy_folder_between_collections():
     
     if not source_path or not dest_collection or not os.path.isdir(source_path):
         return jsonify({'error': 'Parámetros inválidos o carpeta no existe'}), 400
+    incremental = incremental_mode(data)
+    if incremental is None:
+        return jsonify({'error': f"Modo incremental inválido (válidos: {', '.join(INCREMENTAL_MODES)})"}), 400
+    
+    dest_base = get_collection_base_path(dest_collection)
+    if not dest_base:
+        return jsonify({'error': f'Colección {dest_collection} no configurada'}), 400
     
+    # Construir ruta destino
+    if dest_folder:
+        dest_full = os.path.join(dest_base, dest_folder, folder_name)
+    else:
+        dest_full = os.path.join(dest_base, folder_name)
+    
+    return job_response(data, 'copy-folder', f'{folder_name} -> {dest_collection}',
+                        lambda job: copy_folder_job(job, source_path, dest_full, folder_name, incremental))
+
+def copy_folder_job(job, source_path, dest_full, folder_name, incremental):
     try:
-        dest_base = get_collection_base_path(dest_collection)
-        if not dest_base:
-            return jsonify({'error': f'Colección {dest_collection} no configurada'}), 400
+        # Si ya existe se sobrescribe su contenido (en modo incremental, solo lo nuevo o cambiado)
+        progress = TreeCopyProgress(source_path, dest_full, job)
+        job.details = progress.snapshot
+        tree_copier.copy(source_path, dest_full, incremental, progress)
+        result = progress.snapshot()
+        print(f"[COPY] {folder_name}: {result['files_copied']} copiados, {result['files_skipped']} sin cambios, "
+              f"{result['files_failed']} errores en {result['elapsed']:.2f}s")
         
-        # Construir ruta destino
-        if dest_folder:
-            dest_full = os.path.join(dest_base, dest_folder, folder_name)
-        else:
-            dest_full = os.path.join(dest_base, folder_name)
+        notify_changes([dest_full], recursive=True)
         
-        # Si ya existe, sobrescribir contenido
-        if os.path.exists(dest_full):
-            # Copiar sobrescribiendo archivos existentes
-            files_copied = 0
-            for root, dirs, files in os.walk(source_path):
-                rel_path = os.path.relpath(root, source_path)
-                dest_dir = os.path.join(dest_full, rel_path) if rel_path != '.' else dest_full
-                os.makedirs(dest_dir, exist_ok=True)
-                
-                for file in files:
-                    src_file = os.path.join(root, file)
-                    dst_file = os.path.join(dest_dir, file)
-                    shutil.copy2(src_file, dst_file)  # Siempre sobrescribe
-                    files_copied += 1
-        else:
-            # Copiar carpeta completa
-            shutil.copytree(source_path, dest_full)
-            files_copied = sum(len(files) for _, _, files in os.walk(dest_full))
+        if result['cancelled']:
+            return jsonify({
+                'success': False,
+                'cancelled': True,
+                'error': f"{CANCELLED_MESSAGE} ({result['files_done']} de {result['files_total']} archivos)",
+                'files_copied': result['files_copied'],
+                'files_skipped': result['files_skipped'],
+                'files_failed': result['files_failed']
+            }), 409
         
-        cache['FE'] = None
-        cache['TS'] = None
+        if result['files_failed']:
+            first = result['errors'][0]
+            return jsonify({
+                'error': f"{result['files_failed']} archivos no se pudieron copiar ({first['file']}: {first['error']})",
+                'files_copied': result['files_copied'],
+                'files_failed': result['files_failed'],
+                'errors': result['errors']
+            }), 500
         
         return jsonify({
             'success': True, 
             'message': f'Carpeta copiada: {folder_name}',
-            'files_copied': files_copied
+            'files_copied': result['files_copied'],
+            'files_skipped': result['files_skipped'],
+            'bytes_saved': result['bytes_saved']
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/copy-folder/status')
+def copy_folder_status():
+    """Progreso de la última copia de carpeta (o de 'job_id'): archivos, bytes, velocidad y ETA"""
+    job_id = request.args.get('job_id')
+    job = jobs.get(job_id) if job_id else jobs.latest('copy-folder')
+    if job is None or job.details is None:
+        return jsonify({'running': False, 'phase': 'idle'})
+    status = job.details()
+    status['job_id'] = job.id
+    return jsonify(status)
+
 @app.route('/api/multicopy/execute', methods=['POST'])
 def multicopy_execute():
+    """Copia archivos a una carpeta destino; con 'background': true responde al momento con un job_id"""
     data = request.get_json()
     files = data.get('files', [])  # list of source file paths (absolute or relative to TEMP)
     dest_collection = data.get('dest_collection')  # 'FE', 'TS' or 'UPD'
@@ -373,6 +600,9 @@ def multicopy_execute():
 
     if not files or dest_collection not in ['FE', 'TS', 'UPD']:
         return jsonify({'error': 'Faltan archivos o colección destino inválida'}), 400
+    incremental = incremental_mode(data)
+    if incremental is None:
+        return jsonify({'error': f"Modo incremental inválido (válidos: {', '.join(INCREMENTAL_MODES)})"}), 400
 
     print(f"[MULTICOPY] files={files}")
     print(f"[MULTICOPY] dest_collection={dest_collection}")
@@ -409,38 +639,60 @@ def multicopy_execute():
 
     os.makedirs(full_dest_path, exist_ok=True)
 
+    return job_response(data, 'multicopy', f'{len(files)} archivos -> {full_dest_path}',
+                        lambda job: multicopy_execute_job(job, files, full_dest_path, incremental))
+
+def multicopy_execute_job(job, files, full_dest_path, incremental):
     results = []
-    success_count = 0
+    tasks = []
     for src in files:
         if not os.path.isabs(src):
             src = os.path.join(CONFIG['TEMP_PATH'], src)
         if not os.path.exists(src):
             results.append({'file': os.path.basename(src), 'status': 'error', 'message': 'Archivo no encontrado'})
             continue
-        try:
-            shutil.copy2(src, os.path.join(full_dest_path, os.path.basename(src)))
-            results.append({'file': os.path.basename(src), 'status': 'ok'})
-            success_count += 1
-        except Exception as e:
-            results.append({'file': os.path.basename(src), 'status': 'error', 'message': str(e)})
+        # Hueco para el resultado de la copia (se rellena en orden tras copiar en paralelo)
+        results.append(None)
+        tasks.append(CopyTask(src, os.path.join(full_dest_path, os.path.basename(src)), len(results) - 1))
+    copy_results = scanner.copier.run(tasks, incremental, job)
+    for result in copy_results:
+        name = os.path.basename(result.task.src)
+        if result.ok:
+            results[result.task.tag] = {'file': name, 'status': 'ok'}
+            if result.method == SKIPPED:
+                results[result.task.tag]['skipped'] = True
+        else:
+            results[result.task.tag] = {'file': name, 'status': 'error', 'message': result.error}
+    success_count = sum(1 for r in results if r['status'] == 'ok')
+    summary = scanner.copier.summary(copy_results)
 
-    # Invalidate caches for both collections
-    cache['FE'] = None
-    cache['TS'] = None
+    notify_changes([os.path.join(full_dest_path, r['file']) for r in results if r['status'] == 'ok' and not r.get('skipped')])
 
     return jsonify({
         'success': success_count > 0,
-        'copied': success_count,
+        'copied': success_count - summary['skipped'],
+        'skipped': summary['skipped'],
+        'bytes_saved': summary['bytes_saved'] + summary['bytes_skipped'],
         'total': len(files),
         'details': results
     })
 
 @app.route('/api/cache/clear')
 def clear_cache():
-    global cache
-    cache = {'FE': None, 'TS': None, 'TEMP': None, 'stats': None}
+    cache.clear()
     return jsonify({'message': 'Caché limpiada'})
 
+@app.route('/api/watcher/status')
+def watcher_status():
+    status = watcher.status()
+    status['mode'] = CONFIG['WATCH_MODE']
+    return jsonify(status)
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Aciertos/fallos de la caché de listados y conteos"""
+    return jsonify(cache.stats())
+
 @app.route('/api/process-file', methods=['POST'])
 def process_file():
     data = request.get_json()
@@ -450,9 +702,6 @@ def process_file():
         return jsonify({'error': 'No se proporcionó nombre'}), 400
     try:
         result = scanner.process_temp_file(filename, destinations)
-        cache['FE'] = None
-        cache['TS'] = None
-        cache['TEMP'] = None
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -490,15 +739,74 @@ def browse_subfolders_for_rules(collection, subpath):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ============== TRABAJOS EN SEGUNDO PLANO ==============
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Trabajos en curso y terminados recientes (filtro opcional 'kind': temp-copy, copy-folder, compress...)"""
+    return jsonify({'jobs': [job.snapshot() for job in jobs.list(request.args.get('kind') or None)]})
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Progreso de un trabajo: estado, archivos, bytes, porcentaje, velocidad y ETA"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    """Respuesta final del trabajo (la misma que daría el endpoint sin 'background'); 202 si sigue en curso"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if job.result is None:
+        return jsonify(job.snapshot()), 202
+    return jsonify(job.result), job.status_code
+
+def job_events_response(job_id=None, kind=None):
+    """
+    Server-Sent Events con el progreso de los trabajos: 'progress' con el snapshot de cada
+    trabajo que cambia (como mucho uno cada EVENTS_INTERVAL segundos por tanda) y 'done' con
+    su estado final; comentarios de latido mientras no hay cambios.
+    """
+    def generate():
+        yield 'retry: 2000\n\n'
+        for snapshots in jobs.watch(job_id, kind, CONFIG['EVENTS_INTERVAL']):
+            if not snapshots:
+                yield ': ping\n\n'
+            for snapshot in snapshots:
+                event = 'progress' if snapshot['running'] else 'done'
+                yield f"event: {event}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/events')
+def jobs_events():
+    """Eventos de progreso de todos los trabajos (filtro opcional 'kind'); la conexión queda abierta"""
+    return job_events_response(kind=request.args.get('kind') or None)
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Eventos de progreso de un trabajo; la conexión se cierra tras el evento 'done'"""
+    if jobs.get(job_id) is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return job_events_response(job_id)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    cancelled = jobs.cancel(job_id)
+    if cancelled is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if not cancelled:
+        return jsonify({'error': 'El trabajo ya ha terminado'}), 400
+    return jsonify({'success': True, 'message': 'Cancelación solicitada'})
+
 # ============== COMPRESIÓN CON PROGRESO ==============
 
 @app.route('/api/compress/start', methods=['POST'])
 def compress_start():
-    global compress_status
-    
-    if compress_status['running']:
-        return jsonify({'error': 'Ya hay una compresión en curso'}), 400
-    
+    """Lanza la compresión de FE o TS con 7-Zip como trabajo en segundo plano (devuelve su job_id)"""
     data = request.get_json()
     collection = data.get('collection')
     dest_path = data.get('dest_path')
@@ -522,177 +830,187 @@ def compress_start():
     if not os.path.exists(source_path):
         return jsonify({'error': f'Ruta fuente no existe: {source_path}'}), 400
     
-    # Reset status
-    compress_status = {'running': True, 'progress': 'Iniciando...', 'percent': 0, 'done': False, 'error': None}
-    
-    def run_compression():
-        global compress_status, compress_cancel_flag, compress_process
-        compress_cancel_flag = False
-        try:
-            # Buscar 7-Zip
-            seven_zip_paths = [
-                r'C:\Program Files\7-Zip\7z.exe',
-                r'C:\Program Files (x86)\7-Zip\7z.exe',
-                '7z'
-            ]
-            seven_zip_path = None
-            for p in seven_zip_paths:
-                if os.path.exists(p) or p == '7z':
-                    seven_zip_path = p
-                    break
-            
-            if not seven_zip_path:
-                compress_status['error'] = '7-Zip no encontrado'
-                compress_status['running'] = False
-                return
-            
-            # Calcular tamaño total
-            compress_status['progress'] = 'Calculando tamaño...'
-            total_size = 0
-            file_count = 0
-            for root, dirs, files in os.walk(source_path):
-                if compress_cancel_flag:
-                    compress_status['error'] = 'Cancelado por el usuario'
-                    compress_status['running'] = False
-                    return
-                for f in files:
-                    try:
-                        total_size += os.path.getsize(os.path.join(root, f))
-                        file_count += 1
-                    except:
-                        pass
-            
-            size_gb = total_size / (1024 * 1024 * 1024)
-            compress_status['progress'] = f'Total: {file_count:,} archivos ({size_gb:.2f} GB)'
-            
-            # Crear carpeta destino
-            os.makedirs(dest_path, exist_ok=True)
-            
-            # Construir comando
-            ext = 'zip' if compress_format == 'zip' else '7z'
-            archive_file = os.path.join(dest_path, f'{archive_name}.{ext}')
-            
-            # Eliminar archivo existente si hay
-            for old_file in os.listdir(dest_path):
-                if old_file.startswith(archive_name) and (old_file.endswith('.zip') or old_file.endswith('.7z') or '.zip.' in old_file or '.7z.' in old_file):
-                    try:
-                        os.remove(os.path.join(dest_path, old_file))
-                    except:
-                        pass
-            
-            # Para incluir la carpeta raíz en el ZIP, ejecutamos desde el directorio padre
-            # y comprimimos la carpeta por nombre
-            parent_dir = os.path.dirname(source_path.rstrip('/\\'))
-            folder_name = os.path.basename(source_path.rstrip('/\\'))
-            
-            if compress_format == 'zip':
-                cmd = [seven_zip_path, 'a', '-tzip', f'-v{volume_size_mb}m', '-mx=5', '-bsp1', archive_file, folder_name]
-            else:
-                cmd = [seven_zip_path, 'a', '-t7z', f'-v{volume_size_mb}m', '-mx=5', '-bsp1', archive_file, folder_name]
-            
-            compress_status['progress'] = f'Comprimiendo {archive_name}...'
-            
-            # Ejecutar con captura de salida - desde el directorio padre para incluir carpeta raíz
-            compress_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                cwd=parent_dir
-            )
-            
-            # Parsear progreso
-            for line in compress_process.stdout:
-                if compress_cancel_flag:
-                    compress_process.terminate()
-                    compress_status['error'] = 'Cancelado por el usuario'
-                    compress_status['running'] = False
-                    compress_process = None
-                    # Limpiar archivos temporales/parciales
-                    try:
-                        for tmp_file in os.listdir(dest_path):
-                            if tmp_file.startswith(archive_name):
-                                os.remove(os.path.join(dest_path, tmp_file))
-                    except:
-                        pass
-                    return
-                line = line.strip()
-                if '%' in line:
-                    try:
-                        # Buscar porcentaje en la línea (ej: "45%")
-                        import re
-                        match = re.search(r'(\d+)%', line)
-                        if match:
-                            pct = int(match.group(1))
-                            compress_status['percent'] = pct
-                            compress_status['progress'] = f'Comprimiendo {archive_name}... {pct}%'
-                    except:
-                        pass
-            
-            compress_process.wait()
-            
-            if compress_cancel_flag:
-                compress_status['error'] = 'Cancelado por el usuario'
-                # Limpiar archivos temporales/parciales
-                try:
-                    for tmp_file in os.listdir(dest_path):
-                        if tmp_file.startswith(archive_name):
-                            os.remove(os.path.join(dest_path, tmp_file))
-                except:
-                    pass
-            elif compress_process.returncode == 0:
-                # Contar volúmenes creados
-                volumes = [f for f in os.listdir(dest_path) if f.startswith(archive_name) and (f'.{ext}' in f)]
-                compress_status['progress'] = f'¡Completado! {len(volumes)} volumen(es) de {archive_name}'
-                compress_status['percent'] = 100
-                compress_status['done'] = True
-            else:
-                compress_status['error'] = f'Error en 7-Zip (código {compress_process.returncode})'
-        except Exception as e:
-            compress_status['error'] = str(e)
-        finally:
-            compress_status['running'] = False
-            compress_process = None
-    
-    # Ejecutar en thread separado
-    thread = threading.Thread(target=run_compression)
-    thread.daemon = True
-    thread.start()
+    # Pueden comprimirse a la vez colecciones distintas, pero no la misma dos veces (key=collection)
+    job = jobs.submit('compress', f'Comprimir {archive_name}',
+                      lambda job: compress_job(job, source_path, dest_path, archive_name, volume_size_mb, compress_format),
+                      details=lambda: {'collection': collection, 'archive_name': archive_name, 'dest_path': dest_path},
+                      key=collection)
+    if job is None:
+        return jsonify({'error': f'Ya hay una compresión de {collection} en curso'}), 400
     
-    return jsonify({'success': True, 'message': f'Compresión de {archive_name} iniciada'})
+    return jsonify({'success': True, 'message': f'Compresión de {archive_name} iniciada', 'job_id': job.id})
+
+def remove_partial_archives(dest_path, archive_name):
+    """Borra los volúmenes parciales que deja una compresión cancelada"""
+    try:
+        for tmp_file in os.listdir(dest_path):
+            if tmp_file.startswith(archive_name):
+                os.remove(os.path.join(dest_path, tmp_file))
+    except:
+        pass
+
+def compress_job(job, source_path, dest_path, archive_name, volume_size_mb, compress_format):
+    job.set_phase('starting', 'Iniciando...')
+    # Buscar 7-Zip
+    seven_zip_paths = [
+        r'C:\Program Files\7-Zip\7z.exe',
+        r'C:\Program Files (x86)\7-Zip\7z.exe',
+        '7z'
+    ]
+    seven_zip_path = None
+    for p in seven_zip_paths:
+        if os.path.exists(p) or p == '7z':
+            seven_zip_path = p
+            break
+    
+    if not seven_zip_path:
+        raise RuntimeError('7-Zip no encontrado')
+    
+    # Calcular tamaño total
+    job.set_phase('sizing', 'Calculando tamaño...')
+    total_size = 0
+    file_count = 0
+    for root, dirs, files in os.walk(source_path):
+        job.check_cancelled()
+        for f in files:
+            try:
+                total_size += os.path.getsize(os.path.join(root, f))
+                file_count += 1
+            except:
+                pass
+    
+    size_gb = total_size / (1024 * 1024 * 1024)
+    job.set_totals(file_count, total_size)
+    job.set_message(f'Total: {file_count:,} archivos ({size_gb:.2f} GB)')
+    
+    # Crear carpeta destino
+    os.makedirs(dest_path, exist_ok=True)
+    
+    # Construir comando
+    ext = 'zip' if compress_format == 'zip' else '7z'
+    archive_file = os.path.join(dest_path, f'{archive_name}.{ext}')
+    
+    # Eliminar archivo existente si hay
+    for old_file in os.listdir(dest_path):
+        if old_file.startswith(archive_name) and (old_file.endswith('.zip') or old_file.endswith('.7z') or '.zip.' in old_file or '.7z.' in old_file):
+            try:
+                os.remove(os.path.join(dest_path, old_file))
+            except:
+                pass
+    
+    # Para incluir la carpeta raíz en el ZIP, ejecutamos desde el directorio padre
+    # y comprimimos la carpeta por nombre
+    parent_dir = os.path.dirname(source_path.rstrip('/\\'))
+    folder_name = os.path.basename(source_path.rstrip('/\\'))
+    
+    if compress_format == 'zip':
+        cmd = [seven_zip_path, 'a', '-tzip', f'-v{volume_size_mb}m', '-mx=5', '-bsp1', archive_file, folder_name]
+    else:
+        cmd = [seven_zip_path, 'a', '-t7z', f'-v{volume_size_mb}m', '-mx=5', '-bsp1', archive_file, folder_name]
+    
+    job.check_cancelled()
+    job.set_phase('compressing', f'Comprimiendo {archive_name}...')
+    
+    # Ejecutar con captura de salida - desde el directorio padre para incluir carpeta raíz
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=parent_dir
+    )
+    # Cancelar termina 7-Zip al momento (no hay que esperar a su siguiente salida)
+    job.on_cancel(process.terminate)
+    
+    # Parsear progreso. Con -bsp1 7-Zip reescribe el porcentaje en la misma línea con
+    # retrocesos (\b), sin salto de línea: se lee lo que haya disponible y se toma el último
+    # porcentaje; solo se actualiza el trabajo cuando cambia (los eventos se funden en watch)
+    last_pct = None
+    tail = ''
+    while True:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk or job.cancelled:
+            break
+        # Un porcentaje puede quedar partido entre dos lecturas: se busca también en el final de la anterior
+        text = tail + chunk.decode('utf-8', 'replace')
+        matches = [m for m in re.finditer(r'(\d+)%', text) if m.end() > len(tail)]
+        tail = text[-8:]
+        if matches and int(matches[-1].group(1)) != last_pct:
+            last_pct = int(matches[-1].group(1))
+            job.set_percent(last_pct, f'Comprimiendo {archive_name}... {last_pct}%')
+    process.stdout.close()
+    
+    if job.cancelled:
+        process.terminate()
+    process.wait()
+    
+    if job.cancelled:
+        # Limpiar archivos temporales/parciales
+        remove_partial_archives(dest_path, archive_name)
+        raise JobCancelled(CANCELLED_MESSAGE)
+    if process.returncode != 0:
+        raise RuntimeError(f'Error en 7-Zip (código {process.returncode})')
+    
+    # Contar volúmenes creados
+    volumes = [f for f in os.listdir(dest_path) if f.startswith(archive_name) and (f'.{ext}' in f)]
+    message = f'¡Completado! {len(volumes)} volumen(es) de {archive_name}'
+    job.set_percent(100, message)
+    return jsonify({'success': True, 'message': message, 'volumes': sorted(volumes)})
+
+def compress_status_of(job):
+    """Estado de una compresión con la forma de siempre de /api/compress/status (+ job_id)"""
+    if job is None:
+        return {'running': False, 'progress': '', 'percent': 0, 'done': False, 'error': None}
+    status = job.snapshot()
+    return {
+        'running': status['running'],
+        'progress': status['message'],
+        'percent': int(job.percent or 0),
+        'done': status['state'] == 'done',
+        'error': status['error'],
+        'cancelled': status['state'] == 'cancelled',
+        'job_id': job.id
+    }
 
 @app.route('/api/compress/status')
 def compress_get_status():
-    return jsonify(compress_status)
+    """Estado de la compresión 'job_id' o, sin él, de la última lanzada"""
+    job_id = request.args.get('job_id')
+    return jsonify(compress_status_of(jobs.get(job_id) if job_id else jobs.latest('compress')))
 
 @app.route('/api/compress/cancel', methods=['POST'])
 def compress_cancel():
-    global compress_cancel_flag, compress_process, compress_status
-    compress_cancel_flag = True
-    if compress_process:
-        try:
-            compress_process.terminate()
-        except:
-            pass
-    compress_status['progress'] = 'Cancelando...'
-    return jsonify({'success': True, 'message': 'Cancelación solicitada'})
+    """Cancela la compresión 'job_id' o, sin él, todas las que estén en curso"""
+    data = request.get_json(silent=True) or {}
+    job_id = data.get('job_id')
+    targets = [jobs.get(job_id)] if job_id else jobs.running('compress')
+    cancelled = [job.id for job in targets if job is not None and job.cancel()]
+    return jsonify({'success': True, 'message': 'Cancelación solicitada', 'cancelled': cancelled})
 
 # ============== MULTICOPIA ==============
 
 @app.route('/api/multicopy', methods=['POST'])
 def multicopy_files():
+    """Copia archivos a varios destinos; con 'background': true responde al momento con un job_id"""
     data = request.get_json()
     files = data.get('files', [])
     destinations = data.get('destinations', [])
     
     if not files or not destinations:
         return jsonify({'error': 'Faltan archivos o destinos'}), 400
+    incremental = incremental_mode(data)
+    if incremental is None:
+        return jsonify({'error': f"Modo incremental inválido (válidos: {', '.join(INCREMENTAL_MODES)})"}), 400
     
+    return job_response(data, 'multicopy', f'{len(files)} archivos -> {len(destinations)} destinos',
+                        lambda job: multicopy_job(job, files, destinations, incremental))
+
+def multicopy_job(job, files, destinations, incremental):
     results = []
     success_count = 0
+    copied_paths = []
     
     try:
+        tasks = []
         for file_path in files:
             if not os.path.isabs(file_path):
                 file_path = os.path.join(CONFIG['TEMP_PATH'], file_path)
@@ -704,33 +1022,43 @@ def multicopy_files():
             filename = os.path.basename(file_path)
             
             for dest in destinations:
-                try:
-                    if ':' in dest:
-                        coll, subpath = dest.split(':', 1)
-                    else:
-                        coll = 'FE'
-                        subpath = dest
-                    
-                    base_path = get_collection_base_path(coll)
-                    if not base_path:
-                        continue
-                    
-                    full_dest_path = os.path.join(base_path, subpath)
-                    os.makedirs(full_dest_path, exist_ok=True)
-                    
-                    shutil.copy2(file_path, os.path.join(full_dest_path, filename))
-                    results.append({'file': filename, 'dest': dest, 'status': 'ok'})
-                    success_count += 1
-                except Exception as e:
-                    results.append({'file': filename, 'dest': dest, 'status': 'error', 'message': str(e)})
+                if ':' in dest:
+                    coll, subpath = dest.split(':', 1)
+                else:
+                    coll = 'FE'
+                    subpath = dest
+                
+                base_path = get_collection_base_path(coll)
+                if not base_path:
+                    continue
+                
+                # Hueco para el resultado (se rellena en orden tras copiar todo en paralelo)
+                results.append(None)
+                tasks.append(CopyTask(file_path, os.path.join(base_path, subpath, filename), (len(results) - 1, dest)))
+        
+        copy_results = scanner.copier.run(tasks, incremental, job)
+        for result in copy_results:
+            index, dest = result.task.tag
+            filename = os.path.basename(result.task.src)
+            if result.ok and result.method == SKIPPED:
+                results[index] = {'file': filename, 'dest': dest, 'status': 'ok', 'skipped': True}
+            elif result.ok:
+                copied_paths.append(result.task.dest)
+                results[index] = {'file': filename, 'dest': dest, 'status': 'ok'}
+                success_count += 1
+            else:
+                results[index] = {'file': filename, 'dest': dest, 'status': 'error', 'message': result.error}
         
-        cache['FE'] = None
-        cache['TS'] = None
+        notify_changes(copied_paths)
+        summary = scanner.copier.summary(copy_results)
         
         return jsonify({
             'success': True,
             'processed': len(files),
             'copied': success_count,
+            'skipped': summary['skipped'],
+            'bytes_saved': summary['bytes_saved'] + summary['bytes_skipped'],
+            'placement': summary,
             'details': results
         })
     except Exception as e:
@@ -758,7 +1086,7 @@ def create_folder():
         if os.path.exists(full_path):
             return jsonify({'error': 'La carpeta ya existe'}), 400
         os.makedirs(full_path)
-        cache[collection] = None
+        notify_changes([full_path])
         return jsonify({'success': True, 'message': f'Carpeta creada: {name}'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -797,8 +1125,7 @@ def delete_folder():
             shutil.rmtree(target_path)
         else:
             os.rmdir(target_path)
-        cache['FE'] = None
-        cache['TS'] = None
+        notify_changes([target_path], recursive=force)
         return jsonify({'success': True, 'message': 'Carpeta eliminada'})
     except OSError as e:
         if 'not empty' in str(e).lower() or 'directory not empty' in str(e).lower():
@@ -836,9 +1163,7 @@ def delete_files():
         except Exception as e:
             results.append({'file': os.path.basename(file_path), 'status': 'error', 'message': str(e)})
     
-    cache['FE'] = None
-    cache['TS'] = None
-    cache['TEMP'] = None
+    notify_changes([f for f in files if not os.path.exists(f)])
     
     return jsonify({
         'success': success_count > 0,
@@ -885,9 +1210,7 @@ def rename_file():
     
     try:
         os.rename(old_path, new_path)
-        cache['FE'] = None
-        cache['TS'] = None
-        cache['TEMP'] = None
+        notify_changes([old_path, new_path])
         return jsonify({
             'success': True,
             'old_name': os.path.basename(old_path),
@@ -899,53 +1222,297 @@ def rename_file():
 
 # ============== BÚSQUEDA UNIVERSAL ==============
 
-@app.route('/api/search')
-def search_files():
-    """Búsqueda universal en FE y TS"""
-    query = request.args.get('q', '').strip().lower()
-    
-    if len(query) < 2:
-        return jsonify({'results': [], 'error': 'Búsqueda muy corta'})
-    
+def search_collection(collection, base_path, query, limit):
+    """Busca 'query' en los nombres de archivo de una colección (catálogo si existe, si no os.walk)"""
     results = []
-    max_results = 500
-    
-    # Buscar en FE
-    if CONFIG.get('FE_PATH') and os.path.exists(CONFIG['FE_PATH']):
-        for root, dirs, files in os.walk(CONFIG['FE_PATH']):
+    if scanner._use_catalog(base_path):
+        matches = [(row['path'], row['name']) for row in catalog.search(query, base_path, limit)]
+    else:
+        matches = []
+        for root, dirs, files in os.walk(base_path):
             for f in files:
                 if query in f.lower():
-                    rel_path = os.path.relpath(os.path.join(root, f), CONFIG['FE_PATH'])
-                    results.append({
-                        'name': f,
-                        'collection': 'FE',
-                        'relative_path': rel_path.replace('\\', '/'),
-                        'full_path': os.path.join(root, f)
-                    })
-                    if len(results) >= max_results:
+                    matches.append((os.path.join(root, f), f))
+                    if len(matches) >= limit:
                         break
-            if len(results) >= max_results:
+            if len(matches) >= limit:
                 break
     
-    # Buscar en TS
-    ts_full_path = os.path.join(CONFIG.get('TS_PATH', ''), CONFIG.get('TS_TOSEC_SUBPATH', ''))
-    if ts_full_path and os.path.exists(ts_full_path) and len(results) < max_results:
-        for root, dirs, files in os.walk(ts_full_path):
-            for f in files:
-                if query in f.lower():
-                    rel_path = os.path.relpath(os.path.join(root, f), ts_full_path)
-                    results.append({
-                        'name': f,
-                        'collection': 'TS',
-                        'relative_path': rel_path.replace('\\', '/'),
-                        'full_path': os.path.join(root, f)
-                    })
-                    if len(results) >= max_results:
-                        break
-            if len(results) >= max_results:
-                break
+    for full_path, name in matches:
+        results.append(search_hit(collection, base_path, full_path, name))
+    return results
+
+def search_hit(collection, base_path, full_path, name):
+    """Resultado de búsqueda tal y como lo espera el frontend"""
+    rel_path = os.path.relpath(full_path, base_path)
+    return {
+        'name': name,
+        'collection': collection,
+        'relative_path': rel_path.replace('\\', '/'),
+        'full_path': full_path
+    }
+
+def get_search_roots():
+    return {
+        'FE': CONFIG.get('FE_PATH', ''),
+        'TS': os.path.join(CONFIG.get('TS_PATH', ''), CONFIG.get('TS_TOSEC_SUBPATH', ''))
+    }
+
+def start_search_index_build():
+    """Construye el índice de trigramas en segundo plano (si no se está construyendo ya)"""
+    if search_index.building:
+        return False
     
-    return jsonify({'results': results, 'total': len(results)})
+    def run_build(job):
+        try:
+            search_index.build(get_search_roots())
+        except Exception:
+            pass  # el error queda en search_index.status()
+        return {'success': search_index.error is None, **search_index.status()}
+    
+    # Varias búsquedas a la vez con el índice sin construir: solo la primera lanza la construcción
+    return jobs.submit('search-index', 'Índice de búsqueda', run_build, key='search-index') is not None
+
+def parse_search_filters(args):
+    """
+    Filtros estructurados de /api/search: year (1985 o 1985-1987), publisher (subcadena),
+    category (classic, homebrew, both), type (valor de FILE_TYPES: TAPs, TZXs, DISCOS...).
+    Devuelve (filtros, error)
+    """
+    filters = {}
+    year = args.get('year', '').strip()
+    if year:
+        parts = year.split('-')
+        if len(parts) > 2 or not all(p.strip().isdigit() for p in parts):
+            return None, f'Año no válido: {year}'
+        years = [int(p) for p in parts]
+        filters['year_from'], filters['year_to'] = min(years), max(years)
+    publisher = args.get('publisher', '').strip()
+    if publisher:
+        filters['publisher'] = publisher
+    category = args.get('category', '').strip().lower()
+    if category:
+        if category not in ('classic', 'homebrew', 'both'):
+            return None, f'Categoría no válida: {category}'
+        filters['category'] = category
+    file_type = args.get('type', '').strip()
+    if file_type:
+        valid_types = set(DirectoryScanner.FILE_TYPES.values())
+        match = next((t for t in valid_types if t.lower() == file_type.lower()), None)
+        if match is None:
+            return None, f'Tipo no válido: {file_type} (válidos: {", ".join(sorted(valid_types))})'
+        filters['file_type'] = match
+    return filters, None
+
+@app.route('/api/search')
+def search_files():
+    """
+    Búsqueda universal en FE y TS (por nombre y/o por campos TOSEC).
+    Orden: sort=relevance (por defecto con texto: título exacto, prefijo, inicio de palabra,
+    dentro del título, solo en flags) o sort=index (orden de alta en el índice).
+    Paginación: limit (máx. 5000) y offset; con sort=index también cursor (el 'next_cursor'
+    de la página anterior).
+    Con stream=1 responde NDJSON: una línea por resultado y una última línea
+    {"done": true, "total": N}. Con sort=index las líneas salen según se encuentran (todas,
+    salvo que se indique limit) y el servidor no acumula la lista de resultados; con
+    sort=relevance se emiten los 'limit' mejores.
+    Con background=1 (sin stream) la búsqueda corre como trabajo: responde 202 con un job_id
+    y la respuesta de siempre queda en /api/jobs/<id>/result.
+    """
+    if wants_background(request.args.get('background')):
+        if request.args.get('stream', '') in ('1', 'true'):
+            return jsonify({'results': [], 'error': 'stream=1 no se puede combinar con background'}), 400
+        args = request.args.to_dict()
+        return job_response({'background': True}, 'search', f"Búsqueda: {args.get('q', '')}",
+                            lambda job: search_response(args, job))
+    return search_response(request.args)
+
+def search_response(args, job=None):
+    """Respuesta de /api/search para los parámetros 'args'"""
+    query = args.get('q', '').strip().lower()
+    collection_filter = args.get('collection', '').strip().upper()
+    filters, error = parse_search_filters(args)
+    if error:
+        return jsonify({'results': [], 'error': error}), 400
+    
+    if len(query) < 2 and not filters:
+        return jsonify({'results': [], 'error': 'Búsqueda muy corta'})
+    
+    roots = get_search_roots()
+    if collection_filter:
+        if collection_filter not in roots:
+            return jsonify({'results': [], 'error': f'Colección no válida: {collection_filter}'}), 400
+        roots = {collection_filter: roots[collection_filter]}
+    
+    stream = args.get('stream', '') in ('1', 'true')
+    # Orden: 'relevance' (por defecto si hay texto) u 'index' (orden de alta, admite cursor)
+    sort = args.get('sort') or ('relevance' if query else 'index')
+    if sort not in ('relevance', 'index') or (sort == 'relevance' and not query):
+        return jsonify({'results': [], 'error': f'Orden no válido: {sort}'}), 400
+    if sort == 'relevance' and args.get('cursor'):
+        return jsonify({'results': [], 'error': 'El cursor solo está disponible con sort=index (usa offset)'}), 400
+    limit_arg = args.get('limit')
+    try:
+        max_results = min(int(limit_arg or 500), 5000)
+        # En streaming no hay límite salvo que se pida expresamente
+        stream_limit = int(limit_arg) if limit_arg else None
+        offset = max(int(args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'results': [], 'error': 'limit y offset deben ser números'}), 400
+    
+    if job:
+        job.set_phase('searching', f'Buscando {query or "por filtros"}...')
+    if search_index.ready:
+        after = -1
+        cursor = args.get('cursor', '')
+        if cursor:
+            generation, _, last_id = cursor.partition('-')
+            if not (generation.isdigit() and last_id.isdigit()):
+                return jsonify({'results': [], 'error': 'Cursor no válido'}), 400
+            if int(generation) != search_index.generation:
+                return jsonify({'results': [], 'error': 'El cursor ha caducado (el índice se ha reorganizado): repite la búsqueda'}), 410
+            after = int(last_id)
+        collection = collection_filter or None
+        
+        if sort == 'relevance':
+            # Montículo de tamaño offset+limit: solo se materializan los mejores resultados
+            total, matches = search_index.top_matches(query, collection, offset + max_results, filters)
+            results = [search_hit(c, roots[c], full_path, name) for c, full_path, name in matches[offset:]]
+            if stream:
+                lines = [json.dumps(r, ensure_ascii=False) + '\n' for r in results]
+                lines.append(json.dumps({'done': True, 'total': total}) + '\n')
+                return Response(lines, mimetype='application/x-ndjson')
+            more = total > offset + len(results)
+            return jsonify({
+                'results': results,
+                'total': total,
+                'truncated': more,
+                'next_offset': offset + len(results) if more else None,
+                'next_cursor': None,
+                'indexed': True
+            })
+        
+        if stream:
+            def generate():
+                total = 0
+                for _, hit_collection, full_path, name in search_index.iter_matches(query, collection, filters, after):
+                    total += 1
+                    if total > offset and (stream_limit is None or total - offset <= stream_limit):
+                        yield json.dumps(search_hit(hit_collection, roots[hit_collection], full_path, name), ensure_ascii=False) + '\n'
+                yield json.dumps({'done': True, 'total': total}) + '\n'
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        # Índice en memoria: total exacto de coincidencias, se devuelven como mucho max_results
+        total, matches, next_after = search_index.search(query, collection, max_results, filters, after, offset)
+        results = [search_hit(c, roots[c], full_path, name) for c, full_path, name in matches]
+        return jsonify({
+            'results': results,
+            'total': total,
+            'truncated': next_after is not None,
+            'next_cursor': f'{search_index.generation}-{next_after}' if next_after is not None else None,
+            'indexed': True
+        })
+    
+    if not search_index.error:
+        start_search_index_build()
+    if filters:
+        return jsonify({'results': [], 'total': 0, 'indexed': False, 'building': True,
+                        'error': 'El índice de búsqueda se está construyendo, inténtalo en unos segundos'}), 503
+    
+    # Mientras el índice no está listo: búsqueda directa (catálogo u os.walk), limitada a max_results
+    results = []
+    for collection, base_path in roots.items():
+        if base_path and os.path.exists(base_path) and len(results) < max_results:
+            results.extend(search_collection(collection, base_path, query, max_results - len(results)))
+    if sort == 'relevance':
+        results.sort(key=lambda r: relevance(query, r['name'].lower()), reverse=True)
+    
+    if stream:
+        lines = [json.dumps(r, ensure_ascii=False) + '\n' for r in results]
+        lines.append(json.dumps({'done': True, 'total': len(results)}) + '\n')
+        return Response(lines, mimetype='application/x-ndjson')
+    return jsonify({'results': results, 'total': len(results), 'truncated': len(results) >= max_results,
+                    'next_cursor': None, 'indexed': False})
+
+@app.route('/api/search/status')
+def search_index_status():
+    return jsonify(search_index.status())
+
+@app.route('/api/search/rebuild', methods=['POST'])
+def search_index_rebuild():
+    """Reconstruye el índice de búsqueda (p. ej. tras cambios externos sin vigilante)"""
+    if not start_search_index_build():
+        return jsonify({'error': 'El índice ya se está construyendo'}), 400
+    return jsonify({'success': True, 'message': 'Reconstrucción del índice de búsqueda iniciada'})
+
+# ============== CATÁLOGO PERSISTENTE ==============
+
+@app.route('/api/catalog/status')
+def catalog_status():
+    status = catalog.status()
+    job = jobs.latest('catalog')
+    if job is None:
+        status['task'] = {'running': False, 'action': None, 'results': [], 'error': None}
+    else:
+        status['task'] = {'running': job.state not in FINISHED_STATES, 'error': job.error,
+                          'job_id': job.id, **job.details()}
+    return jsonify(status)
+
+def start_catalog_task(action):
+    """Lanza rebuild/refresh del catálogo en segundo plano (puede tardar minutos en colecciones grandes)"""
+    data = request.get_json(silent=True) or {}
+    collections = data.get('collections') or CATALOG_COLLECTIONS
+    invalid = [c for c in collections if c not in CATALOG_COLLECTIONS]
+    if invalid:
+        return jsonify({'error': f'Colecciones inválidas: {invalid}'}), 400
+    
+    results = []
+    results_lock = threading.Lock()
+    
+    def add_result(result):
+        with results_lock:
+            results.append(result)
+    
+    def run_catalog_task(job):
+        job.set_totals(len(collections), 0)
+        for collection in collections:
+            job.check_cancelled()
+            base_path = get_collection_base_path(collection)
+            if not base_path or not os.path.exists(base_path):
+                add_result({'collection': collection, 'success': False, 'error': 'Ruta no encontrada'})
+            else:
+                if action == 'rebuild':
+                    result = catalog.rebuild(collection, base_path)
+                else:
+                    result = catalog.refresh(collection, base_path)
+                # Caché e índice de búsqueda: solo lo que el catálogo ha visto cambiar en disco
+                scanner.notify_catalog_changes(result.pop('changed_folders', []), result.pop('changed_paths', []))
+                add_result(result)
+            job.advance(1, 0, collection)
+        with results_lock:
+            return {'success': True, 'action': action, 'results': list(results)}
+    
+    def details():
+        with results_lock:
+            return {'action': action, 'results': list(results)}
+    
+    # Una sola operación de catálogo a la vez, sea rebuild o refresh
+    job = jobs.submit('catalog', f'Catálogo: {action}', run_catalog_task, details=details, key='catalog')
+    if job is None:
+        return jsonify({'error': 'Ya hay una operación de catálogo en curso'}), 400
+    
+    return jsonify({'success': True, 'message': f'Catálogo: {action} iniciado', 'collections': collections,
+                    'job_id': job.id})
+
+@app.route('/api/catalog/rebuild', methods=['POST'])
+def catalog_rebuild():
+    """Reconstruye el catálogo desde cero (recorrido completo del disco)"""
+    return start_catalog_task('rebuild')
+
+@app.route('/api/catalog/refresh', methods=['POST'])
+def catalog_refresh():
+    """Refresco incremental: solo re-lista las carpetas cuyo mtime ha cambiado"""
+    return start_catalog_task('refresh')
 
 # ============== COPIAR A TEMP ==============
 
@@ -966,7 +1533,7 @@ def copy_to_temp():
         os.makedirs(temp_path, exist_ok=True)
         filename = os.path.basename(source_path)
         dest_path = os.path.join(temp_path, filename)
-        shutil.copy2(source_path, dest_path)
+        scanner.copier.engine.copy(source_path, dest_path)
         return jsonify({'success': True, 'filename': filename})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -978,8 +1545,15 @@ def generate_update_package():
     """
     Copia archivos de TEMP a UPDATES_TOSEC usando la misma lógica que la pestaña TEMP.
     Solo procesa archivos TOSEC válidos (sin .zip, .rar, etc.)
+    Con 'plan_id' ejecuta el plan de la previsualización sin recalcular destinos.
+    Con 'background': true responde al momento con un job_id (ver /api/jobs).
     """
     data = request.get_json()
+    return job_response(data, 'update-generate', f"TEMP -> UPDATES_TOSEC ({data.get('target_collection', 'TS')})",
+                        lambda job: update_generate_job(data, job))
+
+@with_batch_snapshot
+def update_generate_job(data, job):
     target_collection = data.get('target_collection', 'TS')  # FE o TS
     
     # Verificar TEMP
@@ -992,75 +1566,56 @@ def generate_update_package():
     if not os.path.exists(updates_base):
         return jsonify({'success': False, 'error': f'Carpeta UPDATES_TOSEC no existe: {updates_base}'})
     
+    # Destinos calculados con la misma lógica que scan_temp_files (o los de la previsualización)
+    plan, error_response = resolve_plan(data, temp_path, target_collection, job)
+    if error_response:
+        return error_response
+    
     results = []
     total_success = 0
     total_errors = 0
     
-    # Procesar cada archivo en TEMP (solo archivos TOSEC válidos)
-    for filename in os.listdir(temp_path):
-        file_path = os.path.join(temp_path, filename)
-        if not os.path.isfile(file_path):
-            continue
-        
-        ext = os.path.splitext(filename)[1].lower()
-        # Solo procesar archivos TOSEC válidos (sin .zip ni otros comprimidos)
-        if ext not in scanner.TOSEC_EXTENSIONS:
-            continue
+    # Carpeta de la colección dentro de UPDATES_TOSEC (ej: ZX_v41_TS/TOSEC_v41)
+    base_path = scanner.updates_base_path(target_collection, updates_base)
+    
+    # Copiar todos los archivos del plan a la vez con el ejecutor compartido
+    copies, placement = copy_plan_files(plan, temp_path, base_path, target_collection, job) if base_path else \
+        ([(f['filename'], [], [], f['error']) for f in plan.files], scanner.copier.summary([]))
+    for (filename, copied_to, errors, plan_error), f in zip(copies, plan.files):
+        paths_for_collection = f['suggested_paths'].get(target_collection, [])
+        if plan_error:
+            error = plan_error
+        elif not paths_for_collection:
+            error = f'No hay rutas sugeridas para {target_collection}'
+        elif not base_path:
+            error = f"No se encontró carpeta {'FE' if target_collection == 'FE' else 'TS'} en {updates_base}"
+        elif not copied_to:
+            error = '; '.join(f"Error copiando a {dest}: {e}" for dest, e in errors) or 'Error desconocido'
+        else:
+            error = None
         
-        try:
-            # Obtener info TOSEC y rutas sugeridas (IGUAL que en scan_temp_files)
-            tosec_info = scanner._parse_tosec_filename(filename)
-            suggested_paths = scanner._suggest_destination(tosec_info, ext, filename)
-            
-            # Obtener las rutas para la colección seleccionada
-            paths_for_collection = suggested_paths.get(target_collection, [])
-            
-            if not paths_for_collection:
-                results.append({
-                    'filename': filename,
-                    'success': False,
-                    'error': f'No hay rutas sugeridas para {target_collection}'
-                })
-                total_errors += 1
-                continue
-            
-            # Copiar a UPDATES_TOSEC usando la función del scanner
-            copy_result = scanner.copy_file_to_updates_tosec(
-                file_path, 
-                paths_for_collection, 
-                target_collection, 
-                updates_base
-            )
-            
-            if copy_result['success']:
-                results.append({
-                    'filename': filename,
-                    'success': True,
-                    'dest_paths': copy_result['success']
-                })
-                total_success += 1
-            else:
-                results.append({
-                    'filename': filename,
-                    'success': False,
-                    'error': '; '.join(copy_result['errors']) if copy_result['errors'] else 'Error desconocido'
-                })
-                total_errors += 1
-                
-        except Exception as e:
+        if error:
             results.append({
                 'filename': filename,
                 'success': False,
-                'error': str(e)
+                'error': error
             })
             total_errors += 1
+        else:
+            results.append({
+                'filename': filename,
+                'success': True,
+                'dest_paths': copied_to
+            })
+            total_success += 1
     
     return jsonify({
         'success': True,
         'total_files': total_success,
         'total_errors': total_errors,
         'results': results,
-        'target_collection': target_collection
+        'target_collection': target_collection,
+        'placement': placement
     })
 
 
@@ -1069,6 +1624,7 @@ def preview_update_package():
     """
     Muestra vista previa de los destinos antes de copiar (igual que TEMP muestra suggested_paths).
     Solo procesa archivos TOSEC válidos (sin .zip, .rar, etc.)
+    Devuelve un plan_id: /api/update/generate con ese plan_id copia exactamente lo previsualizado.
     """
     data = request.get_json()
     target_collection = data.get('target_collection', 'TS')
@@ -1081,44 +1637,8 @@ def preview_update_package():
     if not os.path.exists(updates_base):
         return jsonify({'success': False, 'error': f'Carpeta UPDATES_TOSEC no existe: {updates_base}'})
     
-    files_preview = []
-    
-    for filename in os.listdir(temp_path):
-        file_path = os.path.join(temp_path, filename)
-        if not os.path.isfile(file_path):
-            continue
-        
-        ext = os.path.splitext(filename)[1].lower()
-        # Solo procesar archivos TOSEC válidos (sin .zip ni otros comprimidos)
-        if ext not in scanner.TOSEC_EXTENSIONS:
-            continue
-        
-        try:
-            tosec_info = scanner._parse_tosec_filename(filename)
-            suggested_paths = scanner._suggest_destination(tosec_info, ext, filename)
-            paths_for_collection = suggested_paths.get(target_collection, [])
-            
-            files_preview.append({
-                'filename': filename,
-                'tosec_info': tosec_info,
-                'dest_paths': paths_for_collection,
-                'has_destinations': len(paths_for_collection) > 0
-            })
-        except Exception as e:
-            files_preview.append({
-                'filename': filename,
-                'tosec_info': None,
-                'dest_paths': [],
-                'has_destinations': False,
-                'error': str(e)
-            })
-    
-    return jsonify({
-        'success': True,
-        'files': files_preview,
-        'target_collection': target_collection,
-        'total_files': len(files_preview)
-    })
+    plan = plans.put(planner.plan(temp_path))
+    return plan_preview_response(plan, target_collection)
 
 # ============== BACKUP NAS ==============
 
@@ -1285,6 +1805,20 @@ if __name__ == '__main__':
     print(f"TS: {CONFIG['TS_PATH']}/{CONFIG['TS_TOSEC_SUBPATH']}")
     print(f"TEMP: {CONFIG['TEMP_PATH']}")
     print(f"BACKUP: {CONFIG['BACKUP_PATH']}")
-    print(f"\n🌐 http://localhost:5000")
+    print(f"CATALOG: {CONFIG['CATALOG_PATH']}")
+    print(f"WALK WORKERS: {CONFIG['WALK_WORKERS']}")
+    print(f"WATCH: {CONFIG['WATCH_MODE']}")
+    print(f"SERVER: {CONFIG['SERVER']}" + (f" ({CONFIG['SERVER_THREADS']} hilos)" if CONFIG['SERVER'] == 'production' else ''))
+    print(f"\n🌐 http://localhost:{CONFIG['PORT']}")
     print("=" * 60)
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    init_services()
+    if CONFIG['SERVER'] == 'production':
+        from server import serve
+        if CONFIG['WATCH_MODE'] != 'off':
+            watcher.start()
+        serve(app, CONFIG['HOST'], CONFIG['PORT'], CONFIG['SERVER_THREADS'])
+    else:
+        # Con el recargador de debug el módulo se ejecuta dos veces: vigilar solo en el proceso que sirve
+        if CONFIG['WATCH_MODE'] != 'off' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            watcher.start()
+        app.run(debug=True, host=CONFIG['HOST'], port=CONFIG['PORT'])
\ No newline at end of file
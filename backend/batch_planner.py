@@ -0,0 +1,115 @@
+"""
+Planificación de TEMP en varios procesos para entregas muy grandes (decenas de miles de archivos).
+
+El listado de TEMP se reparte en bloques consecutivos entre un pool de procesos. Cada
+proceso tiene su propio DirectoryScanner y su propio memo de carpetas (DirectorySnapshot),
+que reutiliza en todos los bloques que le tocan, así que cada carpeta destino se lista
+como mucho una vez por proceso. Los registros por archivo se devuelven según terminan
+los bloques (con su posición en el listado) y el plan final se ordena por esa posición:
+el resultado es idéntico al del plan en serie sea cual sea el orden de llegada.
+
+Con pocos archivos (menos de 'threshold') o workers=1 se planifica en el propio proceso.
+
+Los procesos se crean con 'spawn' (no 'fork'): la aplicación Flask tiene hilos en marcha
+y un fork podría heredar locks tomados por otros hilos. Cada proceso nuevo vuelve a importar
+el script principal (app.py) como __mp_main__. Importar app.py no crea sus servicios
+(catálogo, escáner, vigilante...): los crea app.init_services() al arrancar el servidor, que
+en un proceso del pool no se ejecuta, así que el proceso solo usa este módulo.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Tuple
+
+from ingest_plan import CHANGED_WHILE_PLANNING, IngestPlan, list_temp_entries
+from listing_cache import DirectorySnapshot
+from scanner import DirectoryScanner
+
+# Estado de cada proceso del pool (se crea en _init_worker)
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(config: Dict[str, Any]):
+    _worker['scanner'] = DirectoryScanner(config)
+    _worker['snapshot'] = DirectorySnapshot()
+
+
+def _plan_shard(start: int, entries: List[Tuple[str, str, int, int]]) -> Tuple[int, List[Dict[str, Any]], Dict[str, Any]]:
+    """Planifica un bloque del listado en un proceso del pool con el memo de carpetas del proceso"""
+    scanner = _worker['scanner']
+    snapshot = _worker['snapshot']
+    with scanner.batch_snapshot(snapshot):
+        records = [scanner._plan_file(filename, ext, size) for filename, ext, size, _ in entries]
+    return start, records, snapshot.folder_states()
+
+
+class BatchPlanner:
+    """Calcula planes de ingesta de TEMP en serie o repartidos en un pool de procesos"""
+
+    def __init__(self, scanner: DirectoryScanner, workers: int = 4, threshold: int = 5000, shard_size: int = 500):
+        self.scanner = scanner
+        self.workers = max(1, int(workers))
+        self.threshold = threshold
+        self.shard_size = max(1, int(shard_size))
+
+    def use_processes(self, count: int) -> bool:
+        return self.workers > 1 and count >= self.threshold
+
+    def plan(self, temp_path: str) -> IngestPlan:
+        """Plan completo (bloquea hasta terminar)"""
+        for kind, _, value in self.iter_plan(temp_path):
+            if kind == 'plan':
+                return value
+
+    def iter_plan(self, temp_path: str) -> Iterator[Tuple[str, int, Any]]:
+        """
+        Genera ('file', posición, registro) por cada archivo según se planifica y, al final,
+        ('plan', número_de_archivos, IngestPlan) con los archivos en el orden del listado.
+        """
+        start_time = time.time()
+        entries = list_temp_entries(temp_path, self.scanner.TOSEC_EXTENSIONS)
+        files: List[Any] = [None] * len(entries)
+        folders: Dict[str, Any] = {}
+
+        if self.use_processes(len(entries)):
+            workers = min(self.workers, (len(entries) + self.shard_size - 1) // self.shard_size)
+            shards = self._iter_shards(entries, workers)
+            mode = f"en {workers} procesos"
+        else:
+            shards = self._iter_serial(entries)
+            mode = 'en serie'
+        for start, records, shard_folders in shards:
+            for folder, state in shard_folders.items():
+                # Dos procesos vieron la misma carpeta distinta: cambió mientras se planificaba
+                if folders.setdefault(folder, state) != state:
+                    folders[folder] = CHANGED_WHILE_PLANNING
+            for offset, record in enumerate(records):
+                files[start + offset] = record
+                yield 'file', start + offset, record
+
+        plan = IngestPlan(temp_path, entries, files, folders, self.scanner.TOSEC_EXTENSIONS)
+        print(f"[PLAN] {len(files)} archivos planificados {mode} en {time.time() - start_time:.2f}s "
+              f"({len(folders)} carpetas consultadas)")
+        yield 'plan', len(files), plan
+
+    def _iter_serial(self, entries):
+        with self.scanner.batch_snapshot() as snapshot:
+            for i, (filename, ext, size, _) in enumerate(entries):
+                yield i, [self.scanner._plan_file(filename, ext, size)], {}
+            folders = snapshot.folder_states()
+        yield 0, [], folders
+
+    def _iter_shards(self, entries, workers: int):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(dict(self.scanner.config),)) as pool:
+            futures = [pool.submit(_plan_shard, start, entries[start:start + self.shard_size])
+                       for start in range(0, len(entries), self.shard_size)]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                # Si quien consume abandona el generador, no seguir planificando
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,106 @@
+"""
+Benchmark de throughput del motor de copia (copy_engine.CopyEngine) frente a shutil.copy2.
+
+Tres juegos de archivos, cada uno copiado a una carpeta destino recién creada:
+
+- TAP: 2000 archivos de 48 KB (ingesta típica de TEMP, dominada por abrir/cerrar)
+- DSK: 100 imágenes de 700 KB
+- IMG: 4 imágenes de 64 MB (discos duros/tarjetas)
+
+Variantes: shutil.copy2, el motor con búfer de 64 KB / 1 MB / 8 MB sin vías del kernel,
+el motor con copy_file_range/sendfile y con preasignación. Las variantes se intercalan en
+cada repetición y se toma la mejor pasada de cada una. Se comprueba contenido y mtime de
+todas las copias y se muestra la vía que usó el motor en cada caso.
+
+Uso: python bench_copy_engine.py [repeticiones] [carpeta_base] [carpeta_destino]
+(la carpeta destino puede estar en otro dispositivo para medir copias entre discos)
+"""
+
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from copy_engine import CopyEngine
+
+SETS = [('TAP', '.tap', 48 * 1024, 2000), ('DSK', '.dsk', 700 * 1024, 100), ('IMG', '.img', 64 * 1024 * 1024, 4)]
+
+
+def make_set(root, label, ext, size, count):
+    folder = os.path.join(root, 'TEMP', label)
+    os.makedirs(folder)
+    block = os.urandom(min(size, 1024 * 1024))
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"Juego {i:04d} (1985)(Editor){ext}")
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                f.write(block[:remaining])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+def run(copy, sources, dest_root):
+    shutil.rmtree(dest_root, ignore_errors=True)
+    os.makedirs(dest_root)
+    if hasattr(os, 'sync'):
+        os.sync()
+    start = time.perf_counter()
+    for src in sources:
+        copy(src, os.path.join(dest_root, os.path.basename(src)))
+    return time.perf_counter() - start
+
+
+def verify(sources, dest_root):
+    for src in sources:
+        dest = os.path.join(dest_root, os.path.basename(src))
+        assert filecmp.cmp(src, dest, shallow=False), dest
+        assert os.stat(src).st_mtime_ns == os.stat(dest).st_mtime_ns, dest
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    root = tempfile.mkdtemp(prefix='bench_copy_', dir=sys.argv[2] if len(sys.argv) > 2 else None)
+    dest_base = tempfile.mkdtemp(prefix='bench_copy_dest_', dir=sys.argv[3]) if len(sys.argv) > 3 else root
+    variants = [
+        ('shutil.copy2', None),
+        ('búfer 64 KB', CopyEngine(64 * 1024, zero_copy=False)),
+        ('búfer 1 MB', CopyEngine(1024 * 1024, zero_copy=False)),
+        ('búfer 8 MB', CopyEngine(8 * 1024 * 1024, zero_copy=False)),
+        ('kernel (copy_file_range/sendfile)', CopyEngine()),
+        ('kernel + preasignación', CopyEngine(preallocate=True)),
+    ]
+    try:
+        for label, ext, size, count in SETS:
+            sources = make_set(root, label, ext, size, count)
+            total = size * count
+            print(f"{label}: {count} archivos de {size // 1024} KB ({total / 1048576:.0f} MB), mejor de {repeat}")
+            dest_root = os.path.join(dest_base, 'DEST')
+            # Pasadas intercaladas (todas las variantes en cada repetición) para no favorecer a la primera
+            best = {}
+            used = {}
+            for _ in range(repeat):
+                for name, engine in variants:
+                    before = dict(engine.methods) if engine else {}
+                    elapsed = run(shutil.copy2 if engine is None else engine.copy, sources, dest_root)
+                    verify(sources, dest_root)
+                    best[name] = min(best.get(name, elapsed), elapsed)
+                    if engine:
+                        used[name] = ', '.join(m for m, n in engine.methods.items() if n > before.get(m, 0))
+            baseline = best[variants[0][0]]
+            for name, _ in variants:
+                print(f"  {name:<34} {total / best[name] / 1048576:8.0f} MB/s {count / best[name]:9.0f} arch/s "
+                      f"{baseline / best[name]:5.2f}x  {used.get(name, '')}")
+            shutil.rmtree(os.path.join(root, 'TEMP', label))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if dest_base != root:
+            shutil.rmtree(dest_base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark de la copia en abanico (copy_executor.fanout_copy) frente a N x shutil.copy2.
+
+Crea en una carpeta temporal archivos de TEMP de varios tamaños (.tap de 48 KB, .dsk de
+700 KB, imagen de 16 MB) y copia cada uno a N destinos (por defecto 8, como un juego TOSEC
+típico: ALFABETO, CARPETAS, TIPOS DE ARCHIVO, AÑOS, CLASICOS...). Para cada caso mide:
+
+- copy2 x N: el comportamiento anterior, que relee el origen por cada destino
+- fanout_copy: lectura única del origen y escritura del mismo búfer en los N destinos
+- CopyExecutor (fanout=False / fanout=True): lote completo con el ejecutor compartido
+
+y los bytes leídos del origen (rchar de /proc/self/io, solo Linux). Cada pasada escribe en
+carpetas destino recién creadas (como una ingesta real) y antes se pide al sistema que
+descarte el origen de la caché de páginas (posix_fadvise), para acercarse a un TEMP en USB
+o NAS donde cada relectura va al dispositivo. Tras cada método se comprueba contenido y mtime.
+
+Uso: python bench_fanout.py [destinos] [repeticiones] [carpeta_base]
+"""
+
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from copy_executor import CopyExecutor, CopyTask, fanout_copy
+
+SIZES = [('juego.tap', 48 * 1024, 40), ('juego.dsk', 700 * 1024, 10), ('imagen.img', 16 * 1024 * 1024, 1)]
+
+
+def read_bytes() -> int:
+    """Bytes leídos por el proceso (rchar) o -1 si no está disponible"""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+
+def evict(paths):
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def make_sources(root):
+    sources = []
+    for name, size, count in SIZES:
+        for i in range(count):
+            path = os.path.join(root, 'TEMP', f"{i:03d} {name}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            sources.append(path)
+    return sources
+
+
+def destinations(root, src, count):
+    return [os.path.join(root, 'COL', f"DEST{d:02d}", os.path.basename(src)) for d in range(count)]
+
+
+def prepare(root, sources, count):
+    """Carpetas destino vacías para la siguiente pasada"""
+    shutil.rmtree(os.path.join(root, 'COL'), ignore_errors=True)
+    for d in range(count):
+        os.makedirs(os.path.join(root, 'COL', f"DEST{d:02d}"))
+    if hasattr(os, 'sync'):
+        os.sync()
+    evict(sources)
+
+
+def verify(root, sources, count):
+    for src in sources:
+        for dest in destinations(root, src, count):
+            assert filecmp.cmp(src, dest, shallow=False), dest
+            assert os.stat(src).st_mtime_ns == os.stat(dest).st_mtime_ns, dest
+
+
+def timed(label, func, root, sources, count, repeat):
+    best = None
+    read = 0
+    for _ in range(repeat):
+        prepare(root, sources, count)
+        before = read_bytes()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        read = read_bytes() - before if before >= 0 else -1
+        best = elapsed if best is None else min(best, elapsed)
+    verify(root, sources, count)
+    total = sum(os.path.getsize(s) for s in sources)
+    read_text = f"{read / total:5.1f}x origen leído" if read >= 0 else 'lectura no medida'
+    print(f"  {label:<28} {best * 1000:9.1f} ms   {read_text}")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    root = tempfile.mkdtemp(prefix='bench_fanout_', dir=sys.argv[3] if len(sys.argv) > 3 else None)
+    try:
+        sources = make_sources(root)
+
+        def copy2_each():
+            for src in sources:
+                for dest in destinations(root, src, count):
+                    shutil.copy2(src, dest)
+
+        def fanout_each():
+            for src in sources:
+                errors = fanout_copy(src, destinations(root, src, count))
+                assert not any(errors), errors
+
+        tasks = [CopyTask(src, dest) for src in sources for dest in destinations(root, src, count)]
+
+        def executor(fanout):
+            copier = CopyExecutor(8, 4, fanout=fanout)
+
+            def run():
+                failed = [r for r in copier.run(tasks) if not r.ok]
+                assert not failed, failed[0]
+            return run
+
+        total = sum(os.path.getsize(s) for s in sources)
+        print(f"{len(sources)} archivos ({total / 1048576:.1f} MB) x {count} destinos, mejor de {repeat}:")
+        old = timed('copy2 x N', copy2_each, root, sources, count, repeat)
+        new = timed('fanout_copy', fanout_each, root, sources, count, repeat)
+        old_pool = timed('CopyExecutor (fanout=False)', executor(False), root, sources, count, repeat)
+        new_pool = timed('CopyExecutor (fanout=True)', executor(True), root, sources, count, repeat)
+        print(f"  en serie: {old / new:.2f}x, con el ejecutor: {old_pool / new_pool:.2f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
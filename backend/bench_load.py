@@ -0,0 +1,239 @@
+"""
+Prueba de carga del servidor de producción (server.py) con copias y tareas en segundo plano.
+
+Crea una colección de prueba, arranca la aplicación con el servidor de pool de hilos en un
+puerto libre y lanza varios clientes que navegan, buscan y consultan estado sin parar
+mientras otro hilo copia carpetas (/api/copy-folder) dentro de la carpeta que se está
+navegando y se reconstruyen el catálogo y el índice de búsqueda. Comprueba que:
+
+- todas las respuestas son 200 con JSON válido,
+- de varios arranques simultáneos del catálogo solo se acepta uno,
+- cada carpeta copiada es idéntica al origen,
+- al terminar, el listado servido (con la caché caliente) coincide con el disco.
+
+Muestra peticiones por segundo y latencias (p50/p95/p99).
+
+Uso: python bench_load.py [segundos] [clientes] [hilos_servidor]
+"""
+
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+COPY_SOURCE = 'GAME 000'
+
+
+def build_tree(base, letters=6, games=60, files=6):
+    """FE y TS con letras / carpetas de juego / archivos, TEMP con algunos archivos TOSEC"""
+    fe = os.path.join(base, 'FE')
+    ts = os.path.join(base, 'TS', 'TOSEC')
+    for root in (fe, ts):
+        for l in range(letters):
+            letter = os.path.join(root, chr(ord('A') + l))
+            for g in range(games):
+                game = os.path.join(letter, f"GAME {g:03d}")
+                os.makedirs(game)
+                for f in range(files):
+                    ext = ('.tap', '.tzx', '.z80', '.dsk', '.txt', '.zip')[f % 6]
+                    with open(os.path.join(game, f"Game {g:03d} (198{f})(Soft){ext}"), 'wb') as out:
+                        out.write(os.urandom(2048))
+    temp = os.path.join(base, 'TEMP')
+    os.makedirs(temp)
+    for g in range(20):
+        open(os.path.join(temp, f"Game {g:03d} (1986)(Soft)[a].tap"), 'wb').close()
+    os.makedirs(os.path.join(base, 'UPDATES'))
+    os.makedirs(os.path.join(base, 'BACKUP'))
+    return fe
+
+
+def configure(base):
+    """Variables de entorno que lee app.py (antes de importarlo)"""
+    os.environ.update({
+        'ZX_FE_PATH': os.path.join(base, 'FE'),
+        'ZX_TS_PATH': os.path.join(base, 'TS'),
+        'ZX_TS_TOSEC_SUBPATH': 'TOSEC',
+        'ZX_TEMP_PATH': os.path.join(base, 'TEMP'),
+        'ZX_UPDATES_TOSEC_PATH': os.path.join(base, 'UPDATES'),
+        'ZX_BACKUP_PATH': os.path.join(base, 'BACKUP'),
+        'ZX_CATALOG_PATH': os.path.join(base, 'catalog.db'),
+        'ZX_WATCH': 'off'
+    })
+
+
+class Client:
+    """Conexión keep-alive con el servidor; request() devuelve (estado, JSON o None, segundos)"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        start = time.perf_counter()
+        for attempt in (0, 1):
+            try:
+                self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+                response = self.conn.getresponse()
+                raw = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # El servidor cierra las conexiones keep-alive inactivas: reconectar una vez
+                self.conn.close()
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+                if attempt:
+                    raise
+        elapsed = time.perf_counter() - start
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+        return response.status, data, elapsed
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def tree_files(root):
+    """{archivo relativo: tamaño} de un árbol"""
+    found = {}
+    for folder, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(folder, name)
+            found[os.path.relpath(path, root)] = os.path.getsize(path)
+    return found
+
+
+def start_catalog(port, starts=8):
+    """Lanza 'starts' reconstrucciones del catálogo a la vez; devuelve cuántas se aceptaron"""
+    barrier = threading.Barrier(starts)
+    codes = []
+
+    def start():
+        client = Client(port)
+        barrier.wait()
+        codes.append(client.request('POST', '/api/catalog/rebuild', {})[0])
+
+    threads = [threading.Thread(target=start) for _ in range(starts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return codes.count(200)
+
+
+def run(seconds, clients, server_threads):
+    base = tempfile.mkdtemp(prefix='zx_load_')
+    try:
+        fe = build_tree(base)
+        configure(base)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as zx
+        from scanner import DirectoryScanner
+        from server import make_server
+
+        zx.init_services()
+
+        server = make_server(zx.app, '127.0.0.1', 0, server_threads)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+        print(f"Árbol: {base}  servidor: {server_threads} hilos  clientes: {clients}  duración: {seconds}s")
+
+        accepted = start_catalog(port)
+        print(f"Arranques simultáneos del catálogo aceptados: {accepted} de 8")
+        failures = [] if accepted == 1 else [f'Se aceptaron {accepted} arranques del catálogo']
+
+        stop = threading.Event()
+        latencies = []
+        lock = threading.Lock()
+        urls = [
+            ('GET', '/api/browse/FE', None),
+            ('GET', '/api/browse/FE/A', None),
+            ('GET', '/api/browse/TS/B', None),
+            ('GET', '/api/search?q=game%2001&limit=50', None),
+            ('GET', '/api/search/status', None),
+            ('GET', '/api/cache/stats', None),
+            ('GET', '/api/catalog/status', None),
+            ('GET', '/api/jobs', None),
+            ('POST', '/api/temp/preview', {'target_collection': 'TS'})
+        ]
+
+        def reader(n):
+            client = Client(port)
+            i = n
+            while not stop.is_set():
+                method, path, body = urls[i % len(urls)]
+                i += 1
+                status, data, elapsed = client.request(method, path, body)
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 200 or data is None:
+                        failures.append(f'{method} {path}: {status}')
+
+        copies = []
+
+        def writer():
+            # Copias dentro de FE/A, la carpeta que están navegando los clientes
+            client = Client(port)
+            while not stop.is_set():
+                name = f'LOAD {len(copies):03d}'
+                body = {'source_path': os.path.join(fe, 'A', COPY_SOURCE), 'dest_collection': 'FE',
+                        'dest_folder': 'A', 'folder_name': name}
+                status, data, _ = client.request('POST', '/api/copy-folder', body)
+                if status != 200 or not data or not data.get('success'):
+                    failures.append(f'copy-folder {name}: {status} {data}')
+                copies.append(name)
+                if len(copies) % 5 == 0:
+                    client.request('POST', '/api/search/rebuild')
+                    client.request('POST', '/api/catalog/refresh', {})
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(clients)]
+        threads.append(threading.Thread(target=writer))
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        expected = tree_files(os.path.join(fe, 'A', COPY_SOURCE))
+        for name in copies:
+            if tree_files(os.path.join(fe, 'A', name)) != expected:
+                failures.append(f'Copia distinta del origen: {name}')
+        # Listado servido (con la caché de toda la carga) frente a un escáner nuevo sin caché
+        client = Client(port)
+        fresh = DirectoryScanner(zx.CONFIG)
+        for rel in ('A', 'B'):
+            _, served, _ = client.request('GET', f'/api/browse/FE/{rel}')
+            if served != fresh.get_folder_contents(os.path.join(fe, rel), collection='FE'):
+                failures.append(f'El listado de FE/{rel} no coincide con el disco')
+        server.shutdown()
+
+        print(f"{len(latencies)} peticiones en {elapsed:.1f}s: {len(latencies) / elapsed:.0f} peticiones/s")
+        print(f"Latencia p50 {percentile(latencies, 50) * 1000:.1f} ms  p95 {percentile(latencies, 95) * 1000:.1f} ms"
+              f"  p99 {percentile(latencies, 99) * 1000:.1f} ms")
+        print(f"Carpetas copiadas durante la carga: {len(copies)}")
+        if failures:
+            print(f"{len(failures)} fallos:")
+            for failure in failures[:20]:
+                print(f"  {failure}")
+            return 1
+        print("Sin errores: respuestas válidas, copias idénticas y listados iguales al disco")
+        return 0
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    server_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    sys.exit(run(seconds, clients, server_threads))
@@ -0,0 +1,150 @@
+"""
+Benchmark del motor de listado con os.scandir frente al listado antiguo
+(os.listdir + os.path.isdir + os.path.getsize por entrada y tres ordenaciones).
+
+Crea una carpeta tipo 'ALFABETO TOSEC/<letra>' con N archivos y unas cuantas
+subcarpetas, y cuenta las llamadas al sistema de ficheros hechas desde Python
+(listdir/scandir/stat). En Linux cada DirEntry.stat() cuenta como un stat; en
+Windows scandir ya trae el tamaño y ese stat no existe.
+
+Uso: python bench_scandir.py [num_archivos]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from scanner import DirectoryScanner
+
+calls = Counter()
+
+
+class _CountingEntry:
+    """Envoltorio de DirEntry que cuenta el primer stat() (el único que llega al sistema)"""
+
+    def __init__(self, entry):
+        self._entry = entry
+        self._stat_done = False
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, **kwargs):
+        return self._entry.is_dir(**kwargs)
+
+    def is_file(self, **kwargs):
+        return self._entry.is_file(**kwargs)
+
+    def stat(self, **kwargs):
+        if not self._stat_done and os.name != 'nt':
+            calls['stat'] += 1
+            self._stat_done = True
+        return self._entry.stat(**kwargs)
+
+
+class _CountingScandir:
+    def __init__(self, it):
+        self._it = it
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        for entry in self._it:
+            yield _CountingEntry(entry)
+
+
+def install_counters():
+    real_stat, real_listdir, real_scandir = os.stat, os.listdir, os.scandir
+
+    def stat(*args, **kwargs):
+        calls['stat'] += 1
+        return real_stat(*args, **kwargs)
+
+    def listdir(*args, **kwargs):
+        calls['listdir'] += 1
+        return real_listdir(*args, **kwargs)
+
+    def scandir(*args, **kwargs):
+        calls['scandir'] += 1
+        return _CountingScandir(real_scandir(*args, **kwargs))
+
+    os.stat, os.listdir, os.scandir = stat, listdir, scandir
+    return real_stat, real_listdir, real_scandir
+
+
+def legacy_folder_contents(scanner, folder_path):
+    """Copia del listado anterior (solo la parte de archivos y conteos directos)"""
+    items = []
+    for item in sorted(os.listdir(folder_path)):
+        item_path = os.path.join(folder_path, item)
+        if os.path.isdir(item_path):
+            direct = sum(1 for i in os.listdir(item_path) if os.path.isfile(os.path.join(item_path, i)))
+            items.append({'name': item, 'type': 'folder', 'direct_files': direct})
+        else:
+            ext = os.path.splitext(item)[1].lower()
+            if ext in scanner.ALL_DISPLAYABLE:
+                items.append({'name': item, 'type': 'file', 'size': os.path.getsize(item_path)})
+    folders = sorted([i for i in items if i['type'] == 'folder'], key=lambda x: x['name'].lower())
+    files = sorted([i for i in items if i['type'] == 'file'], key=lambda x: x['name'].lower())
+    return folders + files
+
+
+def new_folder_contents(scanner, folder_path):
+    """El mismo trabajo con el motor de scandir"""
+    items = []
+    for item, is_dir, size, ext in scanner._list_entries(folder_path, scanner.ALL_DISPLAYABLE):
+        if is_dir:
+            items.append({'name': item, 'type': 'folder',
+                          'direct_files': scanner._count_direct_files(os.path.join(folder_path, item))})
+        elif ext in scanner.ALL_DISPLAYABLE:
+            items.append({'name': item, 'type': 'file', 'size': size})
+    return items
+
+
+def build_folder(base, num_files, num_folders=20):
+    for i in range(num_files):
+        with open(os.path.join(base, f"Game {i:05d} (1985)(Ultimate).tap"), 'wb') as f:
+            f.write(b'\0' * 16)
+    for i in range(num_folders):
+        sub = os.path.join(base, f"GAME {i:03d}")
+        os.makedirs(sub)
+        for j in range(5):
+            open(os.path.join(sub, f"part {j}.tap"), 'wb').close()
+
+
+def run(label, func, scanner, path, repeat=5):
+    calls.clear()
+    func(scanner, path)
+    syscalls = dict(calls)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(scanner, path)
+    elapsed = (time.perf_counter() - start) / repeat
+    total = sum(syscalls.values())
+    print(f"{label:<10} {total:>8} llamadas  {syscalls}  {elapsed * 1000:8.1f} ms")
+    return result, total
+
+
+if __name__ == "__main__":
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    base = tempfile.mkdtemp(prefix='zx_bench_')
+    originals = None
+    try:
+        build_folder(base, num_files)
+        scanner = DirectoryScanner({})
+        originals = install_counters()
+        print(f"Carpeta con {num_files} archivos y 20 subcarpetas")
+        old, old_calls = run('listdir', legacy_folder_contents, scanner, base)
+        new, new_calls = run('scandir', new_folder_contents, scanner, base)
+        assert old == new, 'Los listados no coinciden'
+        print(f"Reducción de llamadas al sistema: {old_calls - new_calls} ({100 * (old_calls - new_calls) / old_calls:.0f}%)")
+    finally:
+        if originals:
+            os.stat, os.listdir, os.scandir = originals
+        shutil.rmtree(base, ignore_errors=True)
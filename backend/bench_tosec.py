@@ -0,0 +1,178 @@
+"""
+Benchmark del parser TOSEC (tosec.py) frente al parser original de DirectoryScanner.
+
+Genera N nombres TOSEC variados (fechas, rangos de años, 19xx, flags [a2] [cr ...]
+[t +2] [!], campos (Side A) (ES) (PD)... y algún nombre no TOSEC), comprueba que
+título/año/editor/categoría coinciden con el parser original y mide nombres/segundo
+(la mejor de REPEATS rondas; en cada ronda se miden todas las variantes una detrás de otra
+para que el ruido de la máquina les afecte por igual, y las medidas en frío vacían las
+cachés antes de cada pasada):
+
+- original: regex recompilada/buscada en la caché de 're' en cada llamada
+- parse_tosec en frío (caché vacía) y en caliente (segunda pasada, como en
+  escaneo -> previsualización -> copia)
+- parse_many en frío
+- _parse_tosec_filename (diccionario nuevo en cada llamada) en frío y en caliente
+
+Uso: python bench_tosec.py [num_nombres]
+"""
+
+import gc
+import os
+import random
+import re
+import sys
+import time
+
+import tosec
+from scanner import DirectoryScanner
+
+TITLES = ['Manic Miner', 'Jet Set Willy', 'Knight Lore', 'Head over Heels', 'Elite', 'Chase H.Q.',
+          'R-Type', 'Dizzy - The Ultimate Cartoon Adventure', 'Target - Renegade', 'Springelr',
+          'Cursed Castle 2', 'Pac-Man', 'Match Day II', 'Batman - The Caped Crusader']
+PUBLISHERS = ['Ultimate', 'Ocean', 'Codemasters', 'Imagine', 'Firebird', 'Microbyte', 'Retroworks', '-']
+YEARS = ['1982', '1985', '1987', '1991', '19xx', '2012', '2020', '1988-2025', '20xx']
+PARENS = ['', '(48K)', '(128K)', '(+2)', '(ES)', '(es)', '(en-es)', '(PD)', '(Side A)', '(Side B)',
+          '(Tape 1 of 2)', '(Disk 2 of 2 Side B)', '(beta)', '(PAL)', '(Release 2)']
+FLAGS = ['', '[a]', '[a2]', '[!]', '[cr Mr Cracker]', '[t +2]', '[t +3 Hackers]', '[h]', '[h Team]',
+         '[tr es]', '[b]', '[f]', '[m]', '[o]', '[re-release]']
+EXTENSIONS = ['.tap', '.tzx', '.z80', '.sna', '.dsk']
+REPEATS = 7
+
+
+def legacy_parse(filename):
+    """Copia literal del _parse_tosec_filename original"""
+    pattern = r'^(?P<title>.*?)\s*\((?P<year>\d{4}(?:-\d{4})?|19xx|20xx)\)\((?P<publisher>.*?)\)'
+    match = re.match(pattern, filename)
+
+    if match:
+        info = match.groupdict()
+        year_str = info['year'].lower()
+
+        if 'xx' in year_str:
+            category = 'unknown'
+            year_int = 0
+            years = []
+        else:
+            years = []
+            try:
+                if '-' in year_str:
+                    parts = year_str.split('-')
+                    start_year = int(parts[0])
+                    end_year = int(parts[1])
+                    years = [start_year, end_year]
+                    year_int = start_year
+                else:
+                    year_int = int(year_str)
+                    years = [year_int]
+
+                has_classic = any(1982 <= y <= 1993 for y in years)
+                has_homebrew = any(1994 <= y <= 2025 for y in years)
+
+                if has_classic and has_homebrew:
+                    category = 'both'
+                elif has_classic:
+                    category = 'classic'
+                elif has_homebrew:
+                    category = 'homebrew'
+                else:
+                    category = 'unknown'
+            except ValueError:
+                year_int = 0
+                category = 'unknown'
+                years = []
+
+        return {
+            'title': info['title'].strip(),
+            'year': info['year'],
+            'year_int': year_int,
+            'years': years,
+            'publisher': info['publisher'].strip(),
+            'category': category,
+            'is_tosec': True
+        }
+
+    return {
+        'title': os.path.splitext(filename)[0],
+        'year': 'unknown',
+        'year_int': 0,
+        'years': [],
+        'publisher': 'unknown',
+        'category': 'unknown',
+        'is_tosec': False
+    }
+
+
+def make_names(count, seed=15):
+    random.seed(seed)
+    names = set()
+    while len(names) < count:
+        title = f"{random.choice(TITLES)} {random.randint(1, 999)}"
+        if random.random() < 0.03:
+            names.add(f"{title}{random.choice(EXTENSIONS)}")
+            continue
+        # Como en los sets reales: casi siempre cero o un campo extra y cero o un flag
+        parens = random.choice(PARENS) + (random.choice(PARENS) if random.random() < 0.1 else '')
+        flags = random.choice(FLAGS) + (random.choice(FLAGS) if random.random() < 0.1 else '')
+        names.add(f"{title} ({random.choice(YEARS)})({random.choice(PUBLISHERS)}){parens}{flags}{random.choice(EXTENSIONS)}")
+    return sorted(names)
+
+
+def clear_caches():
+    for cached in (tosec.parse_tosec, tosec._parse_fields, tosec._parse_year, tosec._classify_paren,
+                   tosec._parse_bracket, tosec._fields_dict):
+        cached.cache_clear()
+
+
+def timed(cases, names):
+    """
+    Nombres/segundo de cada (etiqueta, función, en frío): la mejor de REPEATS rondas
+    alternadas. Una medida en caliente va detrás de la suya en frío (cachés llenas).
+    """
+    times = {label: [] for label, _, _ in cases}
+    for _ in range(REPEATS):
+        for label, func, cold in cases:
+            if cold:
+                clear_caches()
+            gc.collect()
+            start = time.perf_counter()
+            func(names)
+            times[label].append(time.perf_counter() - start)
+    rates = {}
+    for label, _, _ in cases:
+        elapsed = min(times[label])
+        rates[label] = len(names) / elapsed
+        print(f"  {label:<38} {elapsed * 1000:8.1f} ms  {rates[label]:>12,.0f} nombres/s")
+    return rates
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    names = make_names(count)
+    scanner = DirectoryScanner({})
+
+    core = ('title', 'year', 'year_int', 'years', 'publisher', 'category', 'is_tosec')
+    for name in names:
+        new = scanner._parse_tosec_filename(name)
+        assert {k: new[k] for k in core} == legacy_parse(name), name
+        assert list(new.items()) == list(tosec.parse_tosec(name).to_dict().items()), name
+    flagged = sum(1 for r in tosec.parse_many(names) if r.flags)
+    print(f"{len(names)} nombres: campos básicos idénticos al parser original, {flagged} con flags de volcado")
+
+    parse_dict = scanner._parse_tosec_filename
+    rates = timed([('original', lambda ns: [legacy_parse(n) for n in ns], True),
+                   ('parse_tosec (frío)', lambda ns: [tosec.parse_tosec(n) for n in ns], True),
+                   ('parse_tosec (caliente)', lambda ns: [tosec.parse_tosec(n) for n in ns], False),
+                   ('parse_many (frío)', tosec.parse_many, True),
+                   ('_parse_tosec_filename (frío, dict)', lambda ns: [parse_dict(n) for n in ns], True),
+                   ('_parse_tosec_filename (caliente, dict)', lambda ns: [parse_dict(n) for n in ns], False)], names)
+    original = rates['original']
+    print(f"  frío: {rates['parse_tosec (frío)'] / original:.2f}x el original (registro), "
+          f"{rates['_parse_tosec_filename (frío, dict)'] / original:.2f}x (dict)")
+    print(f"  caliente: {rates['parse_tosec (caliente)'] / original:.1f}x el original (registro), "
+          f"{rates['_parse_tosec_filename (caliente, dict)'] / original:.1f}x (dict)")
+    print(f"  caché: {tosec.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark del recorrido paralelo (tree_walker) con 1, 4 y 16 hilos.
+
+Crea un árbol tipo colección (letras / carpetas de juego / archivos) y mide
+scan_root_folders (conteos de subárbol) y calculate_stats con cada número de
+hilos, comprobando que los resultados son idénticos al recorrido en serie.
+
+En disco local el listado es casi instantáneo; para simular un NAS se puede
+añadir una latencia por listado de carpeta (en milisegundos).
+
+Uso: python bench_walker.py [latencia_ms] [ruta_existente]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from scanner import DirectoryScanner
+
+WORKERS = (1, 4, 16)
+
+
+def build_tree(base, letters=12, games=40, files=6):
+    for l in range(letters):
+        letter = os.path.join(base, chr(ord('A') + l))
+        for g in range(games):
+            game = os.path.join(letter, f"GAME {g:03d}")
+            os.makedirs(game)
+            for f in range(files):
+                ext = ('.tap', '.tzx', '.z80', '.dsk', '.txt', '.zip')[f % 6]
+                open(os.path.join(game, f"Game {g:03d} (198{f})(Soft){ext}"), 'wb').close()
+
+
+def install_latency(ms):
+    real_scandir = os.scandir
+
+    def scandir(*args, **kwargs):
+        time.sleep(ms / 1000.0)
+        return real_scandir(*args, **kwargs)
+
+    os.scandir = scandir
+    return real_scandir
+
+
+def run(workers, path):
+    # Scanner nuevo en cada pasada: la caché empieza vacía
+    scanner = DirectoryScanner({'WALK_WORKERS': workers})
+    start = time.perf_counter()
+    roots = scanner.scan_root_folders(path)
+    stats = scanner._get_collection_stats(path)
+    elapsed = time.perf_counter() - start
+    return (roots, stats), elapsed
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    target = sys.argv[2] if len(sys.argv) > 2 else None
+    base = target or tempfile.mkdtemp(prefix='zx_bench_')
+    real_scandir = None
+    try:
+        if not target:
+            build_tree(base)
+        if latency:
+            real_scandir = install_latency(latency)
+        print(f"Árbol: {base}  latencia por listado: {latency} ms")
+        baseline, serial_time = run(1, base)
+        print(f"{'hilos':>6} {'tiempo':>10} {'aceleración':>12}")
+        for workers in WORKERS:
+            result, elapsed = run(workers, base)
+            assert result == baseline, f'Resultados distintos con {workers} hilos'
+            print(f"{workers:>6} {elapsed * 1000:8.0f} ms {serial_time / elapsed:11.1f}x")
+        print(f"Resultados idénticos al recorrido en serie ({baseline[1]['total_files']} archivos)")
+    finally:
+        if real_scandir:
+            os.scandir = real_scandir
+        if not target:
+            shutil.rmtree(base, ignore_errors=True)
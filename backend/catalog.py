@@ -0,0 +1,530 @@
+"""
+Catálogo persistente (SQLite) de las colecciones FE, TS y UPDATES_TOSEC.
+
+Guarda una fila por archivo/carpeta (ruta, carpeta padre, tamaño, mtime,
+extensión y campos TOSEC parseados) para que los endpoints de lectura
+consulten la base de datos en lugar de recorrer el disco en cada petición.
+El catálogo sobrevive a reinicios; se reconstruye o refresca de forma
+explícita mediante la API (/api/catalog/*).
+
+Lecturas y escrituras no se esperan entre sí: las consultas usan la conexión compartida
+(bajo _lock) y en modo WAL siguen viendo el último commit; las escrituras (sincronizaciones,
+refresh, rebuild) se turnan con _write_lock en transacciones cortas, así ningún escritor se
+queda esperando el bloqueo de SQLite con _lock tomado. Un rebuild hace commit por lotes y,
+mientras dura, su colección no cuenta como catalogada (las lecturas van al disco).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Callable, Iterable
+
+from tree_walker import ParallelTreeWalker
+
+
+def normalize_path(path: str) -> str:
+    """Normaliza una ruta para usarla como clave del catálogo"""
+    return os.path.normpath(path)
+
+
+def _prefix_bounds(path: str) -> tuple:
+    """Límites (inclusivo, exclusivo) para buscar todo lo que cuelga de 'path' con el índice de la PK"""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class CollectionCatalog:
+    """Catálogo en disco de los árboles de las colecciones"""
+
+    SCHEMA_VERSION = 1
+    BATCH_SIZE = 5000
+
+    def __init__(self, db_path: str, parse_filename: Callable[[str], Dict[str, Any]], tosec_extensions: Iterable[str] = (),
+                 walker: Optional[ParallelTreeWalker] = None):
+        self.db_path = db_path
+        self.parse_filename = parse_filename
+        self.tosec_extensions = set(tosec_extensions)
+        # Recorrido de las reconstrucciones completas (en serie si no se indica otro)
+        self.walker = walker or ParallelTreeWalker(1)
+        self._lock = threading.RLock()
+        # Conexión compartida para lecturas (protegida por _lock)
+        self._conn = self._connect()
+        self._create_schema()
+        # Un escritor a la vez (SQLite solo admite uno): sincronizaciones con _write_conn,
+        # rebuild y refresh con su propia conexión, siempre en transacciones cortas
+        self._write_lock = threading.Lock()
+        self._write_conn = self._connect()
+        # Colecciones que se están reconstruyendo ahora mismo (protegido por _lock)
+        self._building = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # lower() de SQLite solo entiende ASCII; usamos el de Python para Ñ, acentos, etc.
+        conn.create_function('py_lower', 1, lambda s: s.lower() if s is not None else None, deterministic=True)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS roots (
+                    collection TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    built_at REAL,
+                    refreshed_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    collection TEXT NOT NULL,
+                    is_dir INTEGER NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    mtime REAL NOT NULL DEFAULT 0,
+                    extension TEXT,
+                    title TEXT,
+                    year TEXT,
+                    year_int INTEGER,
+                    publisher TEXT,
+                    category TEXT,
+                    is_tosec INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries(parent);
+                CREATE INDEX IF NOT EXISTS idx_entries_collection ON entries(collection, is_dir);
+            ''')
+            self._conn.execute(
+                'INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)',
+                ('schema_version', str(self.SCHEMA_VERSION))
+            )
+
+    @contextmanager
+    def _writing(self, conn: sqlite3.Connection):
+        """Transacción de escritura en 'conn', con el turno de escritor del proceso"""
+        with self._write_lock, conn:
+            yield conn
+
+    def _is_building(self, collection: str) -> bool:
+        with self._lock:
+            return collection in self._building
+
+    # ============== CONSTRUCCIÓN ==============
+
+    def _make_row(self, collection: str, parent: str, entry: os.DirEntry) -> tuple:
+        """Convierte una entrada de scandir en una fila de 'entries'"""
+        is_dir = entry.is_dir(follow_symlinks=False)
+        try:
+            st = entry.stat(follow_symlinks=False)
+            size = 0 if is_dir else st.st_size
+            mtime = st.st_mtime
+        except OSError:
+            size, mtime = 0, 0
+        if is_dir:
+            return (entry.path, parent, entry.name, collection, 1, size, mtime,
+                    None, None, None, None, None, None, None)
+
+        ext = os.path.splitext(entry.name)[1].lower()
+        if ext in self.tosec_extensions:
+            info = self.parse_filename(entry.name)
+            tosec = (info['title'], info['year'], info['year_int'], info['publisher'],
+                     info['category'], 1 if info['is_tosec'] else 0)
+        else:
+            tosec = (None, None, None, None, None, None)
+        return (entry.path, parent, entry.name, collection, 0, size, mtime, ext) + tosec
+
+    def _insert_rows(self, conn: sqlite3.Connection, rows: List[tuple]):
+        conn.executemany(
+            'INSERT OR REPLACE INTO entries(path, parent, name, collection, is_dir, size, mtime, extension, '
+            'title, year, year_int, publisher, category, is_tosec) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+            rows
+        )
+
+    def _index_tree(self, conn: sqlite3.Connection, collection: str, root: str, batched: bool = False) -> int:
+        """
+        Recorre 'root' con self.walker e inserta todas sus entradas. Devuelve el número de archivos.
+        Los hilos del walker listan y preparan las filas (stat y parseo TOSEC); las inserciones
+        se hacen aquí, en la conexión de escritura. Con batched=True cada lote es una transacción
+        propia (rebuild); si no, las filas entran en la transacción en curso del llamador.
+        """
+        files = 0
+        rows = []
+        
+        def process(current, entries):
+            return [self._make_row(collection, current, entry) for entry in entries]
+        
+        def flush():
+            if batched:
+                with self._writing(conn):
+                    self._insert_rows(conn, rows)
+            else:
+                self._insert_rows(conn, rows)
+        
+        for _, folder_rows in self.walker.walk(root, process):
+            rows.extend(folder_rows)
+            files += sum(1 for row in folder_rows if not row[4])
+            if len(rows) >= self.BATCH_SIZE:
+                flush()
+                rows = []
+        if rows:
+            flush()
+        return files
+
+    def _delete_subtree(self, conn: sqlite3.Connection, path: str):
+        low, high = _prefix_bounds(path)
+        conn.execute('DELETE FROM entries WHERE path >= ? AND path < ?', (low, high))
+
+    def rebuild(self, collection: str, root: str) -> Dict[str, Any]:
+        """Reconstruye desde cero el catálogo de una colección"""
+        root = normalize_path(root)
+        if not os.path.isdir(root):
+            return {'success': False, 'error': f'La ruta {root} no existe'}
+
+        with self._lock:
+            if collection in self._building:
+                return {'success': False, 'error': f'El catálogo de {collection} ya se está reconstruyendo'}
+            self._building.add(collection)
+        start = time.time()
+        conn = self._connect()
+        try:
+            before = self._folder_state(conn, collection, root)
+            # Sin fila en 'roots' la colección no cuenta como catalogada hasta el último lote
+            # (ni mientras se construye ni si el proceso se corta a medias)
+            with self._writing(conn):
+                conn.execute('DELETE FROM roots WHERE collection = ?', (collection,))
+                conn.execute('DELETE FROM entries WHERE collection = ?', (collection,))
+                self._delete_subtree(conn, root)
+            files = self._index_tree(conn, collection, root, batched=True)
+            now = time.time()
+            with self._writing(conn):
+                conn.execute(
+                    'INSERT OR REPLACE INTO roots(collection, path, built_at, refreshed_at) VALUES (?, ?, ?, ?)',
+                    (collection, root, now, now)
+                )
+            changed_folders, changed_paths = self._diff_state(before, self._folder_state(conn, collection, root))
+        finally:
+            conn.close()
+            with self._lock:
+                self._building.discard(collection)
+
+        return {
+            'success': True,
+            'collection': collection,
+            'path': root,
+            'total_files': files,
+            'elapsed_seconds': round(time.time() - start, 2),
+            'changed_folders': changed_folders,
+            'changed_paths': changed_paths
+        }
+
+    def _folder_state(self, conn: sqlite3.Connection, collection: str, root: str) -> Dict[str, tuple]:
+        """Ruta -> (es carpeta, tamaño, mtime) de las carpetas de la colección y los archivos de la raíz"""
+        return {row['path']: (row['is_dir'], row['size'], row['mtime']) for row in conn.execute(
+            'SELECT path, is_dir, size, mtime FROM entries WHERE collection = ? AND (is_dir = 1 OR parent = ?)',
+            (collection, root)
+        )}
+
+    @staticmethod
+    def _diff_state(before: Dict[str, tuple], after: Dict[str, tuple]) -> tuple:
+        """
+        Cambios entre dos _folder_state, con el mismo significado que en _refresh_walk:
+        carpetas con otro mtime (su contenido directo cambió) y entradas nuevas, borradas o
+        modificadas (de las carpetas nuevas o borradas solo la más alta de cada subárbol).
+        """
+        folders = sorted(p for p, state in after.items()
+                         if state[0] and p in before and before[p][0] and before[p][2] != state[2])
+        gone = before.keys() - after.keys()
+        new = after.keys() - before.keys()
+        paths = [p for p in gone if os.path.dirname(p) not in gone]
+        paths += [p for p in new if os.path.dirname(p) not in new]
+        paths += [p for p, state in after.items()
+                  if p in before and before[p] != state and not (state[0] and before[p][0])]
+        return folders, sorted(paths)
+
+    def _sync_directory(self, conn: sqlite3.Connection, collection: str, path: str) -> Dict[str, Any]:
+        """
+        Sincroniza los hijos directos de 'path' con el disco.
+        Las subcarpetas nuevas se indexan completas; las existentes conservan su mtime
+        guardado para que refresh() detecte después si hay que revisarlas.
+        'paths' son los hijos dados de alta, de baja o modificados (una carpeta nueva o
+        borrada cuenta como una sola ruta, con todo su subárbol).
+        """
+        stored = {
+            row['name']: row for row in conn.execute(
+                'SELECT name, is_dir, size, mtime FROM entries WHERE parent = ?', (path,)
+            )
+        }
+        added = removed = updated = 0
+        rows = []
+        seen = set()
+        changed = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    seen.add(entry.name)
+                    row = self._make_row(collection, path, entry)
+                    old = stored.get(entry.name)
+                    if old is None:
+                        rows.append(row)
+                        changed.append(entry.path)
+                        added += 1
+                        if row[4]:
+                            self._index_tree(conn, collection, entry.path)
+                    elif old['is_dir'] != row[4]:
+                        self._delete_subtree(conn, entry.path)
+                        rows.append(row)
+                        changed.append(entry.path)
+                        updated += 1
+                        if row[4]:
+                            self._index_tree(conn, collection, entry.path)
+                    elif not row[4] and (old['size'] != row[5] or old['mtime'] != row[6]):
+                        rows.append(row)
+                        changed.append(entry.path)
+                        updated += 1
+        except (PermissionError, OSError):
+            pass
+
+        for name, old in stored.items():
+            if name not in seen:
+                child = os.path.join(path, name)
+                conn.execute('DELETE FROM entries WHERE path = ?', (child,))
+                if old['is_dir']:
+                    self._delete_subtree(conn, child)
+                changed.append(child)
+                removed += 1
+
+        if rows:
+            self._insert_rows(conn, rows)
+        return {'added': added, 'removed': removed, 'updated': updated, 'paths': changed}
+
+    def _refresh_walk(self, conn: sqlite3.Connection, collection: str, start_path: str) -> Dict[str, int]:
+        """
+        Recorre las carpetas bajo 'start_path' y re-sincroniza las que tienen un mtime distinto al guardado.
+        Cada carpeta cambiada es una transacción corta en 'conn' (una conexión propia del llamador).
+        'changed_folders' son las carpetas cuyo contenido directo cambió y 'changed_paths' las
+        entradas afectadas (ver _sync_directory), para actualizar solo eso en caché e índice.
+        """
+        totals = {'added': 0, 'removed': 0, 'updated': 0, 'dirs_rescanned': 0,
+                  'changed_folders': [], 'changed_paths': []}
+        # La carpeta inicial se sincroniza siempre (la raíz ni siquiera tiene fila en 'entries')
+        stack = [(start_path, None)]
+        while stack:
+            current, stored_mtime = stack.pop()
+            try:
+                disk_mtime = os.stat(current).st_mtime
+            except OSError:
+                continue
+            if stored_mtime is None or stored_mtime != disk_mtime:
+                with self._writing(conn):
+                    changes = self._sync_directory(conn, collection, current)
+                    conn.execute('UPDATE entries SET mtime = ? WHERE path = ?', (disk_mtime, current))
+                for key in ('added', 'removed', 'updated'):
+                    totals[key] += changes[key]
+                totals['dirs_rescanned'] += 1
+                if changes['paths']:
+                    totals['changed_folders'].append(current)
+                    totals['changed_paths'].extend(changes['paths'])
+            for row in conn.execute(
+                'SELECT path, mtime FROM entries WHERE parent = ? AND is_dir = 1', (current,)
+            ).fetchall():
+                stack.append((row['path'], row['mtime']))
+        return totals
+
+    def refresh(self, collection: str, root: str) -> Dict[str, Any]:
+        """
+        Refresco incremental: solo vuelve a listar las carpetas cuyo mtime ha cambiado.
+        Recorre las carpetas (no los archivos), por lo que es mucho más barato que un rebuild.
+        """
+        root = normalize_path(root)
+        if not self.has_root(collection):
+            return self.rebuild(collection, root)
+        if not os.path.isdir(root):
+            return {'success': False, 'error': f'La ruta {root} no existe'}
+
+        start = time.time()
+        conn = self._connect()
+        try:
+            totals = self._refresh_walk(conn, collection, root)
+            with self._writing(conn):
+                conn.execute('UPDATE roots SET refreshed_at = ? WHERE collection = ?', (time.time(), collection))
+        finally:
+            conn.close()
+
+        totals.update({
+            'success': True,
+            'collection': collection,
+            'path': root,
+            'elapsed_seconds': round(time.time() - start, 2)
+        })
+        return totals
+
+    def sync_paths(self, paths: Iterable[str], recursive: bool = False):
+        """
+        Actualiza el catálogo tras una operación de la propia aplicación (copiar, borrar, renombrar...).
+        Se re-sincroniza la carpeta padre de cada ruta afectada; con recursive=True también
+        se revisa el subárbol de las rutas que son carpetas (copias de carpetas completas).
+        """
+        paths = [normalize_path(p) for p in paths if p]
+        self.sync_folders({os.path.dirname(p) for p in paths})
+        if recursive:
+            conn = self._connect()
+            try:
+                for path in paths:
+                    collection = self.collection_for(path)
+                    if collection and not self._is_building(collection) and os.path.isdir(path):
+                        self._refresh_walk(conn, collection, path)
+            finally:
+                conn.close()
+
+    def sync_folders(self, folders: Iterable[str]):
+        """Re-sincroniza los hijos directos de las carpetas indicadas (cambios de contenido sin detalle)"""
+        folders = {normalize_path(f) for f in folders if f}
+        if not folders:
+            return
+        with self._writing(self._write_conn) as conn:
+            for folder in folders:
+                collection = self.collection_for(folder)
+                if not collection or self._is_building(collection):
+                    continue
+                if not os.path.isdir(folder):
+                    continue  # borrada: su carpeta padre ya la da de baja
+                self._ensure_parents(conn, collection, folder)
+                self._sync_directory(conn, collection, folder)
+                try:
+                    conn.execute('UPDATE entries SET mtime = ? WHERE path = ?', (os.stat(folder).st_mtime, folder))
+                except OSError:
+                    pass
+
+    def _ensure_parents(self, conn: sqlite3.Connection, collection: str, path: str):
+        """Da de alta las carpetas intermedias creadas con makedirs que aún no están en el catálogo"""
+        root = self._root_of(path)
+        missing = []
+        current = path
+        while current and current != root:
+            if conn.execute('SELECT 1 FROM entries WHERE path = ?', (current,)).fetchone():
+                break
+            missing.append(current)
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+        for folder in reversed(missing):
+            # mtime 0: el próximo refresh() listará la carpeta aunque ya la hayamos sincronizado
+            self._insert_rows(conn, [(folder, os.path.dirname(folder), os.path.basename(folder), collection,
+                                            1, 0, 0, None, None, None, None, None, None, None)])
+
+    # ============== CONSULTAS ==============
+
+    def _roots(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute('SELECT collection, path, built_at, refreshed_at FROM roots').fetchall()
+
+    def has_root(self, collection: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM roots WHERE collection = ?', (collection,)).fetchone() is not None
+
+    def _root_of(self, path: str) -> Optional[str]:
+        path = normalize_path(path)
+        for row in self._roots():
+            root = row['path']
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def collection_for(self, path: str) -> Optional[str]:
+        """Devuelve la colección indexada que contiene 'path' (o None)"""
+        path = normalize_path(path)
+        for row in self._roots():
+            root = row['path']
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return row['collection']
+        return None
+
+    def is_indexed(self, path: str) -> bool:
+        """True si la ruta está dentro de una colección ya catalogada (y no se está reconstruyendo)"""
+        collection = self.collection_for(path)
+        return collection is not None and not self._is_building(collection)
+
+    def list_folder(self, path: str) -> List[Dict[str, Any]]:
+        """Hijos directos de una carpeta, ordenados por nombre (igual que sorted(os.listdir))"""
+        path = normalize_path(path)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM entries WHERE parent = ? ORDER BY name', (path,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_files(self, path: str) -> int:
+        """Número total de archivos bajo 'path' (recursivo)"""
+        low, high = _prefix_bounds(normalize_path(path))
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM entries WHERE path >= ? AND path < ? AND is_dir = 0', (low, high)
+            ).fetchone()[0]
+
+    def count_direct_files(self, path: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM entries WHERE parent = ? AND is_dir = 0', (normalize_path(path),)
+            ).fetchone()[0]
+
+    def has_subfolders(self, path: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM entries WHERE parent = ? AND is_dir = 1 LIMIT 1', (normalize_path(path),)
+            ).fetchone() is not None
+
+    def search(self, query: str, root: str, limit: int = 500) -> List[Dict[str, Any]]:
+        """Búsqueda por subcadena (sin distinguir mayúsculas) en los nombres de archivo bajo 'root'"""
+        low, high = _prefix_bounds(normalize_path(root))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path, name FROM entries WHERE path >= ? AND path < ? AND is_dir = 0 '
+                'AND instr(py_lower(name), ?) > 0 LIMIT ?',
+                (low, high, query.lower(), limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def extension_counts(self, path: str) -> Dict[str, int]:
+        """Archivos por extensión bajo 'path' (para las estadísticas)"""
+        low, high = _prefix_bounds(normalize_path(path))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT extension, COUNT(*) AS n FROM entries WHERE path >= ? AND path < ? AND is_dir = 0 '
+                'GROUP BY extension', (low, high)
+            ).fetchall()
+        return {row['extension'] or '': row['n'] for row in rows}
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del catálogo por colección"""
+        collections = {}
+        with self._lock:
+            building = sorted(self._building)
+            for row in self._roots():
+                counts = self._conn.execute(
+                    'SELECT SUM(is_dir = 0), SUM(is_dir = 1) FROM entries WHERE collection = ?', (row['collection'],)
+                ).fetchone()
+                collections[row['collection']] = {
+                    'path': row['path'],
+                    'built_at': row['built_at'],
+                    'refreshed_at': row['refreshed_at'],
+                    'files': counts[0] or 0,
+                    'folders': counts[1] or 0
+                }
+        return {
+            'db_path': self.db_path,
+            'building': building,
+            'collections': collections
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        with self._write_lock:
+            self._write_conn.close()
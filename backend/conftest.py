@@ -0,0 +1,19 @@
+"""
+Utilidades compartidas por las pruebas (pytest carga este archivo solo).
+
+Los árboles de prueba se crean en el tmp_path de cada prueba, que pytest borra después.
+"""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def touch_folders():
+    """Avanza el mtime de carpetas (sin depender de la resolución del reloj del sistema de archivos)"""
+    def touch(*paths):
+        for path in paths:
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    return touch
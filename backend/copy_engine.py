@@ -0,0 +1,243 @@
+"""
+Motor de copia de archivos usado por todos los endpoints que copian.
+
+Sustituye a shutil.copy2 con el mismo resultado (contenido + metadatos con copystat, un
+destino que es carpeta recibe el archivo dentro, copiar un archivo sobre sí mismo da
+SameFileError) pero eligiendo la vía más rápida disponible:
+
+1. os.copy_file_range (Linux): el kernel copia sin pasar los datos por Python. En
+   Btrfs/XFS puede compartir bloques y en NFS 4.2 / SMB3 la copia la hace el servidor.
+2. os.sendfile (Linux): copia dentro del kernel de página a página.
+3. Bucle readinto/write con un búfer grande reutilizable por hilo (buffer_size, 1 MiB por
+   defecto; shutil usa 64 KB fuera de Windows).
+
+Si una vía no está soportada entre dos dispositivos (EXDEV, EOPNOTSUPP, ENOSYS...) se pasa
+a la siguiente y la pareja de dispositivos se recuerda para no volver a intentarlo.
+
+Opcionalmente (preallocate=True) se reserva el tamaño final del destino antes de escribir
+(posix_fallocate): menos fragmentación en discos mecánicos y el error de espacio llega antes
+de empezar a escribir, no a mitad de la copia.
+
+Copia incremental (unchanged()): con 'mtime' un destino con el mismo tamaño y la misma
+fecha de modificación (copy2 y este motor la conservan al nanosegundo; mtime_window da
+un margen en segundos para destinos FAT/exFAT o SMB, que la redondean) se da por igual
+y no se copia; con 'hash' se compara además el
+contenido (BLAKE2b) aunque la fecha no coincida, y si es igual solo se copian los metadatos.
+
+La copia escribe en el archivo destino existente; si ese destino es un enlace duro (p. ej.
+de una colocación 'hardlink' de copy_executor) antes se quita el enlace (unshare()), para
+no cambiar también el contenido de los otros nombres del mismo archivo.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+DEFAULT_BUFFER = 1024 * 1024
+
+# Modos de copia incremental: siempre copiar, comparar tamaño + fecha, comparar tamaño + contenido
+INCREMENTAL_MODES = ('off', 'mtime', 'hash')
+
+COPY_FILE_RANGE = 'copy_file_range'
+SENDFILE = 'sendfile'
+BUFFERED = 'buffered'
+
+# Errores que indican que la vía de copia no vale para estos archivos (no un fallo real de E/S)
+_FALLBACK = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.ETXTBSY, errno.EPERM,
+             getattr(errno, 'EOPNOTSUPP', errno.ENOSYS), getattr(errno, 'ENOTSUP', errno.ENOSYS)}
+# Tope por llamada del kernel (como shutil: evita desbordar en sistemas de 32 bits)
+_MAX_CHUNK = 2 ** 30
+
+_buffers = threading.local()
+
+
+def reusable_buffer(size: int) -> memoryview:
+    """Búfer de lectura del hilo actual (se reutiliza entre copias)"""
+    buf = getattr(_buffers, 'buf', None)
+    if buf is None or len(buf) < size:
+        buf = _buffers.buf = bytearray(size)
+    return memoryview(buf)[:size]
+
+
+def preallocate(fd: int, size: int):
+    """Reserva 'size' bytes en el archivo abierto (sin efecto si el sistema no lo admite)"""
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        # Sin espacio sí es un error; que el sistema de archivos no lo admita, no
+        if e.errno not in _FALLBACK:
+            raise
+
+
+def unshare(dest: str):
+    """Si 'dest' tiene otros enlaces duros, lo quita para que la copia no escriba en el archivo compartido"""
+    try:
+        st = os.stat(dest)
+    except FileNotFoundError:
+        return
+    if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+        os.remove(dest)
+
+
+def resolve_dest(src: str, dest: str, src_stat: os.stat_result) -> str:
+    """Destino real como en shutil.copy2 (carpeta -> archivo dentro) comprobando que no es el propio origen"""
+    try:
+        dst = os.stat(dest)
+    except FileNotFoundError:
+        return dest
+    if stat.S_ISDIR(dst.st_mode):
+        dest = os.path.join(dest, os.path.basename(src))
+        try:
+            dst = os.stat(dest)
+        except FileNotFoundError:
+            return dest
+    if (dst.st_dev, dst.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+        raise shutil.SameFileError(f"{src!r} and {dest!r} are the same file")
+    return dest
+
+
+class CopyEngine:
+    """Copia archivos y árboles con copy_file_range/sendfile o búferes grandes, conservando metadatos"""
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER, preallocate: bool = False, zero_copy: bool = True,
+                 mtime_window: float = 0.0):
+        self.buffer_size = max(4096, int(buffer_size))
+        self.preallocate = preallocate
+        self.zero_copy = zero_copy
+        self.mtime_window = mtime_window
+        self._lock = threading.Lock()
+        # (vía, dispositivo origen, dispositivo destino) donde la vía ya falló por no estar soportada
+        self._unsupported: Set[Tuple[str, int, int]] = set()
+        self.methods: Dict[str, int] = {COPY_FILE_RANGE: 0, SENDFILE: 0, BUFFERED: 0}
+
+    def copy(self, src: str, dest: str) -> str:
+        """Equivalente a shutil.copy2(src, dest): devuelve la ruta del archivo copiado"""
+        dest, _ = self.copy_file(src, dest)
+        shutil.copystat(src, dest)
+        return dest
+
+    def copy_file(self, src: str, dest: str) -> Tuple[str, str]:
+        """Copia el contenido (sin metadatos); devuelve (ruta destino, vía usada)"""
+        with open(src, 'rb') as fsrc:
+            src_stat = os.fstat(fsrc.fileno())
+            if stat.S_ISFIFO(src_stat.st_mode):
+                raise shutil.SpecialFileError(f"`{src}` is a named pipe")
+            dest = resolve_dest(src, dest, src_stat)
+            unshare(dest)
+            with open(dest, 'wb') as fdst:
+                if self.preallocate:
+                    preallocate(fdst.fileno(), src_stat.st_size)
+                method, copied = self._copy_fd(fsrc, fdst, src_stat)
+                if self.preallocate and copied != src_stat.st_size:
+                    # El origen cambió de tamaño durante la copia: no dejar la reserva sobrante
+                    fdst.truncate(copied)
+        with self._lock:
+            self.methods[method] += 1
+        return dest, method
+
+    def unchanged(self, src: str, dest: str, mode: str, src_stat: Optional[os.stat_result] = None) -> bool:
+        """True si 'dest' ya tiene el contenido de 'src' según el modo incremental ('off' siempre es False)"""
+        if mode == 'off':
+            return False
+        if mode not in INCREMENTAL_MODES:
+            raise ValueError(f"Modo incremental desconocido: {mode} (válidos: {', '.join(INCREMENTAL_MODES)})")
+        try:
+            dst = os.stat(dest)
+            src_stat = src_stat or os.stat(src)
+        except OSError:
+            return False
+        if not stat.S_ISREG(dst.st_mode) or dst.st_size != src_stat.st_size:
+            return False
+        same_time = dst.st_mtime_ns == src_stat.st_mtime_ns or \
+            (self.mtime_window > 0 and abs(dst.st_mtime - src_stat.st_mtime) <= self.mtime_window)
+        if mode == 'mtime':
+            return same_time
+        if self.file_hash(src) != self.file_hash(dest):
+            return False
+        if not same_time:
+            # Mismo contenido con otra fecha: alinear metadatos para que 'mtime' lo reconozca después
+            shutil.copystat(src, dest)
+        return True
+
+    def file_hash(self, path: str) -> bytes:
+        """BLAKE2b del contenido leído con el búfer del hilo"""
+        digest = hashlib.blake2b(digest_size=20)
+        buf = reusable_buffer(self.buffer_size)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                digest.update(buf[:n])
+        return digest.digest()
+
+    def copy_tree(self, src: str, dest: str, dirs_exist_ok: bool = False) -> str:
+        """Equivalente a shutil.copytree copiando cada archivo con este motor"""
+        return shutil.copytree(src, dest, copy_function=self.copy, dirs_exist_ok=dirs_exist_ok)
+
+    def _copy_fd(self, fsrc, fdst, src_stat: os.stat_result) -> Tuple[str, int]:
+        """Copia el contenido por la primera vía que funcione; devuelve (vía, bytes copiados)"""
+        size = src_stat.st_size
+        if self.zero_copy and size > 0:
+            infd, outfd = fsrc.fileno(), fdst.fileno()
+            devices = (src_stat.st_dev, os.fstat(outfd).st_dev)
+            for method, func in ((COPY_FILE_RANGE, getattr(os, 'copy_file_range', None)),
+                                 (SENDFILE, getattr(os, 'sendfile', None) if sys.platform.startswith('linux') else None)):
+                if func is None or (method,) + devices in self._unsupported:
+                    continue
+                copied = self._kernel_copy(func, method, infd, outfd, size, devices)
+                if copied is not None:
+                    return method, copied
+        return BUFFERED, self._buffered_copy(fsrc, fdst, size)
+
+    def _kernel_copy(self, func: Any, method: str, infd: int, outfd: int, size: int, devices) -> Optional[int]:
+        """Copia con copy_file_range/sendfile; None si la vía no vale (no se ha escrito nada)"""
+        chunk = min(max(size, 8 * 1024 * 1024), _MAX_CHUNK)
+        copied = 0
+        try:
+            while True:
+                if method == COPY_FILE_RANGE:
+                    n = func(infd, outfd, chunk)
+                else:
+                    n = func(outfd, infd, copied, chunk)
+                if not n:
+                    break
+                copied += n
+                if copied == size:
+                    # Tamaño completo: ahorra la llamada final que devolvería 0
+                    break
+        except OSError as e:
+            if copied or e.errno not in _FALLBACK:
+                raise
+            self._mark_unsupported(method, devices, e)
+            return None
+        if copied == 0:
+            # Algunos sistemas de archivos (FUSE, pseudo-archivos) devuelven 0 sin copiar nada: probar la siguiente vía
+            return None
+        return copied
+
+    def _mark_unsupported(self, method: str, devices, error: OSError):
+        with self._lock:
+            if (method,) + devices not in self._unsupported:
+                print(f"[COPY] {method} no disponible entre dispositivos {devices[0]} -> {devices[1]} ({error.strerror})")
+            self._unsupported.add((method,) + devices)
+
+    def _buffered_copy(self, fsrc, fdst, size: int) -> int:
+        buf = reusable_buffer(max(4096, min(self.buffer_size, size or 4096)))
+        fsrc.seek(0)
+        fdst.seek(0)
+        copied = 0
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            fdst.write(buf[:n])
+            copied += n
+        return copied
@@ -0,0 +1,415 @@
+"""
+Ejecutor de copias compartido: un pool acotado de hilos que copia varios archivos a
+varios destinos a la vez, con un límite de escrituras simultáneas por dispositivo.
+
+Un archivo de TEMP suele ir a 6-10 destinos (00 TOSEC ALL, 01 AÑOS, 02 CLASICOS,
+03 HOMEBREW...). Copiarlos uno detrás de otro deja el disco/NAS esperando la latencia
+de cada apertura y cierre; varios hilos solapan esas esperas (shutil.copy2 libera el
+GIL durante la E/S). El límite por dispositivo evita saturar un disco mecánico o un
+NAS con demasiadas escrituras a la vez mientras otros dispositivos siguen trabajando.
+
+run() devuelve un resultado por tarea en el mismo orden en que se pasaron, así los
+endpoints construyen exactamente las mismas respuestas JSON que con la copia en serie.
+
+Modo de colocación (PLACEMENT_MODE). Por diseño de TOSEC cada juego va a varias carpetas
+de la misma colección, así que con 'copy' se escriben los mismos bytes 6-10 veces:
+
+- 'copy': copia real a cada destino (por defecto).
+- 'hardlink': una copia real por archivo y dispositivo; el resto de destinos de ese
+  dispositivo son enlaces duros a esa copia. Comparten contenido: modificar uno en sitio
+  modifica todos (borrar o sustituir uno no afecta a los demás). Las copias de la
+  aplicación (motor de copia y fanout_copy) quitan el enlace antes de escribir encima.
+- 'reflink': igual pero con clones copy-on-write (FICLONE en Btrfs, XFS, ZFS...): no
+  ocupan espacio extra y siguen siendo archivos independientes.
+
+Si el enlace o el clon no es posible (otro dispositivo, FAT/exFAT, recurso SMB sin
+soporte, Windows sin reflink...) ese destino se copia normalmente y el dispositivo se
+recuerda para no volver a intentarlo. summary() resume bytes y tiempo ahorrados del lote.
+
+Las copias sueltas usan el motor de copia (copy_engine.CopyEngine: copy_file_range,
+sendfile o búferes grandes). Copias reales en abanico (fanout=True, por defecto): copiar
+un archivo a N destinos vuelve a leer el origen de TEMP N veces; fanout_copy() lo lee una
+sola vez, por bloques en el búfer reutilizable del hilo, y escribe cada bloque en todos
+los destinos del mismo dispositivo; después copia los metadatos como copy2.
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from copy_engine import (DEFAULT_BUFFER, INCREMENTAL_MODES, CopyEngine, preallocate, resolve_dest, reusable_buffer,
+                         unshare)
+from jobs import CANCELLED_MESSAGE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COPY = 'copy'
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+PLACEMENT_MODES = (COPY, HARDLINK, REFLINK)
+# Destino que ya estaba al día (copia incremental): no se escribió nada
+SKIPPED = 'skipped'
+
+# ioctl FICLONE de Linux (_IOW(0x94, 9, int)): clona todo el contenido de un archivo en otro
+FICLONE = 0x40049409
+# Errores que indican que el sistema de archivos no admite enlaces/clones (no un fallo puntual)
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOTTY, errno.ENOSYS,
+                getattr(errno, 'EOPNOTSUPP', errno.ENOSYS), getattr(errno, 'ENOTSUP', errno.ENOSYS)}
+
+
+def fanout_copy(src: str, dests: List[str], buffer_size: int = DEFAULT_BUFFER,
+                preallocate_dests: bool = False) -> List[Optional[Exception]]:
+    """
+    Copia 'src' a todos los 'dests' leyéndolo una sola vez y conserva los metadatos como
+    shutil.copy2. Devuelve el error de cada destino (None si se copió); un destino que
+    falla no interrumpe los demás.
+    """
+    errors: List[Optional[Exception]] = [None] * len(dests)
+    targets = list(dests)
+    outputs = []
+    try:
+        with open(src, 'rb') as fsrc:
+            st = os.fstat(fsrc.fileno())
+            for i, dest in enumerate(dests):
+                try:
+                    # Como copy2: un destino que es carpeta recibe el archivo dentro
+                    targets[i] = resolve_dest(src, dest, st)
+                    unshare(targets[i])
+                    fdst = open(targets[i], 'wb')
+                except Exception as e:
+                    errors[i] = e
+                    continue
+                outputs.append((i, fdst))
+                if preallocate_dests:
+                    try:
+                        preallocate(fdst.fileno(), st.st_size)
+                    except Exception as e:
+                        errors[i] = e
+                        fdst.close()
+                        outputs.pop()
+            try:
+                buf = reusable_buffer(max(1, min(buffer_size, st.st_size)))
+                while outputs:
+                    n = fsrc.readinto(buf)
+                    if not n:
+                        break
+                    chunk = buf[:n]
+                    for out in list(outputs):
+                        try:
+                            out[1].write(chunk)
+                        except Exception as e:
+                            errors[out[0]] = e
+                            out[1].close()
+                            outputs.remove(out)
+            finally:
+                for i, fdst in outputs:
+                    try:
+                        fdst.close()
+                    except Exception as e:
+                        errors[i] = e
+    except Exception as e:
+        # El origen no se pudo leer: fallan todos los destinos que no tuvieran ya su error
+        return [error or e for error in errors]
+    for i, dest in enumerate(targets):
+        if errors[i] is None:
+            try:
+                shutil.copystat(src, dest)
+            except Exception as e:
+                errors[i] = e
+    return errors
+
+
+class CopyTask(NamedTuple):
+    src: str
+    dest: str              # ruta completa del archivo destino
+    tag: Any = None        # dato del llamante para construir su respuesta (p. ej. la ruta relativa)
+
+
+class CopyResult(NamedTuple):
+    task: CopyTask
+    ok: bool
+    error: Optional[str] = None
+    method: str = COPY     # cómo se colocó: 'copy', 'hardlink', 'reflink' o 'skipped'
+    size: int = 0          # bytes del archivo origen
+    seconds: float = 0.0
+
+
+class CopyExecutor:
+    """Pool de hilos de copia con límite de escrituras simultáneas por dispositivo destino"""
+
+    def __init__(self, workers: int = 8, per_device: int = 4,
+                 copy_function: Optional[Callable[[str, str], Any]] = None, placement: str = COPY,
+                 fanout: bool = True, engine: Optional[CopyEngine] = None):
+        if placement not in PLACEMENT_MODES:
+            raise ValueError(f"Modo de colocación desconocido: {placement} (válidos: {', '.join(PLACEMENT_MODES)})")
+        self.workers = max(1, int(workers))
+        self.per_device = max(1, int(per_device))
+        # Motor de copia compartido (también lo usan los endpoints que copian fuera del ejecutor)
+        self.engine = engine or CopyEngine()
+        self.copy_function = copy_function or self.engine.copy
+        self.placement = placement
+        # Lectura única del origen para sus copias reales (solo con el motor de copia, no con una función propia)
+        self.fanout = fanout and copy_function is None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._device_slots: Dict[Any, threading.BoundedSemaphore] = {}
+        # Dispositivos donde el enlace/clon ya falló por no estar soportado
+        self._no_links: set = set()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='copy')
+            return self._pool
+
+    @staticmethod
+    def device_of(path: str) -> Any:
+        """Dispositivo (st_dev) de la carpeta existente más cercana a 'path'"""
+        path = os.path.abspath(path)
+        while True:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return None
+                path = parent
+
+    def _slots(self, device: Any) -> threading.BoundedSemaphore:
+        with self._lock:
+            slots = self._device_slots.get(device)
+            if slots is None:
+                slots = self._device_slots[device] = threading.BoundedSemaphore(self.per_device)
+            return slots
+
+    def _copy_one(self, task: CopyTask, device: Any, size: int = 0) -> CopyResult:
+        with self._slots(device):
+            start = time.perf_counter()
+            try:
+                os.makedirs(os.path.dirname(task.dest), exist_ok=True)
+                # Una función de copia propia (p. ej. shutil.copy2) también escribe en sitio
+                unshare(task.dest)
+                self.copy_function(task.src, task.dest)
+                return CopyResult(task, True, size=size, seconds=time.perf_counter() - start)
+            except Exception as e:
+                return CopyResult(task, False, str(e))
+
+    def _fanout_group(self, tasks: List[CopyTask], device: Any, size: int) -> List[CopyResult]:
+        """Un archivo a varios destinos del mismo dispositivo leyendo el origen una sola vez"""
+        with self._slots(device):
+            start = time.perf_counter()
+            errors: List[Optional[Exception]] = []
+            for task in tasks:
+                try:
+                    os.makedirs(os.path.dirname(task.dest), exist_ok=True)
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+            ready = [i for i, e in enumerate(errors) if e is None]
+            for i, error in zip(ready, fanout_copy(tasks[0].src, [tasks[i].dest for i in ready],
+                                                    self.engine.buffer_size, self.engine.preallocate)):
+                errors[i] = error
+            # El tiempo del grupo se reparte entre sus destinos (para summary())
+            seconds = (time.perf_counter() - start) / len(tasks)
+        return [CopyResult(task, True, None, COPY, size, seconds) if error is None else CopyResult(task, False, str(error))
+                for task, error in zip(tasks, errors)]
+
+    def _place_group(self, tasks: List[CopyTask], device: Any, size: int) -> List[CopyResult]:
+        """Un archivo a varios destinos del mismo dispositivo: copia real al primero y enlaces/clones al resto"""
+        results = []
+        primary = None
+        with self._slots(device):
+            for task in tasks:
+                start = time.perf_counter()
+                try:
+                    os.makedirs(os.path.dirname(task.dest), exist_ok=True)
+                    method = self._link(primary, task.dest, device) if primary else None
+                    if method is None:
+                        unshare(task.dest)
+                        self.copy_function(task.src, task.dest)
+                        method = COPY
+                        primary = task.dest
+                    results.append(CopyResult(task, True, None, method, size, time.perf_counter() - start))
+                except Exception as e:
+                    results.append(CopyResult(task, False, str(e)))
+        return results
+
+    def _link(self, primary: str, dest: str, device: Any) -> Optional[str]:
+        """Coloca 'dest' como enlace duro o clon de 'primary'; None si hay que copiar"""
+        if device in self._no_links:
+            return None
+        try:
+            if self.placement == HARDLINK:
+                self._hardlink(primary, dest)
+            else:
+                self._reflink(primary, dest)
+            return self.placement
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                with self._lock:
+                    if device not in self._no_links:
+                        print(f"[COPY] {self.placement} no disponible en {os.path.dirname(dest)} ({e.strerror}): se copia")
+                    self._no_links.add(device)
+            return None
+
+    @staticmethod
+    def _temp_name(dest: str) -> str:
+        folder, name = os.path.split(dest)
+        return os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    def _hardlink(self, primary: str, dest: str):
+        try:
+            os.link(primary, dest)
+            return
+        except FileExistsError:
+            if os.path.samefile(primary, dest):
+                return
+        # Ya existe otro archivo con ese nombre: sustituirlo de forma atómica, como haría la copia
+        tmp = self._temp_name(dest)
+        try:
+            os.link(primary, tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _reflink(self, primary: str, dest: str):
+        if fcntl is None:
+            raise OSError(errno.ENOSYS, 'reflink no disponible en este sistema')
+        tmp = self._temp_name(dest)
+        try:
+            with open(primary, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(primary, tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            raise
+
+    def run(self, tasks: List[CopyTask], incremental: str = 'off', progress: Optional[Any] = None) -> List[CopyResult]:
+        """
+        Copia todas las tareas y devuelve sus resultados en el orden de 'tasks'. Con
+        incremental='mtime' o 'hash' no se reescriben los destinos que ya están al día
+        (ver CopyEngine.unchanged); su resultado tiene method='skipped'.
+        'progress' (un jobs.Job) recibe totales y avance por destino; si se cancela, los
+        archivos que aún no habían empezado fallan con 'Cancelado por el usuario'.
+        """
+        if incremental not in INCREMENTAL_MODES:
+            raise ValueError(f"Modo incremental desconocido: {incremental} (válidos: {', '.join(INCREMENTAL_MODES)})")
+        if not tasks:
+            return []
+        start = time.perf_counter()
+        devices: Dict[str, Any] = {}
+        stats: Dict[str, Optional[os.stat_result]] = {}
+        for task in tasks:
+            folder = os.path.dirname(task.dest)
+            if folder not in devices:
+                devices[folder] = self.device_of(folder)
+            if task.src not in stats:
+                try:
+                    stats[task.src] = os.stat(task.src)
+                except OSError:
+                    stats[task.src] = None
+        sizes = {src: st.st_size if st else 0 for src, st in stats.items()}
+        if progress is not None:
+            progress.set_totals(len(tasks), sum(sizes[task.src] for task in tasks))
+
+        # Trabajos: cada tarea por separado o, en abanico o con enlaces, cada archivo agrupado por dispositivo destino
+        jobs: Dict[Any, List[int]] = {}
+        for i, task in enumerate(tasks):
+            if self.placement == COPY and not self.fanout:
+                key = i
+            else:
+                key = (task.src, devices[os.path.dirname(task.dest)])
+            jobs.setdefault(key, []).append(i)
+
+        def run_job(indexes: List[int]) -> List[CopyResult]:
+            first = tasks[indexes[0]]
+            if progress is not None and progress.cancelled:
+                return [CopyResult(tasks[i], False, CANCELLED_MESSAGE) for i in indexes]
+            results = place(indexes, first)
+            if progress is not None:
+                progress.advance(len(indexes), sizes[first.src] * len(indexes), os.path.basename(first.src))
+            return results
+
+        def place(indexes: List[int], first: CopyTask) -> List[CopyResult]:
+            device = devices[os.path.dirname(first.dest)]
+            size = sizes[first.src]
+            skipped = {}
+            if incremental != 'off' and stats[first.src] is not None:
+                # La comparación también ocupa el dispositivo (en modo 'hash' lee origen y destino enteros)
+                with self._slots(device):
+                    for i in indexes:
+                        check_start = time.perf_counter()
+                        try:
+                            if self.engine.unchanged(tasks[i].src, tasks[i].dest, incremental, stats[first.src]):
+                                skipped[i] = CopyResult(tasks[i], True, None, SKIPPED, size, time.perf_counter() - check_start)
+                        except Exception:
+                            pass  # si no se puede comparar, se copia
+            pending = [tasks[i] for i in indexes if i not in skipped]
+            if not pending:
+                copied = []
+            elif self.placement != COPY:
+                copied = self._place_group(pending, device, size)
+            elif len(pending) == 1:
+                copied = [self._copy_one(pending[0], device, size)]
+            else:
+                copied = self._fanout_group(pending, device, size)
+            copied = iter(copied)
+            return [skipped[i] if i in skipped else next(copied) for i in indexes]
+
+        if self.workers == 1 or len(jobs) == 1:
+            outputs = [run_job(indexes) for indexes in jobs.values()]
+        else:
+            pool = self._get_pool()
+            futures = [pool.submit(run_job, indexes) for indexes in jobs.values()]
+            outputs = [future.result() for future in futures]
+
+        results: List[Any] = [None] * len(tasks)
+        for indexes, job_results in zip(jobs.values(), outputs):
+            for i, result in zip(indexes, job_results):
+                results[i] = result
+        if self.placement != COPY or incremental != 'off':
+            s = self.summary(results)
+            print(f"[COPY] {len(tasks)} destinos en {time.perf_counter() - start:.2f}s: {s['copies']} copias, "
+                  f"{s['hardlinks']} enlaces, {s['reflinks']} clones, {s['skipped']} sin cambios; "
+                  f"{(s['bytes_saved'] + s['bytes_skipped']) / 1048576:.1f} MB y ~{s['seconds_saved']:.2f}s ahorrados")
+        return results
+
+    def summary(self, results: List[CopyResult]) -> Dict[str, Any]:
+        """
+        Resumen del lote: bytes escritos, bytes ahorrados por enlaces/clones, destinos sin
+        cambios (copia incremental) y tiempo ahorrado estimado (lo que habrían tardado esos
+        bytes a la velocidad de copia medida en el lote, menos lo que tardaron enlaces y
+        comprobaciones).
+        """
+        done = [r for r in results if r.ok]
+        copied = [r for r in done if r.method == COPY]
+        linked = [r for r in done if r.method in (HARDLINK, REFLINK)]
+        skipped = [r for r in done if r.method == SKIPPED]
+        bytes_written = sum(r.size for r in copied)
+        copy_seconds = sum(r.seconds for r in copied)
+        seconds_saved = 0.0
+        if (linked or skipped) and bytes_written and copy_seconds > 0:
+            rate = bytes_written / copy_seconds
+            seconds_saved = max(0.0, sum(r.size / rate - r.seconds for r in linked + skipped))
+        return {
+            'mode': self.placement,
+            'copies': len(copied),
+            'hardlinks': sum(1 for r in linked if r.method == HARDLINK),
+            'reflinks': sum(1 for r in linked if r.method == REFLINK),
+            'skipped': len(skipped),
+            'bytes_written': bytes_written,
+            'bytes_saved': sum(r.size for r in linked),
+            'bytes_skipped': sum(r.size for r in skipped),
+            'seconds_saved': round(seconds_saved, 3)
+        }
@@ -27,7 +27,7 @@ def create_folder_route(app, CONFIG, cache):
         
         try:
             os.makedirs(full_path, exist_ok=False)
-            cache[collection] = None  # Invalidate cache
+            cache.invalidate_changed(full_path)  # Invalidate cache
             return jsonify({'success': True, 'message': f'Carpeta "{folder_name}" creada'})
         except FileExistsError:
             return jsonify({'error': f'La carpeta "{folder_name}" ya existe'}), 400
@@ -63,7 +63,9 @@ def delete_files_route(app, CONFIG, cache):
             except Exception as e:
                 results.append({'path': file_path, 'success': False, 'error': str(e)})
         
-        cache[collection] = None  # Invalidate cache
+        for result in results:
+            if result['success']:
+                cache.invalidate_changed(result['path'])  # Invalidate cache
         return jsonify({'success': True, 'deleted': deleted_count, 'results': results})
 
 
@@ -93,7 +95,8 @@ def rename_file_route(app, CONFIG, cache):
                 return jsonify({'error': f'File "{new_name}" already exists'}), 400
                 
             os.rename(old_path, new_path)
-            cache[collection] = None  # Invalidate cache
+            cache.invalidate_changed(old_path)  # Invalidate cache
+            cache.invalidate_changed(new_path)
             return jsonify({'success': True, 'message': f'Renamed to "{new_name}"', 'new_path': new_path})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -0,0 +1,92 @@
+"""
+Índice de carpetas de juego de un directorio: nombre normalizado -> carpeta.
+
+Se construye una vez a partir del listado de subcarpetas y se mantiene al día cuando
+la aplicación crea o borra carpetas (add/discard), así la búsqueda de la carpeta de
+un juego es una consulta a un diccionario en lugar de recorrer todas las subcarpetas.
+
+Además de la clave exacta (la comparación de siempre: sin corchetes, en mayúsculas)
+guarda una clave "relajada" sin acentos ni signos de puntuación para localizar
+carpetas casi duplicadas ("Pac-Man" / "PAC MAN", "Éxodo" / "Exodo").
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from range_table import is_range_folder
+
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]+')
+
+
+def folder_key(folder: str) -> str:
+    """Clave exacta de una carpeta de juego (quitar corchetes, mayúsculas)"""
+    return folder.strip('[]').upper().strip()
+
+
+def loose_key(name: str) -> str:
+    """Clave sin acentos, sin signos de puntuación y con los espacios normalizados"""
+    text = unicodedata.normalize('NFKD', name.strip('[]'))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).upper()
+    return _NON_ALNUM_RE.sub(' ', text).strip()
+
+
+class GameFolderIndex:
+    """Subcarpetas de un directorio; las de juego (no de rango) indexadas por nombre normalizado"""
+
+    def __init__(self, subfolders: List[str]):
+        # Dict ordenado (orden del listado) para comprobar pertenencia en O(1)
+        self._folders: Dict[str, None] = {}
+        self._exact: Dict[str, str] = {}
+        self._loose: Dict[str, str] = {}
+        for folder in subfolders:
+            self.add(folder)
+
+    def __len__(self) -> int:
+        return len(self._folders)
+
+    def copy(self) -> 'GameFolderIndex':
+        """Copia independiente (para modificarla sin tocar la que están leyendo otros hilos)"""
+        clone = GameFolderIndex([])
+        clone._folders = dict(self._folders)
+        clone._exact = dict(self._exact)
+        clone._loose = dict(self._loose)
+        return clone
+
+    def contains(self, folder: str) -> bool:
+        return folder in self._folders
+
+    def add(self, folder: str):
+        """Carpeta nueva (las de rango se anotan pero no se indexan). Si dos carpetas comparten clave gana la primera, como en el recorrido"""
+        if folder in self._folders:
+            return
+        self._folders[folder] = None
+        if is_range_folder(folder):
+            return
+        self._exact.setdefault(folder_key(folder), folder)
+        if loose_key(folder):
+            self._loose.setdefault(loose_key(folder), folder)
+
+    def discard(self, folder: str):
+        """Carpeta borrada o renombrada"""
+        if folder not in self._folders:
+            return
+        del self._folders[folder]
+        if is_range_folder(folder):
+            return
+        for index, key in ((self._exact, folder_key(folder)), (self._loose, loose_key(folder))):
+            if index.get(key) == folder:
+                # Otra carpeta con la misma clave pasa a ser la coincidencia
+                del index[key]
+                key_of = folder_key if index is self._exact else loose_key
+                for other in self._folders:
+                    if key_of(other) == key:
+                        index[key] = other
+                        break
+
+    def find(self, title: str, loose: bool = False) -> Optional[str]:
+        """Carpeta cuyo nombre coincide exactamente con 'title' (o con la clave relajada si loose=True)"""
+        folder = self._exact.get(title.upper().strip())
+        if folder is None and loose and loose_key(title):
+            folder = self._loose.get(loose_key(title))
+        return folder
@@ -0,0 +1,126 @@
+"""
+Planes de ingesta de TEMP: destinos calculados una sola vez y reutilizados.
+
+La previsualización (/api/temp/preview, /api/update/preview) calcula los destinos de
+todos los archivos de TEMP y guarda el resultado como un plan con ID. La copia
+(/api/temp/copy, /api/update/generate) ejecuta ese plan tal cual, sin volver a listar,
+parsear ni sugerir, siempre que nada haya cambiado desde la previsualización:
+
+- la huella de TEMP (nombre, tamaño y mtime de cada archivo del plan), y
+- el mtime de cada carpeta destino que se consultó al planificar (crear o borrar una
+  subcarpeta cambia el mtime de su padre, que es lo que decide las sugerencias), tomado
+  en el momento de listarla (DirectorySnapshot): un cambio durante la planificación
+  también invalida el plan.
+
+Si algo cambió el plan se rechaza y hay que volver a previsualizar.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Estado de una carpeta que se vio distinta en dos momentos de la misma planificación (nunca coincide)
+CHANGED_WHILE_PLANNING = -1
+
+
+def list_temp_entries(temp_path: str, extensions) -> List[Tuple[str, str, int, int]]:
+    """(nombre, extensión, tamaño, mtime_ns) de los archivos de TEMP con las extensiones dadas, en orden de listado"""
+    entries = []
+    with os.scandir(temp_path) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in extensions:
+                continue
+            st = entry.stat()
+            entries.append((entry.name, ext, st.st_size, st.st_mtime_ns))
+    return entries
+
+
+def fingerprint(entries: List[Tuple[str, str, int, int]]) -> str:
+    """Huella del contenido de TEMP: cambia si se añade, quita, renombra o modifica un archivo"""
+    digest = hashlib.sha1()
+    for name, _, size, mtime_ns in sorted(entries):
+        digest.update(f"{name}\0{size}\0{mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def folder_states(folders: List[str]) -> Dict[str, Optional[int]]:
+    """mtime_ns de cada carpeta (None si no existe)"""
+    states = {}
+    for folder in folders:
+        try:
+            states[folder] = os.stat(folder).st_mtime_ns
+        except OSError:
+            states[folder] = None
+    return states
+
+
+class IngestPlan:
+    """Destinos de todos los archivos de TEMP para FE y TS, con la huella de lo que se usó para calcularlos"""
+
+    def __init__(self, temp_path: str, entries: List[Tuple[str, str, int, int]],
+                 files: List[Dict[str, Any]], folders: Dict[str, Optional[int]], extensions):
+        self.id = uuid.uuid4().hex[:12]
+        self.created = time.time()
+        self.temp_path = temp_path
+        # Cada archivo: filename, extension, size, tosec_info, suggested_paths ({'FE': [...], 'TS': [...]}), error
+        self.files = files
+        self.fingerprint = fingerprint(entries)
+        # Carpeta -> mtime_ns de cuando se listó al planificar (DirectorySnapshot.folder_states)
+        self.folders = dict(folders)
+        self._extensions = extensions
+
+    def check(self, collection_base: str) -> Optional[str]:
+        """Motivo por el que el plan ya no vale para copiar a 'collection_base' (None si sigue vigente)"""
+        try:
+            current = list_temp_entries(self.temp_path, self._extensions)
+        except OSError:
+            return 'la carpeta TEMP no es accesible'
+        if fingerprint(current) != self.fingerprint:
+            return 'el contenido de TEMP cambió'
+        base = os.path.normpath(collection_base)
+        prefix = base.rstrip(os.sep) + os.sep
+        relevant = [f for f in self.folders if f == base or f.startswith(prefix)]
+        for folder, state in folder_states(relevant).items():
+            if state != self.folders[folder]:
+                return f'la carpeta destino {os.path.relpath(folder, base)} cambió'
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'plan_id': self.id,
+            'fingerprint': self.fingerprint,
+            'created': self.created,
+            'total_files': len(self.files),
+            'folders_checked': len(self.folders)
+        }
+
+
+class PlanStore:
+    """Planes recientes en memoria (los más antiguos se descartan)"""
+
+    def __init__(self, max_plans: int = 20):
+        self.max_plans = max_plans
+        self._plans: 'OrderedDict[str, IngestPlan]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, plan: IngestPlan) -> IngestPlan:
+        with self._lock:
+            self._plans[plan.id] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def get(self, plan_id: str) -> Optional[IngestPlan]:
+        with self._lock:
+            return self._plans.get(plan_id)
+
+    def discard(self, plan_id: str):
+        with self._lock:
+            self._plans.pop(plan_id, None)
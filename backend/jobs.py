@@ -0,0 +1,361 @@
+"""
+Trabajos en segundo plano para las operaciones largas (copias de TEMP, paquetes de
+actualización, copia de carpetas, multicopia, búsqueda y compresión).
+
+JobRegistry.submit() lanza la función en un hilo y devuelve el Job al momento; el endpoint
+responde con su id y el frontend consulta /api/jobs/<id> (progreso) y /api/jobs/<id>/result
+(la misma respuesta que daría el endpoint en modo síncrono). Sin 'background' los endpoints
+siguen respondiendo al terminar, pero el trabajo también se registra (run()), así se ve su
+progreso y se puede cancelar desde otra petición.
+
+Cada Job lleva sus contadores (archivos, bytes, porcentaje, fase, mensaje) protegidos por
+un lock; snapshot() calcula velocidad y ETA. Pueden correr varios trabajos a la vez; los
+terminados se conservan (los 'max_finished' más recientes) para recoger su resultado.
+
+Cancelación: cancel() marca el trabajo y ejecuta los avisos registrados con on_cancel()
+(p. ej. terminar 7-Zip). Las funciones largas consultan 'cancelled' entre archivos o lanzan
+JobCancelled con check_cancelled().
+
+Exclusión: submit(..., key=...) no lanza el trabajo si ya hay otro del mismo tipo con la
+misma clave en curso (una compresión por colección, una sola tarea de catálogo); la
+comprobación y el alta se hacen bajo el lock del registro.
+
+Avisos de cambios (/api/jobs/events, Server-Sent Events): cada cambio de un trabajo sube su
+'version' y despierta a JobRegistry.watch(), que entrega los snapshots cambiados como mucho
+una vez cada 'interval' segundos. Los cambios intermedios se funden en el último estado (un
+7-Zip que escribe su porcentaje muchas veces por segundo no inunda al navegador) y un
+trabajo que no ha cambiado no se vuelve a enviar.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, ERROR, CANCELLED)
+
+CANCELLED_MESSAGE = 'Cancelado por el usuario'
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló a petición del usuario"""
+
+
+class Job:
+    """Un trabajo con su progreso, su resultado y su marca de cancelación"""
+
+    def __init__(self, job_id: str, kind: str, description: str = '', key: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.id = job_id
+        self.kind = kind
+        self.description = description
+        # Con clave, no puede haber dos trabajos en curso del mismo tipo con la misma clave
+        self.key = key
+        self.state = QUEUED
+        self.phase = ''
+        self.message = ''
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.percent: Optional[float] = None   # porcentaje explícito (7-Zip); si no, por bytes o archivos
+        self.current = ''
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.status_code = 200
+        # Información propia del tipo de trabajo para snapshot() (p. ej. TreeCopyProgress.snapshot)
+        self.details: Optional[Callable[[], Dict[str, Any]]] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._on_cancel: List[Callable[[], Any]] = []
+        self._done = threading.Event()
+        # Sube con cada cambio; el registro avisa a los que esperan (watch)
+        self.version = 0
+        self._listener: Optional[Callable[[], Any]] = None
+
+    @contextmanager
+    def _update(self):
+        """Bloque que modifica el trabajo: al salir sube 'version' y avisa del cambio"""
+        with self._lock:
+            yield
+            self.version += 1
+        if self._listener is not None:
+            self._listener()
+
+    # --- progreso (desde el hilo del trabajo o los de copia) ---
+
+    def set_phase(self, phase: str, message: Optional[str] = None):
+        with self._update():
+            self.phase = phase
+            if message is not None:
+                self.message = message
+
+    def set_message(self, message: str):
+        with self._update():
+            self.message = message
+
+    def set_totals(self, files: int = 0, total_bytes: int = 0):
+        with self._update():
+            self.files_total, self.bytes_total = files, total_bytes
+
+    def advance(self, files: int = 1, size: int = 0, current: Optional[str] = None):
+        with self._update():
+            self.files_done += files
+            self.bytes_done += size
+            if current is not None:
+                self.current = current
+
+    def set_percent(self, percent: float, message: Optional[str] = None):
+        """Progreso que solo se conoce en porcentaje (compresión)"""
+        with self._update():
+            self.percent = percent
+            if self.bytes_total:
+                self.bytes_done = int(self.bytes_total * percent / 100)
+            if message is not None:
+                self.message = message
+
+    # --- cancelación ---
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(CANCELLED_MESSAGE)
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """Aviso al cancelar (si ya está cancelado se ejecuta ahora)"""
+        with self._lock:
+            self._on_cancel.append(callback)
+        if self._cancel.is_set():
+            callback()
+
+    def cancel(self) -> bool:
+        """Pide la cancelación; False si el trabajo ya había terminado"""
+        with self._update():
+            if self.state in FINISHED_STATES:
+                return False
+            self._cancel.set()
+            self.message = 'Cancelando...'
+            callbacks = list(self._on_cancel)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        return True
+
+    # --- estado ---
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.finished or time.time()
+            elapsed = now - self.started if self.started else 0.0
+            if self.percent is not None:
+                percent = self.percent
+            elif self.bytes_total:
+                percent = 100.0 * self.bytes_done / self.bytes_total
+            elif self.files_total:
+                percent = 100.0 * self.files_done / self.files_total
+            else:
+                percent = 100.0 if self.state == DONE else 0.0
+            rate = self.bytes_done / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.state == RUNNING and 0 < percent < 100 and elapsed > 0:
+                eta = round(elapsed * (100 - percent) / percent, 1)
+            snapshot = {
+                'id': self.id,
+                'kind': self.kind,
+                'description': self.description,
+                'state': self.state,
+                'running': self.state in (QUEUED, RUNNING),
+                'phase': self.phase,
+                'message': self.message,
+                'files_total': self.files_total,
+                'files_done': self.files_done,
+                'bytes_total': self.bytes_total,
+                'bytes_done': self.bytes_done,
+                'percent': round(percent, 1),
+                'rate': round(rate),
+                'eta': eta,
+                'elapsed': round(elapsed, 2),
+                'current': self.current,
+                'cancel_requested': self._cancel.is_set(),
+                'error': self.error,
+                'has_result': self.state in FINISHED_STATES and self.result is not None,
+                'created': self.created
+            }
+        if self.details is not None:
+            snapshot['details'] = self.details()
+        return snapshot
+
+
+class JobRegistry:
+    """Trabajos en curso y terminados recientes, por id"""
+
+    def __init__(self, max_finished: int = 50, context: Optional[Callable[[], Any]] = None,
+                 result: Optional[Callable[[Any], Any]] = None):
+        self.max_finished = max_finished
+        # Cambios de cualquier trabajo (para watch)
+        self._changed = threading.Condition()
+        self._version = 0
+        # Contexto en el que corre cada trabajo (p. ej. app.app_context para usar jsonify fuera de la petición)
+        self.context = context or nullcontext
+        # Conversión del valor devuelto por el trabajo a (resultado, código HTTP)
+        self.result = result or (lambda value: (value, 200))
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def _new_job(self, kind: str, description: str, details: Optional[Callable[[], Dict[str, Any]]],
+                 key: Optional[str] = None) -> Optional[Job]:
+        job = Job(f"{next(self._counter)}-{uuid.uuid4().hex[:8]}", kind, description, key)
+        job.details = details
+        job._listener = self._notify_change
+        with self._lock:
+            # Comprobar y registrar en el mismo bloque: dos peticiones a la vez no lanzan el mismo trabajo dos veces
+            if key is not None and any(j.kind == kind and j.key == key and j.state not in FINISHED_STATES
+                                       for j in self._jobs.values()):
+                return None
+            self._jobs[job.id] = job
+            self._prune()
+        self._notify_change()
+        return job
+
+    def _notify_change(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _execute(self, job: Job, work: Callable[[Job], Any]):
+        with job._update():
+            job.state = RUNNING
+            job.started = time.time()
+        try:
+            with self.context():
+                job.check_cancelled()
+                value = work(job)
+                result, status_code = self.result(value)
+            with job._update():
+                job.result, job.status_code = result, status_code
+                job.state = CANCELLED if job._cancel.is_set() else DONE
+                if job.state == CANCELLED:
+                    job.error = CANCELLED_MESSAGE
+        except JobCancelled as e:
+            with job._update():
+                job.state = CANCELLED
+                job.error = str(e)
+                job.result, job.status_code = {'success': False, 'cancelled': True, 'error': str(e)}, 409
+        except Exception as e:
+            print(f"[JOBS] {job.kind} {job.id} falló: {e}")
+            with job._update():
+                job.state = ERROR
+                job.error = str(e)
+                job.result, job.status_code = {'success': False, 'error': str(e)}, 500
+        finally:
+            with job._update():
+                job.finished = time.time()
+                if not job.message or job.message == 'Cancelando...':
+                    job.message = job.error or ''
+            job._done.set()
+            with self._lock:
+                self._prune()
+
+    def submit(self, kind: str, description: str, work: Callable[[Job], Any],
+               details: Optional[Callable[[], Dict[str, Any]]] = None, key: Optional[str] = None) -> Optional[Job]:
+        """
+        Ejecuta work(job) en un hilo propio y devuelve el trabajo sin esperar. Con 'key' devuelve
+        None (sin lanzar nada) si ya hay uno en curso del mismo tipo con esa clave.
+        """
+        job = self._new_job(kind, description, details, key)
+        if job is None:
+            return None
+        thread = threading.Thread(target=self._execute, args=(job, work), name=f'job-{job.id}', daemon=True)
+        thread.start()
+        return job
+
+    def run(self, kind: str, description: str, work: Callable[[Job], Any],
+            details: Optional[Callable[[], Dict[str, Any]]] = None) -> Job:
+        """Ejecuta work(job) en este hilo (registrado, con progreso y cancelable) y devuelve el trabajo terminado"""
+        job = self._new_job(kind, description, details)
+        self._execute(job, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if kind is None or job.kind == kind]
+
+    def latest(self, kind: str) -> Optional[Job]:
+        jobs = self.list(kind)
+        return jobs[-1] if jobs else None
+
+    def running(self, kind: Optional[str] = None) -> List[Job]:
+        return [job for job in self.list(kind) if job.state in (QUEUED, RUNNING)]
+
+    def cancel(self, job_id: str) -> Optional[bool]:
+        """True si se pidió la cancelación, False si ya había terminado, None si no existe"""
+        job = self.get(job_id)
+        return job.cancel() if job else None
+
+    def watch(self, job_id: Optional[str] = None, kind: Optional[str] = None, interval: float = 0.25,
+              heartbeat: float = 15.0) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Snapshots de los trabajos que han cambiado (de 'job_id', o todos los de 'kind'), como
+        mucho una tanda cada 'interval' segundos; la primera tanda es el estado actual. Sin
+        cambios en 'heartbeat' segundos entrega una lista vacía (para mantener viva la conexión).
+        Con 'job_id' termina tras entregar el estado final del trabajo (o si no existe).
+        """
+        sent: Dict[str, int] = {}
+        seen = -1
+        last = 0.0
+        while True:
+            with self._changed:
+                if self._version == seen:
+                    self._changed.wait(max(0.0, heartbeat - (time.monotonic() - last)))
+                seen = self._version
+            # Coalescencia: los cambios que lleguen mientras tanto salen juntos en la siguiente tanda
+            pause = interval - (time.monotonic() - last)
+            if pause > 0:
+                time.sleep(pause)
+            if job_id is not None:
+                job = self.get(job_id)
+                if job is None:
+                    return
+                targets = [job]
+            else:
+                targets = self.list(kind)
+            changed = []
+            for job in targets:
+                version = job.version
+                if sent.get(job.id) != version:
+                    sent[job.id] = version
+                    changed.append(job.snapshot())
+            if changed or time.monotonic() - last >= heartbeat:
+                last = time.monotonic()
+                yield changed
+            if job_id is not None and targets[0].state in FINISHED_STATES and sent.get(job_id) == targets[0].version:
+                return
+
@@ -0,0 +1,263 @@
+"""
+Caché LRU acotada de listados de carpetas y conteos agregados, por ruta absoluta.
+
+Cada entrada guarda el mtime de la carpeta en el momento de calcularla: si al
+leerla el mtime ya no coincide se descarta (cambio externo). Los cambios hechos
+por la propia aplicación se invalidan de forma dirigida con invalidate_changed():
+solo el listado de la carpeta afectada y los conteos de sus ancestros.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# Tipos de entrada
+LISTING = 'listing'
+COUNTS = 'counts'
+RANGES = 'ranges'
+GAMES = 'games'
+
+
+class ListingCache:
+    """Caché LRU de listados y conteos con contadores de aciertos/fallos"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {LISTING: 0, COUNTS: 0}
+        self._misses: Dict[str, int] = {LISTING: 0, COUNTS: 0}
+        self._invalidations = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _key(kind: str, path: str) -> tuple:
+        return (kind, os.path.normpath(path))
+
+    def get(self, kind: str, path: str, mtime: Optional[float] = None) -> Optional[Any]:
+        """Devuelve el valor guardado si existe y su mtime coincide; si no, None (fallo)"""
+        key = self._key(kind, path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and (mtime is None or cached[0] == mtime):
+                self._entries.move_to_end(key)
+                self._hits[kind] = self._hits.get(kind, 0) + 1
+                return cached[1]
+            if cached is not None:
+                del self._entries[key]
+            self._misses[kind] = self._misses.get(kind, 0) + 1
+            return None
+
+    def put(self, kind: str, path: str, value: Any, mtime: Optional[float] = None):
+        key = self._key(kind, path)
+        with self._lock:
+            self._entries[key] = (mtime, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, path: str, kinds: Iterable[str] = (LISTING, COUNTS, RANGES, GAMES)):
+        """Descarta las entradas de una ruta concreta"""
+        with self._lock:
+            for kind in kinds:
+                if self._entries.pop(self._key(kind, path), None) is not None:
+                    self._invalidations += 1
+
+    def invalidate_ancestors(self, path: str, kinds: Iterable[str] = (COUNTS,)):
+        """Descarta las entradas de 'path' y de todas las carpetas que lo contienen"""
+        kinds = tuple(kinds)
+        path = os.path.normpath(path)
+        while path:
+            self.invalidate(path, kinds)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    def invalidate_subtree(self, path: str):
+        """Descarta todo lo que cuelga de 'path' (recorre las claves: usar solo en operaciones de carpeta)"""
+        path = os.path.normpath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == path or k[1].startswith(prefix)]:
+                del self._entries[key]
+                self._invalidations += 1
+
+    def invalidate_changed(self, path: str, recursive: bool = False):
+        """
+        Invalidación dirigida tras crear/borrar/renombrar/copiar 'path':
+        el listado de su carpeta padre, sus propias entradas y los conteos y tablas de rangos
+        de los ancestros. Los índices de carpetas de juego de los ancestros se actualizan (copia nueva).
+        """
+        path = os.path.normpath(path)
+        parent = os.path.dirname(path)
+        self._update_game_indexes(path)
+        self.invalidate(parent, (LISTING,))
+        self.invalidate(path)
+        self.invalidate_ancestors(parent, (COUNTS, RANGES))
+        if recursive:
+            self.invalidate_subtree(path)
+
+    def _update_game_indexes(self, path: str):
+        """
+        Añade/quita 'path' y las carpetas intermedias creadas en los índices GAMES guardados de sus
+        ancestros y los re-sella con el mtime nuevo (sin esto el cambio de mtime los descartaría).
+        Sube hasta el primer ancestro cuyo índice ya conocía la carpeta: por encima nada cambió.
+        El índice guardado puede estar leyéndose en otra petición: se modifica una copia y se
+        sustituye bajo el lock solo si nadie lo ha cambiado entretanto (si no, se descarta).
+        """
+        while True:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return
+            with self._lock:
+                cached = self._entries.get(self._key(GAMES, parent))
+            if cached is not None:
+                index, name = cached[1], os.path.basename(path)
+                try:
+                    is_dir = os.path.isdir(path)
+                    mtime = os.stat(parent).st_mtime
+                except OSError:
+                    self.invalidate(parent, (GAMES,))
+                    return
+                if is_dir == index.contains(name):
+                    return
+                updated = index.copy()
+                if is_dir:
+                    updated.add(name)
+                else:
+                    updated.discard(name)
+                key = self._key(GAMES, parent)
+                with self._lock:
+                    current = self._entries.get(key)
+                    if current is not None and current[1] is index:
+                        self._entries[key] = (mtime, updated)
+                    elif current is not None:
+                        del self._entries[key]
+                        self._invalidations += 1
+            path = parent
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores para comprobar que la caché realmente ahorra trabajo"""
+        with self._lock:
+            by_kind = {}
+            for kind in set(self._hits) | set(self._misses):
+                hits = self._hits.get(kind, 0)
+                misses = self._misses.get(kind, 0)
+                by_kind[kind] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0
+                }
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': sum(self._hits.values()),
+                'misses': sum(self._misses.values()),
+                'invalidations': self._invalidations,
+                'evictions': self._evictions,
+                'by_kind': by_kind
+            }
+
+
+class DirectorySnapshot:
+    """
+    Memo de subcarpetas por carpeta durante un lote (p. ej. sugerir destinos para todo TEMP).
+    Cada carpeta se lista una sola vez por lote; las carpetas que crea el propio lote se
+    invalidan con invalidate_created() para que la siguiente sugerencia las vea.
+    Guarda también el mtime_ns de cada carpeta tal como estaba al listarla (los planes de
+    ingesta lo comparan después para saber si lo que vieron sigue igual).
+    """
+
+    def __init__(self):
+        self._subfolders: Dict[str, Optional[list]] = {}
+        self._states: Dict[str, Optional[int]] = {}
+        self._derived: Dict[tuple, Any] = {}
+        self.listings = 0
+        self.hits = 0
+
+    def subfolders(self, path: str) -> Optional[list]:
+        """Nombres de las subcarpetas (orden de scandir) o None si la carpeta no existe o no se puede leer"""
+        key = os.path.normpath(path)
+        if key in self._subfolders:
+            self.hits += 1
+            return self._subfolders[key]
+        self.listings += 1
+        # stat ANTES de listar: si la carpeta cambia mientras tanto, el mtime guardado ya no coincide
+        self._states[key] = self._mtime_ns(key)
+        try:
+            with os.scandir(key) as it:
+                names = [e.name for e in it if e.is_dir()]
+        except (PermissionError, OSError):
+            names = None
+        self._subfolders[key] = names
+        return names
+
+    @staticmethod
+    def _mtime_ns(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def folder_states(self) -> Dict[str, Optional[int]]:
+        """mtime_ns (None si no existía) de las carpetas consultadas durante el lote, de cuando se listaron"""
+        return dict(self._states)
+
+    def derived(self, kind: str, path: str, build):
+        """Valor calculado a partir del listado de 'path' (tabla de rangos, índice de juegos), una vez por lote"""
+        key = (kind, os.path.normpath(path))
+        if key not in self._derived:
+            self._derived[key] = build()
+        return self._derived[key]
+
+    def _forget(self, path: str):
+        self._subfolders.pop(path, None)
+        self._states.pop(path, None)
+        for key in [k for k in self._derived if k[1] == path]:
+            del self._derived[key]
+
+    def invalidate_created(self, path: str):
+        """
+        Tras crear/borrar 'path' (quizá con carpetas intermedias de makedirs): las carpetas que no
+        existían se olvidan y la carpeta padre ya listada se actualiza en sitio, junto con los
+        valores derivados que saben actualizarse (add/discard); el resto se recalcula.
+        Sube hasta el primer ancestro que ya figuraba en el listado de su padre.
+        """
+        path = os.path.normpath(path)
+        while True:
+            if path in self._subfolders and self._subfolders[path] is None:
+                self._forget(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                return
+            names = self._subfolders.get(parent)
+            if names is None:
+                self._forget(parent)
+            else:
+                name = os.path.basename(path)
+                is_dir = os.path.isdir(path)
+                if is_dir == (name in names):
+                    return
+                if is_dir:
+                    names.append(name)
+                else:
+                    names.remove(name)
+                # El listado actualizado corresponde al estado de ahora
+                self._states[parent] = self._mtime_ns(parent)
+                for key in [k for k in self._derived if k[1] == parent]:
+                    value = self._derived[key]
+                    if not hasattr(value, 'add'):
+                        del self._derived[key]
+                    elif is_dir:
+                        value.add(name)
+                    else:
+                        value.discard(name)
+            path = parent
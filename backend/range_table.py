@@ -0,0 +1,78 @@
+"""
+Tablas precompiladas de carpetas de rango ("A - L", "FERRO - FLIPI", "123-L"...).
+
+Cada carpeta de destino con rangos se compila UNA vez en una tabla ordenada con los
+límites (inicio, fin) ya parseados; la búsqueda del rango de un título es O(log n)
+con bisect en lugar de recorrer, filtrar con regex y parsear en cada consulta.
+"""
+
+import bisect
+import re
+from typing import List, Optional
+
+# Rangos cortos sin espacios (A-L, M-Z, 123-L) y con espacios (A - L, AAA - AZZ)
+SHORT_RANGE_RE = re.compile(r'^([A-Z0-9]{1,3})-([A-Z0-9]{1,3})$', re.IGNORECASE)
+SPACED_RANGE_RE = re.compile(r'^([A-Z0-9]{1,12})\s+-\s+([A-Z0-9]{1,12})$', re.IGNORECASE)
+RANGE_SPLIT_RE = re.compile(r'\s*-\s*')
+
+
+def is_range_folder(folder_name: str) -> bool:
+    return bool(SHORT_RANGE_RE.match(folder_name) or SPACED_RANGE_RE.match(folder_name))
+
+
+def parse_range_folder(folder_name: str) -> tuple:
+    parts = RANGE_SPLIT_RE.split(folder_name)
+    if len(parts) >= 2:
+        return (parts[0].strip().upper(), parts[1].strip().upper())
+    return (folder_name.upper(), folder_name.upper())
+
+
+def longest_common_prefix(s1: str, s2: str) -> str:
+    min_len = min(len(s1), len(s2))
+    for i in range(min_len):
+        if s1[i] != s2[i]:
+            return s1[:i]
+    return s1[:min_len]
+
+
+class RangeTable:
+    """Carpetas de rango de un directorio, ordenadas por nombre, con sus límites parseados"""
+
+    def __init__(self, subfolders: List[str]):
+        self.folders = sorted(f for f in subfolders if is_range_folder(f))
+        bounds = [parse_range_folder(f) for f in self.folders]
+        self.starts = [start for start, _ in bounds]
+        self.ends = [end for _, end in bounds]
+        # Los inicios salen ordenados al ordenar por nombre salvo con mayúsculas/minúsculas
+        # mezcladas ('a - c' se ordena tras 'B - D'); en ese caso se usa el recorrido lineal
+        self.monotonic = all(a <= b for a, b in zip(self.starts, self.starts[1:]))
+
+    def __bool__(self) -> bool:
+        return bool(self.folders)
+
+    def _pick(self, i: int, title_upper: str) -> str:
+        """Rango i cubre el título por inicio: decidir entre él y el siguiente (fin y desempate LCP)"""
+        if i == len(self.folders) - 1 or title_upper <= self.ends[i]:
+            return self.folders[i]
+        lcp_prev = len(longest_common_prefix(title_upper, self.ends[i]))
+        lcp_next = len(longest_common_prefix(title_upper, self.starts[i + 1]))
+        return self.folders[i + 1] if lcp_next > lcp_prev else self.folders[i]
+
+    def find(self, title: str) -> Optional[str]:
+        """Carpeta de rango para 'title' (misma lógica que el recorrido lineal original)"""
+        if not self.folders:
+            return None
+        title_upper = title.upper()
+        if title_upper < self.starts[0]:
+            return self.folders[0]
+        if self.monotonic:
+            # Último rango cuyo inicio es <= título: el único con inicio <= título < inicio siguiente
+            return self._pick(bisect.bisect_right(self.starts, title_upper) - 1, title_upper)
+        return self._find_linear(title_upper)
+
+    def _find_linear(self, title_upper: str) -> str:
+        last = len(self.folders) - 1
+        for i in range(last + 1):
+            if i == last or self.starts[i] <= title_upper < self.starts[i + 1]:
+                return self._pick(i, title_upper)
+        return self.folders[last]
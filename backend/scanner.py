@@ -4,6 +4,17 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional
 from collections import defaultdict
 import shutil
+import threading
+from contextlib import contextmanager
+
+from listing_cache import ListingCache, DirectorySnapshot, LISTING, COUNTS, RANGES, GAMES
+from game_index import GameFolderIndex
+from ingest_plan import IngestPlan, list_temp_entries
+from tosec import parse_tosec_dict
+from range_table import RangeTable, is_range_folder, parse_range_folder, longest_common_prefix
+from tree_walker import ParallelTreeWalker
+from copy_engine import CopyEngine
+from copy_executor import CopyExecutor, CopyTask
 
 class DirectoryScanner:
     """Clase para escanear y analizar la estructura de carpetas TOSEC"""
@@ -28,8 +39,171 @@ class DirectoryScanner:
         '.zip': 'OTROS'
     }
     
-    def __init__(self, config: Dict[str, str]):
+    def __init__(self, config: Dict[str, str], catalog=None, cache: Optional[ListingCache] = None, search_index=None):
         self.config = config
+        # Catálogo persistente opcional (catalog.CollectionCatalog). Si la ruta está
+        # catalogada, las lecturas se responden desde SQLite en lugar del disco.
+        self.catalog = catalog
+        # Caché LRU de listados y conteos agregados (por ruta absoluta + mtime)
+        self.cache = cache if cache is not None else ListingCache()
+        # Recorridos completos del árbol (conteos, estadísticas) con un pool de hilos
+        self.walker = ParallelTreeWalker(int(config.get('WALK_WORKERS', 4)))
+        # Copias a varios destinos en paralelo (con límite de escrituras por dispositivo) con el motor de copia
+        engine = CopyEngine(int(config.get('COPY_BUFFER_SIZE', 1024 * 1024)), bool(config.get('COPY_PREALLOCATE', False)),
+                            bool(config.get('COPY_ZERO_COPY', True)), float(config.get('COPY_MTIME_WINDOW', 0)))
+        self.copier = CopyExecutor(int(config.get('COPY_WORKERS', 8)), int(config.get('COPY_PER_DEVICE', 4)),
+                                   placement=config.get('PLACEMENT_MODE', 'copy'),
+                                   fanout=bool(config.get('COPY_FANOUT', True)), engine=engine)
+        # Índice de trigramas opcional (search_index.TrigramIndex) para /api/search
+        self.search_index = search_index
+        # Memo de subcarpetas del lote en curso (uno por hilo, ver batch_snapshot)
+        self._batch = threading.local()
+
+    def _use_catalog(self, path: str) -> bool:
+        """True si la ruta puede responderse desde el catálogo"""
+        return self.catalog is not None and self.catalog.is_indexed(path)
+
+    def notify_changes(self, paths: List[str], recursive: bool = False):
+        """
+        Avisa de rutas creadas/borradas/modificadas por la aplicación: actualiza el catálogo
+        y el índice de búsqueda e invalida en la caché el listado de sus carpetas y los conteos de sus ancestros
+        (los índices de carpetas de juego se actualizan en sitio).
+        Con recursive=True (copias de carpetas completas) también se invalida el subárbol.
+        """
+        self._sync_catalog(paths, recursive=recursive)
+        snapshot = getattr(self._batch, 'snapshot', None)
+        if snapshot is not None:
+            for path in paths:
+                snapshot.invalidate_created(path)
+        if self.search_index is not None and paths:
+            self.search_index.update_paths(paths)
+        for path in paths:
+            self.cache.invalidate_changed(path, recursive=recursive)
+
+    def notify_folders_changed(self, folders: List[str]):
+        """
+        Avisa de carpetas cuyo contenido cambió sin saber qué entradas (p. ej. vigilancia por sondeo):
+        re-sincroniza esas carpetas en el catálogo e invalida su listado y los conteos de sus ancestros.
+        """
+        if self.catalog is not None and folders:
+            try:
+                self.catalog.sync_folders(folders)
+            except Exception as e:
+                print(f"[CATALOG] Error sincronizando {len(folders)} carpetas: {e}")
+        if self.search_index is not None and folders:
+            self.search_index.sync_folders(folders)
+        for folder in folders:
+            self.cache.invalidate(folder, (LISTING,))
+            self.cache.invalidate_ancestors(folder, (COUNTS,))
+
+    def notify_catalog_changes(self, folders: List[str], paths: List[str]):
+        """
+        Cambios externos que ha encontrado un rebuild/refresh del catálogo (que ya está al día):
+        carpetas cuyo contenido directo cambió y entradas nuevas, borradas o modificadas.
+        Actualiza el índice de búsqueda e invalida en la caché solo eso y los conteos de sus
+        ancestros; el resto de la caché sigue valiendo (cada entrada se valida por mtime).
+        """
+        if self.search_index is not None:
+            self.search_index.update_paths(paths)
+            self.search_index.sync_folders(folders)
+        for path in paths:
+            self.cache.invalidate_changed(path)
+        for folder in folders:
+            self.cache.invalidate(folder, (LISTING,))
+            self.cache.invalidate_ancestors(folder, (COUNTS,))
+
+    @contextmanager
+    def batch_snapshot(self, snapshot: Optional[DirectorySnapshot] = None):
+        """
+        Durante el bloque, _find_game_folder/_find_range_folder/_find_letter_range_folder listan
+        cada carpeta una sola vez y responden de memoria. Reentrante: un bloque anidado usa el
+        memo del exterior. Las carpetas creadas durante el lote se anotan en el memo en notify_changes().
+        Se puede pasar un memo ya existente para reutilizarlo en varios bloques (p. ej. por proceso).
+        """
+        if getattr(self._batch, 'snapshot', None) is not None:
+            yield self._batch.snapshot
+            return
+        self._batch.snapshot = snapshot if snapshot is not None else DirectorySnapshot()
+        try:
+            yield self._batch.snapshot
+        finally:
+            self._batch.snapshot = None
+
+    def _subfolders(self, path: str) -> Optional[List[str]]:
+        """Subcarpetas de 'path' (None si no existe), desde el memo del lote si hay uno activo"""
+        snapshot = getattr(self._batch, 'snapshot', None)
+        if snapshot is not None:
+            return snapshot.subfolders(path)
+        if not os.path.exists(path):
+            return None
+        try:
+            return [f for f in os.listdir(path) if os.path.isdir(os.path.join(path, f))]
+        except (PermissionError, OSError):
+            return None
+
+    def _sync_catalog(self, paths: List[str], recursive: bool = False):
+        """Actualiza el catálogo (si existe) tras escribir en las colecciones"""
+        if self.catalog is None or not paths:
+            return
+        try:
+            self.catalog.sync_paths(paths, recursive=recursive)
+        except Exception as e:
+            print(f"[CATALOG] Error sincronizando {len(paths)} rutas: {e}")
+
+    @staticmethod
+    def _sort_key(entry: tuple) -> tuple:
+        """Orden de listado: primero carpetas, luego archivos, ambos alfabéticamente"""
+        return (not entry[1], entry[0].lower())
+
+    def _iter_entries(self, path: str):
+        """Itera los DirEntry de una carpeta (sin ordenar). El tipo viene de scandir sin stat extra"""
+        with os.scandir(path) as it:
+            for entry in it:
+                yield entry
+
+    def _list_entries(self, path: str, size_extensions: Optional[set] = None, cached: bool = True) -> List[tuple]:
+        """
+        Motor de listado de una sola pasada: devuelve (nombre, es_carpeta, tamaño, extensión),
+        ordenado UNA vez con _sort_key, desde el catálogo o desde disco con os.scandir.
+        El tamaño solo se obtiene (entry.stat, cacheado por DirEntry) para los archivos cuya
+        extensión está en 'size_extensions' (todos si es None); para el resto es None.
+        Con cached=True el listado se guarda en la caché LRU (validado por el mtime de la carpeta);
+        los recorridos completos usan cached=False para no expulsar lo que el usuario navega.
+        """
+        mtime = None
+        if cached:
+            mtime = os.stat(path).st_mtime
+            hit = self.cache.get(LISTING, path, mtime)
+            # Sirve si el listado guardado tiene los tamaños que se piden
+            if hit is not None and (hit[0] is None or (size_extensions is not None and size_extensions <= hit[0])):
+                return hit[1]
+        
+        if self._use_catalog(path):
+            entries = [
+                (row['name'], bool(row['is_dir']), None if row['is_dir'] else row['size'], row['extension'] or '')
+                for row in self.catalog.list_folder(path)
+            ]
+        else:
+            entries = []
+            for entry in self._iter_entries(path):
+                if entry.is_dir():
+                    entries.append((entry.name, True, None, ''))
+                    continue
+                if not entry.is_file():
+                    continue
+                ext = os.path.splitext(entry.name)[1].lower()
+                size = None
+                if size_extensions is None or ext in size_extensions:
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        size = 0
+                entries.append((entry.name, False, size, ext))
+        entries.sort(key=self._sort_key)
+        
+        if cached:
+            self.cache.put(LISTING, path, (frozenset(size_extensions) if size_extensions is not None else None, entries), mtime)
+        return entries
 
     def scan_multicopy_sources(self) -> Dict[str, Any]:
         """Escanea múltiples rutas de origen para la pestaña Multicopia."""
@@ -50,12 +224,10 @@ class DirectoryScanner:
                 continue
 
             try:
-                for item in os.listdir(path):
+                for item, is_dir, size, ext in self._list_entries(path, self.VALID_EXTENSIONS):
                     item_path = os.path.join(path, item)
                     
-                    if os.path.isfile(item_path):
-                        ext = os.path.splitext(item)[1].lower()
-                        
+                    if not is_dir:
                         # Solo incluir archivos de Spectrum válidos para la Multicopia
                         if ext in self.VALID_EXTENSIONS:
                             file_info = self._parse_tosec_filename(item)
@@ -64,7 +236,7 @@ class DirectoryScanner:
                                 'name': item,
                                 'extension': ext,
                                 'file_type': self.FILE_TYPES.get(ext, 'OTROS'),
-                                'size': os.path.getsize(item_path),
+                                'size': size,
                                 'tosec_info': file_info,
                                 'full_path': item_path,  # CLAVE: Guardamos la ruta completa
                                 'source_folder_name': Path(path).name # Nombre de la carpeta de origen (ej. TEMP, ZX_v40.9_FE)
@@ -117,7 +289,7 @@ class DirectoryScanner:
         }
     
     def scan_root_folders(self, base_path: str, max_depth: int = 3) -> Dict[str, Any]:
-        """Escanea las carpetas raíz - CONTEO COMPLETO con os.walk"""
+        """Escanea las carpetas raíz - CONTEO COMPLETO con recorrido paralelo"""
         if not os.path.exists(base_path):
             return {'error': f'La ruta {base_path} no existe', 'folders': []}
         
@@ -125,18 +297,21 @@ class DirectoryScanner:
             folders = []
             total_files = 0
             
-            for item in sorted(os.listdir(base_path)):
+            # Un único recorrido paralelo de toda la raíz deja en caché los conteos de cada carpeta
+            self._subtree_stats(base_path)
+            
+            for item, is_dir, _, _ in self._list_entries(base_path, size_extensions=set()):
                 item_path = os.path.join(base_path, item)
                 
-                if os.path.isdir(item_path):
-                    file_count = self._count_all_files(item_path)
+                if is_dir:
+                    file_count, _, has_subfolders = self._subtree_stats(item_path)
                     
                     folders.append({
                         'name': item,
                         'path': item,
                         'type': 'folder',
                         'file_count': file_count,
-                        'has_subfolders': self._has_subfolders(item_path)
+                        'has_subfolders': has_subfolders
                     })
                     
                     total_files += file_count
@@ -152,14 +327,98 @@ class DirectoryScanner:
             return {'error': str(e), 'folders': []}
     
     def _count_all_files(self, path: str) -> int:
-        """Conteo COMPLETO de TODOS los archivos usando os.walk"""
-        count = 0
+        """Conteo COMPLETO de TODOS los archivos (recursivo)"""
+        return self._subtree_stats(path)[0]
+
+    def _subtree_stats(self, path: str) -> tuple:
+        """
+        Devuelve (archivos_totales, archivos_directos, tiene_subcarpetas) de una carpeta.
+        Recorrido post-orden memoizado en la caché por ruta + mtime: la primera vez recorre
+        el subárbol una sola vez y deja calculadas TODAS sus carpetas; después, una carpeta
+        cuyo mtime no ha cambiado se responde de memoria, así que navegar un nivel es O(hijos).
+        Un cambio profundo no altera el mtime de los ancestros: quien modifica el árbol
+        debe llamar a notify_changes() para invalidarlos.
+        """
+        path = os.path.normpath(path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return (0, 0, False)
+        
+        cached = self.cache.get(COUNTS, path, mtime)
+        if cached is not None:
+            return cached
+        
+        if not self._use_catalog(path):
+            return self._walk_subtree_stats(path, mtime)
+        
+        total = 0
+        direct = 0
+        has_subfolders = False
         try:
-            for root, dirs, files in os.walk(path):
-                count += len(files)
+            entries = self._list_entries(path, size_extensions=set(), cached=False)
         except (PermissionError, OSError):
-            pass
-        return count
+            entries = []
+        
+        for name, is_dir, _, _ in entries:
+            if is_dir:
+                has_subfolders = True
+                total += self._subtree_stats(os.path.join(path, name))[0]
+            else:
+                direct += 1
+        total += direct
+        
+        self.cache.put(COUNTS, path, (total, direct, has_subfolders), mtime)
+        return (total, direct, has_subfolders)
+
+    def _walk_subtree_stats(self, path: str, mtime: float) -> tuple:
+        """
+        Igual que _subtree_stats pero listando el subárbol en paralelo con self.walker.
+        Las subcarpetas que ya tienen conteo válido en caché no se recorren. Los hilos
+        solo listan; la agregación post-orden se hace aquí, de las hojas hacia arriba.
+        """
+        mtimes = {path: mtime}
+        pruned = {}
+        
+        def prune(folder):
+            # stat ANTES de listar: si la carpeta cambia mientras tanto, el mtime guardado
+            # queda antiguo y la entrada se descarta en la siguiente lectura
+            try:
+                folder_mtime = os.stat(folder).st_mtime
+            except OSError:
+                return True
+            cached = self.cache.get(COUNTS, folder, folder_mtime)
+            if cached is not None:
+                pruned[folder] = cached
+                return True
+            mtimes[folder] = folder_mtime
+            return False
+        
+        def process(folder, entries):
+            # Mismo criterio que os.walk: todo lo que no es carpeta cuenta como archivo
+            direct = 0
+            subfolders = []
+            for entry in entries:
+                if entry.is_dir():
+                    subfolders.append(entry.path)
+                else:
+                    direct += 1
+            return direct, subfolders
+        
+        # Como os.walk, sin entrar en enlaces simbólicos a carpetas (cuentan 0, no se cuentan dos veces)
+        listed = dict(self.walker.walk(path, process, prune=prune))
+        
+        # Las carpetas más profundas primero: sus hijos ya están calculados al llegar al padre
+        results = {}
+        for folder in sorted(listed, key=lambda f: f.count(os.sep), reverse=True):
+            direct, subfolders = listed[folder]
+            total = direct
+            for sub in subfolders:
+                # Podadas: conteo en caché; ilegibles o enlaces en bucle: 0
+                total += results.get(sub, pruned.get(sub, (0, 0, False)))[0]
+            results[folder] = (total, direct, bool(subfolders))
+            self.cache.put(COUNTS, folder, results[folder], mtimes[folder])
+        return results[path]
     
     def get_folder_contents(self, folder_path: str, include_files: bool = True, collection: str = None, fast_scan: bool = False) -> Dict[str, Any]:
         """Obtiene el contenido de una carpeta específica"""
@@ -173,16 +432,16 @@ class DirectoryScanner:
             
             is_ts_collection = collection == 'TS' or (self.config.get('TS_PATH', '') in folder_path)
             
-            for item in sorted(os.listdir(folder_path)):
+            # Una sola pasada con scandir y una sola ordenación (carpetas primero)
+            for item, is_dir, size, ext in self._list_entries(folder_path, self.ALL_DISPLAYABLE):
                 item_path = os.path.join(folder_path, item)
                 
-                if os.path.isdir(item_path):
+                if is_dir:
                     if fast_scan:
                         total_files = 0
                         direct_files = 0
                     else:
-                        total_files = self._count_all_files(item_path)
-                        direct_files = self._count_direct_files(item_path)
+                        total_files, direct_files, _ = self._subtree_stats(item_path)
                     
                     if is_ts_collection and not fast_scan:
                         near_limit = direct_files >= 200
@@ -207,8 +466,6 @@ class DirectoryScanner:
                     folder_count += 1
                 
                 elif include_files:
-                    ext = os.path.splitext(item)[1].lower()
-                    
                     if ext in self.ALL_DISPLAYABLE:
                         is_spectrum_file = ext in self.VALID_EXTENSIONS
                         is_common_file = ext in self.COMMON_EXTENSIONS
@@ -225,7 +482,7 @@ class DirectoryScanner:
                             'type': 'file',
                             'extension': ext,
                             'file_type': file_type,
-                            'size': os.path.getsize(item_path),
+                            'size': size,
                             'tosec_info': file_info,
                             'is_spectrum': is_spectrum_file,
                             'is_common': is_common_file,
@@ -236,55 +493,51 @@ class DirectoryScanner:
                         })
                         file_count += 1
             
-            # Ordenar: primero carpetas, luego archivos (ambos alfabéticamente)
-            folders = sorted([i for i in items if i['type'] == 'folder'], key=lambda x: x['name'].lower())
-            files = sorted([i for i in items if i['type'] == 'file'], key=lambda x: x['name'].lower())
-            items_sorted = folders + files
-            
+            # _list_entries ya devuelve primero carpetas, luego archivos (ambos alfabéticamente)
             return {
                 'path': folder_path,
-                'items': items_sorted,
+                'items': items,
                 'file_count': file_count,
                 'folder_count': folder_count,
-                'total_items': len(items_sorted)
+                'total_items': len(items)
             }
         
         except Exception as e:
             return {'error': str(e), 'items': []}
 
-    def scan_temp_files(self, temp_path: str) -> Dict[str, Any]:
-        """Escanea archivos en TEMP - solo archivos TOSEC válidos"""
+    def scan_temp_files(self, temp_path: str, plan: Optional[IngestPlan] = None) -> Dict[str, Any]:
+        """
+        Escanea archivos en TEMP - solo archivos TOSEC válidos.
+        Las sugerencias salen de un plan de ingesta: el que se pase (p. ej. calculado en varios
+        procesos por batch_planner) o uno calculado aquí en serie.
+        """
         if not os.path.exists(temp_path):
             return {'error': 'Carpeta TEMP no encontrada', 'files': []}
         
         try:
+            if plan is None:
+                plan = self.plan_temp_files(temp_path)
             files = []
             
-            for item in os.listdir(temp_path):
-                item_path = os.path.join(temp_path, item)
-                
-                if os.path.isfile(item_path):
-                    ext = os.path.splitext(item)[1].lower()
-                    
-                    # Solo mostrar archivos TOSEC válidos (sin .zip, .7z, .txt, etc.)
-                    if ext in self.TOSEC_EXTENSIONS:
-                        tosec_info = self._parse_tosec_filename(item)
-                        suggested_paths = self._suggest_destination(tosec_info, ext, item)
-                        
-                        files.append({
-                            'name': item,
-                            'extension': ext,
-                            'file_type': self.FILE_TYPES.get(ext, 'OTROS'),
-                            'size': os.path.getsize(item_path),
-                            'tosec_info': tosec_info,
-                            'suggested_paths': suggested_paths,
-                            'is_spectrum': True,
-                            'is_common': False,
-                            'can_delete': True,
-                            'can_emulate': ext in {'.tap', '.tzx', '.z80', '.sna'},
-                            'full_path': item_path,
-                            'status': 'pending'
-                        })
+            # Mismo orden que el listado de la carpeta (alfabético)
+            for f in sorted(plan.files, key=lambda f: f['filename'].lower()):
+                item, ext = f['filename'], f['extension']
+                if f['error']:
+                    raise ValueError(f"{item}: {f['error']}")
+                files.append({
+                    'name': item,
+                    'extension': ext,
+                    'file_type': self.FILE_TYPES.get(ext, 'OTROS'),
+                    'size': f['size'],
+                    'tosec_info': f['tosec_info'],
+                    'suggested_paths': f['suggested_paths'],
+                    'is_spectrum': True,
+                    'is_common': False,
+                    'can_delete': True,
+                    'can_emulate': ext in {'.tap', '.tzx', '.z80', '.sna'},
+                    'full_path': os.path.join(temp_path, item),
+                    'status': 'pending'
+                })
             
             return {
                 'path': temp_path,
@@ -294,7 +547,30 @@ class DirectoryScanner:
         
         except Exception as e:
             return {'error': str(e), 'files': []}
-    
+
+    def _plan_file(self, filename: str, ext: str, size: int) -> Dict[str, Any]:
+        """Registro de plan de un archivo de TEMP: info TOSEC y destinos sugeridos (o el error)"""
+        try:
+            tosec_info = self._parse_tosec_filename(filename)
+            suggested_paths = self._suggest_destination(tosec_info, ext, filename)
+            return {'filename': filename, 'extension': ext, 'size': size,
+                    'tosec_info': tosec_info, 'suggested_paths': suggested_paths, 'error': None}
+        except Exception as e:
+            return {'filename': filename, 'extension': ext, 'size': size,
+                    'tosec_info': None, 'suggested_paths': {'FE': [], 'TS': []}, 'error': str(e)}
+
+    def plan_temp_files(self, temp_path: str) -> IngestPlan:
+        """
+        Calcula los destinos (FE y TS) de todos los archivos TOSEC de TEMP una sola vez.
+        El plan guarda la huella de TEMP y el estado de las carpetas destino consultadas
+        para poder ejecutarlo después sin repetir el trabajo (ver ingest_plan).
+        Para TEMP muy grandes ver batch_planner (varios procesos).
+        """
+        with self.batch_snapshot() as snapshot:
+            entries = list_temp_entries(temp_path, self.TOSEC_EXTENSIONS)
+            files = [self._plan_file(filename, ext, size) for filename, ext, size, _ in entries]
+            return IngestPlan(temp_path, entries, files, snapshot.folder_states(), self.TOSEC_EXTENSIONS)
+
     def delete_temp_file(self, filename: str) -> Dict[str, Any]:
         """Elimina un archivo de TEMP"""
         file_path = os.path.join(self.config['TEMP_PATH'], filename)
@@ -326,20 +602,43 @@ class DirectoryScanner:
         else:  # TS
             base_path = os.path.join(self.config['TS_PATH'], self.config.get('TS_TOSEC_SUBPATH', 'TOSEC_v40.9'))
         
-        for dest_path in destinations:
-            try:
-                full_dest_path = os.path.join(base_path, dest_path)
-                dest_dir = os.path.dirname(full_dest_path)
-                
-                os.makedirs(dest_dir, exist_ok=True)
-                shutil.copy2(source_file, full_dest_path)
-                results['success'].append(dest_path)
-                
-            except Exception as e:
-                results['errors'].append(f"Error copiando a {dest_path}: {str(e)}")
+        return self._copy_to_base(source_file, destinations, base_path, results)
+    
+    def _copy_to_base(self, source_file: str, destinations: List[str], base_path: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Copia 'source_file' a cada destino relativo a 'base_path' en paralelo (self.copier)"""
+        tasks = [CopyTask(source_file, os.path.join(base_path, dest_path), dest_path) for dest_path in destinations]
+        copy_results = self.copier.run(tasks)
+        for result in copy_results:
+            if result.ok:
+                results['success'].append(result.task.tag)
+            else:
+                results['errors'].append(f"Error copiando a {result.task.tag}: {result.error}")
+        results['placement'] = self.copier.summary(copy_results)
         
+        self.notify_changes([os.path.join(base_path, p) for p in results['success']])
         return results
     
+    def updates_base_path(self, collection: str, updates_base: str) -> Optional[str]:
+        """Carpeta de la colección dentro de UPDATES_TOSEC (ej: ZX_v41_FE, ZX_v41_TS/TOSEC_v41) o None"""
+        if not os.path.exists(updates_base):
+            return None
+        if collection == 'FE':
+            # Buscar carpeta FE en UPDATES_TOSEC (ej: ZX_v41_FE)
+            for item in os.listdir(updates_base):
+                if 'FE' in item.upper() and os.path.isdir(os.path.join(updates_base, item)):
+                    return os.path.join(updates_base, item)
+            return None
+        # Buscar carpeta TS en UPDATES_TOSEC (ej: ZX_v41_TS)
+        for item in os.listdir(updates_base):
+            if 'TS' in item.upper() and os.path.isdir(os.path.join(updates_base, item)):
+                ts_folder = os.path.join(updates_base, item)
+                # Añadir subcarpeta TOSEC si existe
+                tosec_subpath = self.config.get('TS_TOSEC_SUBPATH', 'TOSEC_v41')
+                if os.path.exists(os.path.join(ts_folder, tosec_subpath)):
+                    return os.path.join(ts_folder, tosec_subpath)
+                return ts_folder
+        return None
+    
     def copy_file_to_updates_tosec(self, source_file: str, destinations: List[str], collection: str, updates_base: str) -> Dict[str, Any]:
         """Copia un archivo a UPDATES_TOSEC (misma lógica que copy_file_to_destinations pero con ruta base diferente)"""
         results = {
@@ -353,48 +652,12 @@ class DirectoryScanner:
             return results
         
         # Determinar carpeta base dentro de UPDATES_TOSEC
-        if collection == 'FE':
-            # Buscar carpeta FE en UPDATES_TOSEC (ej: ZX_v41_FE)
-            base_path = None
-            if os.path.exists(updates_base):
-                for item in os.listdir(updates_base):
-                    if 'FE' in item.upper() and os.path.isdir(os.path.join(updates_base, item)):
-                        base_path = os.path.join(updates_base, item)
-                        break
-            if not base_path:
-                results['errors'].append(f"No se encontró carpeta FE en {updates_base}")
-                return results
-        else:  # TS
-            # Buscar carpeta TS en UPDATES_TOSEC (ej: ZX_v41_TS)
-            base_path = None
-            if os.path.exists(updates_base):
-                for item in os.listdir(updates_base):
-                    if 'TS' in item.upper() and os.path.isdir(os.path.join(updates_base, item)):
-                        ts_folder = os.path.join(updates_base, item)
-                        # Añadir subcarpeta TOSEC si existe
-                        tosec_subpath = self.config.get('TS_TOSEC_SUBPATH', 'TOSEC_v41')
-                        if os.path.exists(os.path.join(ts_folder, tosec_subpath)):
-                            base_path = os.path.join(ts_folder, tosec_subpath)
-                        else:
-                            base_path = ts_folder
-                        break
-            if not base_path:
-                results['errors'].append(f"No se encontró carpeta TS en {updates_base}")
-                return results
-        
-        for dest_path in destinations:
-            try:
-                full_dest_path = os.path.join(base_path, dest_path)
-                dest_dir = os.path.dirname(full_dest_path)
-                
-                os.makedirs(dest_dir, exist_ok=True)
-                shutil.copy2(source_file, full_dest_path)
-                results['success'].append(dest_path)
-                
-            except Exception as e:
-                results['errors'].append(f"Error copiando a {dest_path}: {str(e)}")
+        base_path = self.updates_base_path(collection, updates_base)
+        if not base_path:
+            results['errors'].append(f"No se encontró carpeta {'FE' if collection == 'FE' else 'TS'} en {updates_base}")
+            return results
         
-        return results
+        return self._copy_to_base(source_file, destinations, base_path, results)
     
     def process_temp_file(self, filename: str, selected_destinations: Dict[str, List[str]]) -> Dict[str, Any]:
         """Procesa un archivo de TEMP"""
@@ -441,10 +704,12 @@ class DirectoryScanner:
     
     def _count_direct_files(self, path: str) -> int:
         """Cuenta solo archivos directos"""
+        if self._use_catalog(path):
+            return self.catalog.count_direct_files(path)
         count = 0
         try:
-            for item in os.listdir(path):
-                if os.path.isfile(os.path.join(path, item)):
+            for entry in self._iter_entries(path):
+                if entry.is_file():
                     count += 1
         except (PermissionError, OSError):
             pass
@@ -452,9 +717,11 @@ class DirectoryScanner:
     
     def _has_subfolders(self, path: str) -> bool:
         """Verifica si tiene subcarpetas"""
+        if self._use_catalog(path):
+            return self.catalog.has_subfolders(path)
         try:
-            for item in os.listdir(path):
-                if os.path.isdir(os.path.join(path, item)):
+            for entry in self._iter_entries(path):
+                if entry.is_dir():
                     return True
         except (PermissionError, OSError):
             pass
@@ -469,134 +736,90 @@ class DirectoryScanner:
         - Rangos largos: "AAA - AZZ", "ASTONISHING - AE"
         NO detecta nombres de juegos como "R-TYPE" o "QUIVIRA - THE ADVENTURE"
         """
-        # Patrón para rangos cortos sin espacios (ej: A-L, M-Z, 123-L)
-        short_pattern = r'^([A-Z0-9]{1,3})-([A-Z0-9]{1,3})$'
-        if re.match(short_pattern, folder_name, re.IGNORECASE):
-            return True
-        
-        # Patrón para rangos con espacios (ej: A - L, 123 - L, AAA - AZZ)
-        spaced_pattern = r'^([A-Z0-9]{1,12})\s+-\s+([A-Z0-9]{1,12})$'
-        if re.match(spaced_pattern, folder_name, re.IGNORECASE):
-            return True
-        
-        return False
+        # Regex precompiladas en range_table
+        return is_range_folder(folder_name)
     
     def _parse_range_folder(self, folder_name: str) -> tuple:
         """Parsea carpeta de rango"""
-        # Primero intentar con espacios, luego sin
-        parts = re.split(r'\s*-\s*', folder_name)
-        if len(parts) >= 2:
-            return (parts[0].strip().upper(), parts[1].strip().upper())
-        return (folder_name.upper(), folder_name.upper())
+        return parse_range_folder(folder_name)
 
     def _longest_common_prefix(self, s1: str, s2: str) -> str:
         """Calcula prefijo común más largo"""
-        min_len = min(len(s1), len(s2))
-        for i in range(min_len):
-            if s1[i] != s2[i]:
-                return s1[:i]
-        return s1[:min_len]
+        return longest_common_prefix(s1, s2)
 
-    def _find_game_folder(self, base_path: str, title: str) -> Optional[str]:
+    def _range_table(self, base_path: str) -> Optional[RangeTable]:
+        """
+        Tabla de rangos de una carpeta, compilada una vez y guardada en la caché por ruta + mtime
+        (crear o renombrar una carpeta de rango cambia el mtime de su carpeta padre).
+        Dentro de un lote sale del memo del lote, sin stat.
+        """
+        snapshot = getattr(self._batch, 'snapshot', None)
+        if snapshot is not None:
+            return snapshot.derived(RANGES, base_path, lambda: RangeTable(snapshot.subfolders(base_path) or []))
+        try:
+            mtime = os.stat(base_path).st_mtime
+        except OSError:
+            return None
+        table = self.cache.get(RANGES, base_path, mtime)
+        if table is None:
+            table = RangeTable(self._subfolders(base_path) or [])
+            self.cache.put(RANGES, base_path, table, mtime)
+        return table
+
+    def _game_index(self, base_path: str) -> Optional[GameFolderIndex]:
+        """
+        Índice de carpetas de juego de una carpeta, construido una vez y guardado en la caché por
+        ruta + mtime; notify_changes() lo mantiene al día cuando la aplicación crea carpetas.
+        Dentro de un lote sale del memo del lote.
+        """
+        snapshot = getattr(self._batch, 'snapshot', None)
+        if snapshot is not None:
+            subfolders = snapshot.subfolders(base_path)
+            if subfolders is None:
+                return None
+            return snapshot.derived(GAMES, base_path, lambda: GameFolderIndex(subfolders))
+        try:
+            mtime = os.stat(base_path).st_mtime
+        except OSError:
+            return None
+        index = self.cache.get(GAMES, base_path, mtime)
+        if index is None:
+            index = GameFolderIndex(self._subfolders(base_path) or [])
+            self.cache.put(GAMES, base_path, index, mtime)
+        return index
+
+    def _find_game_folder(self, base_path: str, title: str, loose: Optional[bool] = None) -> Optional[str]:
         """
         Busca la carpeta específica del juego dentro de un directorio.
         SOLO devuelve coincidencia EXACTA para evitar meter archivos en carpetas incorrectas.
         Si no existe la carpeta exacta, devuelve None para que se cree una nueva.
+        Con loose=True (o GAME_FOLDER_MATCH='loose') también acepta la carpeta que solo difiere
+        en acentos o signos de puntuación ("Pac-Man" -> "PAC MAN").
         """
-        if not os.path.exists(base_path):
+        index = self._game_index(base_path)
+        if index is None:
             return None
-        
-        try:
-            subfolders = [f for f in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, f))]
-            
-            if not subfolders:
-                return None
-            
-            title_upper = title.upper().strip()
-            
-            for folder in subfolders:
-                # Ignorar carpetas de rango
-                if self._is_range_folder(folder):
-                    continue
-                
-                # Extraer nombre limpio de la carpeta (quitar corchetes si los tiene)
-                folder_name = folder.strip('[]').upper().strip()
-                
-                # SOLO coincidencia exacta
-                if folder_name == title_upper:
-                    return folder
-            
-            # No se encontró coincidencia exacta
-            return None
-            
-        except (PermissionError, OSError):
-            pass
-        
-        return None
+        if loose is None:
+            loose = self.config.get('GAME_FOLDER_MATCH', 'exact') == 'loose'
+        return index.find(title, loose=loose)
 
     def _find_range_folder(self, base_path: str, title: str) -> Optional[str]:
-        """Busca carpeta de rango correcta con lógica LCP"""
-        if not os.path.exists(base_path):
+        """Busca carpeta de rango correcta con lógica LCP (bisect sobre la tabla precompilada)"""
+        table = self._range_table(base_path)
+        if not table:
             return None
-        
-        try:
-            subfolders = [f for f in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, f))]
-            range_folders = [f for f in subfolders if self._is_range_folder(f)]
-            
-            if not range_folders:
-                return None
-            
-            title_upper = title.upper()
-            sorted_ranges = sorted(range_folders)
-            
-            first_start, _ = self._parse_range_folder(sorted_ranges[0])
-            if title_upper < first_start:
-                return sorted_ranges[0]
-            
-            for i in range(len(sorted_ranges)):
-                current_folder = sorted_ranges[i]
-                current_start, current_end = self._parse_range_folder(current_folder)
-                
-                if i == len(sorted_ranges) - 1:
-                    return current_folder
-                
-                next_folder = sorted_ranges[i + 1]
-                next_start, _ = self._parse_range_folder(next_folder)
-                
-                if title_upper >= current_start and title_upper < next_start:
-                    if title_upper <= current_end:
-                        return current_folder
-                    
-                    lcp_prev = len(self._longest_common_prefix(title_upper, current_end))
-                    lcp_next = len(self._longest_common_prefix(title_upper, next_start))
-                    
-                    if lcp_next > lcp_prev:
-                        return next_folder
-                    else:
-                        return current_folder
-            
-            return sorted_ranges[-1]
-                    
-        except (PermissionError, OSError):
-            pass
-        
-        return None
+        return table.find(title)
 
     def _find_letter_range_folder(self, base_path: str, title: str) -> Optional[str]:
         """
         Busca carpeta de rango por letra inicial (123-L o M-Z)
         Para la estructura de AÑOS en TS (especialmente 2019-2025)
         """
-        if not os.path.exists(base_path):
+        table = self._range_table(base_path)
+        if not table:
             return None
         
         try:
-            subfolders = [f for f in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, f))]
-            range_folders = [f for f in subfolders if self._is_range_folder(f)]
-            
-            if not range_folders:
-                return None
-            
             # Obtener primera letra/carácter del título
             first_char = ''
             for char in title.upper():
@@ -608,8 +831,7 @@ class DirectoryScanner:
                 first_char = '1'
             
             # Buscar en qué rango cae
-            for folder in sorted(range_folders):
-                start, end = self._parse_range_folder(folder)
+            for folder, start, end in zip(table.folders, table.starts, table.ends):
                 
                 # Comparar solo el primer carácter
                 start_char = start[0] if start else ''
@@ -632,7 +854,7 @@ class DirectoryScanner:
                             return folder
             
             # Si no encontró, devolver el último rango (M-Z normalmente)
-            return sorted(range_folders)[-1] if range_folders else None
+            return table.folders[-1]
                     
         except (PermissionError, OSError):
             pass
@@ -640,66 +862,8 @@ class DirectoryScanner:
         return None
 
     def _parse_tosec_filename(self, filename: str) -> Dict[str, Any]:
-        """Parsea nombre de archivo TOSEC"""
-        pattern = r'^(?P<title>.*?)\s*\((?P<year>\d{4}(?:-\d{4})?|19xx|20xx)\)\((?P<publisher>.*?)\)'
-        match = re.match(pattern, filename)
-        
-        if match:
-            info = match.groupdict()
-            year_str = info['year'].lower()
-            
-            if 'xx' in year_str:
-                category = 'unknown'
-                year_int = 0
-                years = []
-            else:
-                years = []
-                try:
-                    if '-' in year_str:
-                        parts = year_str.split('-')
-                        start_year = int(parts[0])
-                        end_year = int(parts[1])
-                        years = [start_year, end_year]
-                        year_int = start_year
-                    else:
-                        year_int = int(year_str)
-                        years = [year_int]
-                    
-                    has_classic = any(1982 <= y <= 1993 for y in years)
-                    has_homebrew = any(1994 <= y <= 2025 for y in years)
-                    
-                    if has_classic and has_homebrew:
-                        category = 'both'
-                    elif has_classic:
-                        category = 'classic'
-                    elif has_homebrew:
-                        category = 'homebrew'
-                    else:
-                        category = 'unknown'
-                except ValueError:
-                    year_int = 0
-                    category = 'unknown'
-                    years = []
-            
-            return {
-                'title': info['title'].strip(),
-                'year': info['year'],
-                'year_int': year_int,
-                'years': years,
-                'publisher': info['publisher'].strip(),
-                'category': category,
-                'is_tosec': True
-            }
-        
-        return {
-            'title': os.path.splitext(filename)[0],
-            'year': 'unknown',
-            'year_int': 0,
-            'years': [],
-            'publisher': 'unknown',
-            'category': 'unknown',
-            'is_tosec': False
-        }
+        """Parsea nombre de archivo TOSEC (parser precompilado, ver tosec.py; diccionario nuevo en cada llamada)"""
+        return parse_tosec_dict(filename)
 
     def _create_game_folder_name(self, title: str) -> str:
         """Crea nombre de carpeta del juego"""
@@ -900,13 +1064,29 @@ class DirectoryScanner:
             'by_decade': defaultdict(int)
         }
         
-        for root, dirs, files in os.walk(path):
-            stats['total_files'] += len(files)
+        if self._use_catalog(path):
+            for ext, count in self.catalog.extension_counts(path).items():
+                stats['total_files'] += count
+                if ext in self.VALID_EXTENSIONS:
+                    stats['by_type'][self.FILE_TYPES.get(ext, 'OTROS')] += count
+            stats['by_type'] = dict(stats['by_type'])
+            stats['by_decade'] = dict(stats['by_decade'])
+            return stats
+        
+        def process(folder, entries):
+            # Mismo criterio que os.walk: todo lo que no es carpeta cuenta como archivo
+            files = [e.name for e in entries if not e.is_dir()]
+            by_type = defaultdict(int)
             for file in files:
                 ext = os.path.splitext(file)[1].lower()
                 if ext in self.VALID_EXTENSIONS:
-                    file_type = self.FILE_TYPES.get(ext, 'OTROS')
-                    stats['by_type'][file_type] += 1
+                    by_type[self.FILE_TYPES.get(ext, 'OTROS')] += 1
+            return len(files), by_type
+        
+        for _, (file_count, by_type) in self.walker.walk(path, process):
+            stats['total_files'] += file_count
+            for file_type, count in by_type.items():
+                stats['by_type'][file_type] += count
         
         stats['by_type'] = dict(stats['by_type'])
         stats['by_decade'] = dict(stats['by_decade'])
@@ -0,0 +1,582 @@
+"""
+Índice invertido de trigramas en memoria sobre los nombres de archivo de las colecciones.
+
+Cada nombre (en minúsculas) se descompone en sus trigramas ('abc', 'bcd', ...) y cada
+trigrama guarda la lista de ids de los archivos que lo contienen. Una búsqueda por
+subcadena toma la lista más corta de entre los trigramas de la consulta y solo
+verifica esos candidatos, en lugar de recorrer el disco.
+
+Además de los trigramas, los campos TOSEC parseados (año, editor, categoría) y el tipo
+de archivo tienen sus propias listas por valor y una columna por archivo, de modo que
+filtros como "1985, Ultimate, TAPs" toman la lista más selectiva y comprueban el resto
+de condiciones sobre las columnas, sin parsear ni tocar el disco.
+
+Las listas son array('i') (4 bytes por entrada) en orden de alta. Las bajas dejan un
+hueco (ruta None) que se descarta al verificar; cuando los huecos superan una cuarta
+parte del índice se compactan las listas.
+
+Las actualizaciones (update_paths, sync_folders) leen el disco fuera del lock y aplican
+solo la diferencia con lo indexado: los archivos que no cambian conservan su id, así que
+los cursores siguen siendo válidos y las búsquedas no esperan a los recorridos.
+"""
+
+import bisect
+import heapq
+import itertools
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple, Callable
+
+from tree_walker import ParallelTreeWalker
+
+# Categorías de _parse_tosec_filename (el código es la posición)
+CATEGORIES = ('unknown', 'classic', 'homebrew', 'both')
+
+
+def trigrams(text: str) -> set:
+    """Trigramas distintos de un texto (ya en minúsculas)"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def relevance(query: str, name: str) -> tuple:
+    """
+    Clave de relevancia de un nombre (en minúsculas) que contiene 'query': mayor es mejor.
+    Se compara contra el título TOSEC (lo que va antes del primer ' ('), no contra los flags:
+    título exacto > prefijo > inicio de palabra > dentro del título > solo en los flags.
+    A igual nivel, gana el título más corto.
+    """
+    title_end = name.find(' (')
+    title = name[:title_end] if title_end > 0 else os.path.splitext(name)[0]
+    pos = title.find(query)
+    if title == query:
+        score = 4
+    elif pos == 0:
+        score = 3
+    elif pos > 0 and not title[pos - 1].isalnum():
+        score = 2
+    elif pos > 0:
+        score = 1
+    else:
+        score = 0
+    return (score, -len(title))
+
+
+class _IndexData:
+    """Estructuras del índice (sin bloqueo: TrigramIndex se encarga de ello)"""
+
+    def __init__(self):
+        self.paths: List[Optional[str]] = []
+        self.names: List[Optional[str]] = []  # nombre en minúsculas
+        self.collections: List[Optional[str]] = []
+        self.postings: Dict[str, array] = {}
+        # carpeta -> {nombre: id} para altas, bajas y re-sincronización de carpetas
+        self.by_folder: Dict[str, Dict[str, int]] = {}
+        self.deleted = 0
+        # Columnas de campos por id (años 0 = desconocido, códigos -1 = sin valor)
+        self.year_from = array('H')
+        self.year_to = array('H')
+        self.publisher = array('i')
+        self.category = array('b')
+        self.file_type = array('b')
+        # Valores distintos de editor y tipo (los códigos son su posición)
+        self.publishers: List[str] = []
+        self.publisher_codes: Dict[str, int] = {}
+        self.file_types: List[str] = []
+        self.file_type_codes: Dict[str, int] = {}
+        # (campo, valor) -> ids: 'year' por año, 'publisher'/'category'/'type' por código
+        self.field_postings: Dict[Tuple[str, int], array] = {}
+
+    def _code(self, values: List[str], codes: Dict[str, int], value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _post(self, field: str, value: int, doc_id: int):
+        posting = self.field_postings.get((field, value))
+        if posting is None:
+            posting = self.field_postings[(field, value)] = array('i')
+        posting.append(doc_id)
+
+    @property
+    def live(self) -> int:
+        return len(self.paths) - self.deleted
+
+    def add(self, collection: str, folder: str, name: str, fields: tuple):
+        """fields = (año_desde, año_hasta, editor_en_minúsculas|None, categoría, tipo|None)"""
+        files = self.by_folder.setdefault(folder, {})
+        if name in files:
+            return
+        doc_id = len(self.paths)
+        lower = name.lower()
+        self.paths.append(os.path.join(folder, name))
+        self.names.append(lower)
+        self.collections.append(collection)
+        files[name] = doc_id
+        for gram in trigrams(lower):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('i')
+            posting.append(doc_id)
+
+        year_from, year_to, publisher, category, file_type = fields
+        publisher_code = self._code(self.publishers, self.publisher_codes, publisher)
+        category_code = CATEGORIES.index(category) if category in CATEGORIES else 0
+        type_code = self._code(self.file_types, self.file_type_codes, file_type)
+        self.year_from.append(year_from)
+        self.year_to.append(year_to)
+        self.publisher.append(publisher_code)
+        self.category.append(category_code)
+        self.file_type.append(type_code)
+        if year_from:
+            for year in range(year_from, year_to + 1):
+                self._post('year', year, doc_id)
+        if publisher_code >= 0:
+            self._post('publisher', publisher_code, doc_id)
+        self._post('category', category_code, doc_id)
+        if type_code >= 0:
+            self._post('type', type_code, doc_id)
+
+    def fields_of(self, doc_id: int) -> tuple:
+        publisher = self.publisher[doc_id]
+        file_type = self.file_type[doc_id]
+        return (self.year_from[doc_id], self.year_to[doc_id],
+                self.publishers[publisher] if publisher >= 0 else None,
+                CATEGORIES[self.category[doc_id]],
+                self.file_types[file_type] if file_type >= 0 else None)
+
+    def remove(self, folder: str, name: str) -> bool:
+        files = self.by_folder.get(folder)
+        if not files or name not in files:
+            return False
+        doc_id = files.pop(name)
+        if not files:
+            del self.by_folder[folder]
+        self.paths[doc_id] = None
+        self.names[doc_id] = None
+        self.collections[doc_id] = None
+        self.deleted += 1
+        return True
+
+    def remove_subtree(self, path: str) -> int:
+        prefix = path.rstrip(os.sep) + os.sep
+        removed = 0
+        for folder in [f for f in self.by_folder if f == path or f.startswith(prefix)]:
+            for name in list(self.by_folder[folder]):
+                removed += self.remove(folder, name)
+        return removed
+
+    def compacted(self) -> '_IndexData':
+        """
+        Copia sin los huecos de las bajas (los ids cambian). Es un objeto nuevo: las búsquedas
+        en curso siguen recorriendo el anterior, que ya no se modifica.
+        """
+        data = _IndexData()
+        for doc_id, (collection, path) in enumerate(zip(self.collections, self.paths)):
+            if path is not None:
+                data.add(collection, os.path.dirname(path), os.path.basename(path), self.fields_of(doc_id))
+        return data
+
+
+class TrigramIndex:
+    """Índice de búsqueda por subcadena y por campos TOSEC, actualizable de forma incremental"""
+
+    def __init__(self, walker: Optional[ParallelTreeWalker] = None,
+                 parse_filename: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 file_types: Optional[Dict[str, str]] = None):
+        self.walker = walker or ParallelTreeWalker(1)
+        # Parser de nombres TOSEC y extensión -> tipo (DirectoryScanner.FILE_TYPES)
+        self.parse_filename = parse_filename
+        self.file_types = file_types or {}
+        self.roots: Dict[str, str] = {}
+        self._data = _IndexData()
+        self._lock = threading.RLock()
+        self.ready = False
+        self.building = False
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        # Cambia cuando los ids dejan de ser válidos (reconstrucción o compactación): invalida los cursores
+        self.generation = 0
+        # Rutas notificadas mientras se construye: se aplican al terminar
+        self._pending: List[Tuple[str, Any]] = []
+        # Una actualización a la vez (leer disco + aplicar): una lectura antigua no pisa a una más nueva
+        self._update_lock = threading.Lock()
+        # Sube con cada cambio del contenido: los totales guardados de otra versión no valen
+        self._version = 0
+        # (versión, consulta, colección, filtros) -> total exacto, para las páginas siguientes de search()
+        self._totals: 'OrderedDict[tuple, int]' = OrderedDict()
+
+    # ============== CONSTRUCCIÓN ==============
+
+    def _fields(self, name: str) -> tuple:
+        """Campos indexados de un nombre de archivo (solo se parsean los tipos de FILE_TYPES)"""
+        file_type = self.file_types.get(os.path.splitext(name)[1].lower())
+        if file_type is None or self.parse_filename is None:
+            return (0, 0, None, 'unknown', file_type)
+        info = self.parse_filename(name)
+        years = info.get('years') or []
+        year_from, year_to = (min(years), max(years)) if years else (0, 0)
+        publisher = info['publisher'].lower() if info['is_tosec'] else None
+        return (year_from, year_to, publisher, info['category'], file_type)
+
+    def _scan_into(self, data: _IndexData, collection: str, root: str):
+        def process(folder, entries):
+            # Mismo criterio que os.walk: todo lo que no es carpeta cuenta como archivo.
+            # El parseo TOSEC se hace aquí, en los hilos del walker
+            return [(e.name, self._fields(e.name)) for e in entries if not e.is_dir()]
+
+        for folder, files in self.walker.walk(root, process):
+            for name, fields in files:
+                data.add(collection, folder, name, fields)
+
+    def build(self, roots: Dict[str, str]) -> Dict[str, Any]:
+        """Construye el índice desde cero recorriendo las raíces {colección: ruta} en disco"""
+        roots = {c: os.path.normpath(r) for c, r in roots.items() if r and os.path.isdir(r)}
+        start = time.time()
+        with self._lock:
+            self.building = True
+            self.error = None
+            self._pending = []
+        try:
+            data = _IndexData()
+            for collection, root in roots.items():
+                self._scan_into(data, collection, root)
+            with self._lock:
+                self._data = data
+                self.generation += 1
+                self._version += 1
+                self.roots = roots
+                pending, self._pending = self._pending, []
+                for kind, arg in pending:
+                    self._apply(kind, arg)
+                self.ready = True
+                self.built_at = time.time()
+                self.build_seconds = round(self.built_at - start, 2)
+            print(f"[SEARCH] Índice de trigramas: {data.live} archivos, "
+                  f"{len(data.postings)} trigramas en {self.build_seconds}s")
+            return self.status()
+        except Exception as e:
+            self.error = str(e)
+            print(f"[SEARCH] Error construyendo el índice: {e}")
+            raise
+        finally:
+            with self._lock:
+                self.building = False
+
+    # ============== ACTUALIZACIÓN INCREMENTAL ==============
+
+    def _collection_for(self, path: str) -> Optional[str]:
+        for collection, root in self.roots.items():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return collection
+        return None
+
+    def _read_path(self, path: str) -> Dict[Tuple[str, str], tuple]:
+        """{(carpeta, nombre): campos} de lo que hay en disco en 'path': un archivo, un subárbol o nada"""
+        if os.path.isdir(path):
+            def process(folder, entries):
+                return [(e.name, self._fields(e.name)) for e in entries if not e.is_dir()]
+
+            return {(folder, name): fields
+                    for folder, files in self.walker.walk(path, process) for name, fields in files}
+        if os.path.exists(path):
+            folder, name = os.path.split(path)
+            return {(folder, name): self._fields(name)}
+        return {}
+
+    def _read_folder(self, folder: str) -> Optional[Dict[str, tuple]]:
+        """{nombre: campos} de los archivos directos de 'folder' (None si no existe o no se puede leer)"""
+        try:
+            with os.scandir(folder) as it:
+                return {e.name: self._fields(e.name) for e in it if not e.is_dir()}
+        except OSError:
+            return None
+
+    def _read(self, kind: str, items: List[str]) -> Dict[str, Any]:
+        if kind == 'paths':
+            return {path: self._read_path(path) for path in items}
+        return {folder: self._read_folder(folder) for folder in items}
+
+    def _update_path(self, path: str, on_disk: Dict[Tuple[str, str], tuple]):
+        """Deja en el índice exactamente los archivos de 'on_disk' bajo 'path' (el archivo o su subárbol)"""
+        collection = self._collection_for(path)
+        if collection is None:
+            return
+        data = self._data
+        folder, name = os.path.split(path)
+        known = {(folder, name)} if name in data.by_folder.get(folder, ()) else set()
+        prefix = path.rstrip(os.sep) + os.sep
+        for known_folder in [f for f in data.by_folder if f == path or f.startswith(prefix)]:
+            known.update((known_folder, known_name) for known_name in data.by_folder[known_folder])
+        for key in known - on_disk.keys():
+            data.remove(*key)
+        for key, fields in on_disk.items():
+            if key not in known:
+                data.add(collection, key[0], key[1], fields)
+
+    def _sync_folder(self, folder: str, on_disk: Optional[Dict[str, tuple]]):
+        collection = self._collection_for(folder)
+        if collection is None:
+            return
+        data = self._data
+        if on_disk is None:
+            if not os.path.isdir(folder):
+                data.remove_subtree(folder)
+            return
+        known = set(data.by_folder.get(folder, ()))
+        for name in known - on_disk.keys():
+            data.remove(folder, name)
+        for name in sorted(on_disk.keys() - known):
+            data.add(collection, folder, name, on_disk[name])
+
+    def _apply(self, kind: str, items: List[str], on_disk: Optional[Dict[str, Any]] = None):
+        # Sin lectura previa (cambios que esperaban a una construcción) se lee aquí
+        if on_disk is None:
+            on_disk = self._read(kind, items)
+        for item in items:
+            if kind == 'paths':
+                self._update_path(item, on_disk[item])
+            else:
+                self._sync_folder(item, on_disk[item])
+        self._version += 1
+        # Solo la compactación cambia los ids (y con ellos la generación de los cursores)
+        if self._data.deleted > max(1000, self._data.live // 4):
+            self._data = self._data.compacted()
+            self.generation += 1
+
+    def _update(self, kind: str, items: Iterable[str]):
+        items = [os.path.normpath(item) for item in items]
+        if not items:
+            return
+        with self._update_lock:
+            on_disk = self._read(kind, items) if self.ready and not self.building else None
+            with self._lock:
+                if self.building:
+                    self._pending.append((kind, items))
+                elif self.ready:
+                    self._apply(kind, items, on_disk)
+
+    def update_paths(self, paths: Iterable[str]):
+        """Aplica rutas creadas, borradas, renombradas o modificadas (archivos o carpetas completas)"""
+        self._update('paths', paths)
+
+    def sync_folders(self, folders: Iterable[str]):
+        """Re-sincroniza los archivos directos de carpetas cuyo contenido cambió sin detalle"""
+        self._update('folders', folders)
+
+    # ============== CONSULTAS ==============
+
+    def _candidates(self, data: _IndexData, query: str, filters: Dict[str, Any], after: int = -1):
+        """
+        Elige la fuente de candidatos más selectiva (ids en orden creciente) entre los trigramas
+        de la consulta y las listas de los filtros, empezando tras el id 'after'.
+        Devuelve None si algún filtro no tiene coincidencias.
+        """
+
+        def tail(posting):
+            # Las listas están ordenadas: bisect salta directamente al primer id > after
+            return itertools.islice(posting, bisect.bisect_right(posting, after), None)
+
+        sources = []  # (tamaño, iterable de ids)
+        grams = trigrams(query)
+        if grams:
+            postings = [data.postings.get(g) for g in grams]
+            if any(p is None for p in postings):
+                return None
+            smallest = min(postings, key=len)
+            sources.append((len(smallest), tail(smallest)))
+
+        def union(field, codes):
+            postings = [data.field_postings[(field, c)] for c in codes if (field, c) in data.field_postings]
+            if not postings:
+                return None
+            # Un archivo con rango de años aparece en varias listas: heapq.merge mantiene el orden
+            # y los duplicados quedan juntos para descartarlos al verificar
+            tails = [tail(p) for p in postings]
+            return (sum(len(p) for p in postings), tails[0] if len(tails) == 1 else heapq.merge(*tails))
+
+        if 'year_from' in filters:
+            source = union('year', range(filters['year_from'], filters['year_to'] + 1))
+            if source is None:
+                return None
+            sources.append(source)
+        if 'publisher' in filters:
+            codes = [code for code, name in enumerate(data.publishers) if filters['publisher'] in name]
+            source = union('publisher', codes)
+            if source is None:
+                return None
+            sources.append(source)
+        if 'category' in filters:
+            source = union('category', [CATEGORIES.index(filters['category'])])
+            if source is None:
+                return None
+            sources.append(source)
+        if 'file_type' in filters:
+            code = data.file_type_codes.get(filters['file_type'])
+            source = union('type', [code] if code is not None else [])
+            if source is None:
+                return None
+            sources.append(source)
+
+        if not sources:
+            # Consultas de menos de 3 caracteres y sin filtros: se recorren todos los nombres
+            return iter(range(after + 1, len(data.names)))
+        return min(sources, key=lambda s: s[0])[1]
+
+    def _matcher(self, data: _IndexData, query: str, collection: Optional[str], filters: Dict[str, Any]):
+        """Función id -> bool que comprueba TODAS las condiciones sobre las columnas"""
+        names, collections = data.names, data.collections
+        checks = []
+        if query:
+            checks.append(lambda i: query in names[i])
+        if collection is not None:
+            checks.append(lambda i: collections[i] == collection)
+        if 'year_from' in filters:
+            lo, hi = filters['year_from'], filters['year_to']
+            year_from, year_to = data.year_from, data.year_to
+            checks.append(lambda i: year_from[i] != 0 and year_from[i] <= hi and year_to[i] >= lo)
+        if 'publisher' in filters:
+            wanted = {code for code, name in enumerate(data.publishers) if filters['publisher'] in name}
+            publisher = data.publisher
+            checks.append(lambda i: publisher[i] in wanted)
+        if 'category' in filters:
+            category_code = CATEGORIES.index(filters['category'])
+            category = data.category
+            checks.append(lambda i: category[i] == category_code)
+        if 'file_type' in filters:
+            type_code = data.file_type_codes.get(filters['file_type'], -2)
+            file_type = data.file_type
+            checks.append(lambda i: file_type[i] == type_code)
+        return lambda i: names[i] is not None and all(check(i) for check in checks)
+
+    @staticmethod
+    def _normalize(query: str, filters: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        filters = dict(filters or {})
+        if 'publisher' in filters:
+            filters['publisher'] = filters['publisher'].lower()
+        return query.lower(), filters
+
+    def iter_matches(self, query: str = '', collection: Optional[str] = None,
+                     filters: Optional[Dict[str, Any]] = None, after: int = -1,
+                     chunk: int = 2000) -> Iterator[Tuple[int, str, str, str]]:
+        """
+        Genera (id, colección, ruta, nombre) de cada coincidencia en orden de id, empezando tras 'after'.
+        No construye la lista completa: el bloqueo se toma por bloques de 'chunk' candidatos,
+        así que las actualizaciones no esperan a que termine un recorrido largo. Las búsquedas
+        en curso siguen viendo sus datos aunque una compactación los sustituya.
+        """
+        query, filters = self._normalize(query, filters)
+        with self._lock:
+            data = self._data
+            candidates = self._candidates(data, query, filters, after)
+            if candidates is None:
+                return
+            matches_doc = self._matcher(data, query, collection, filters)
+
+        last = after
+        while True:
+            batch = []
+            with self._lock:
+                seen = 0
+                for doc_id in itertools.islice(candidates, chunk):
+                    seen += 1
+                    # Las listas de años combinadas repiten el id de los archivos con rango de años
+                    if doc_id == last or not matches_doc(doc_id):
+                        continue
+                    last = doc_id
+                    path = data.paths[doc_id]
+                    batch.append((doc_id, data.collections[doc_id], path, os.path.basename(path)))
+            yield from batch
+            if seen < chunk:
+                return
+
+    def search(self, query: str = '', collection: Optional[str] = None, limit: int = 500,
+               filters: Optional[Dict[str, Any]] = None, after: int = -1,
+               offset: int = 0) -> Tuple[int, List[Tuple[str, str, str]], Optional[int]]:
+        """
+        Busca 'query' (subcadena, sin distinguir mayúsculas) en los nombres de archivo, con filtros
+        opcionales: year_from/year_to (se solapa con el rango de años del archivo), publisher
+        (subcadena), category ('classic', 'homebrew', 'both') y file_type (valor de FILE_TYPES).
+
+        Paginación: se devuelven como mucho 'limit' coincidencias con id mayor que 'after',
+        saltando antes 'offset' de ellas. Devuelve (total_exacto, [(colección, ruta, nombre)...],
+        id_siguiente) donde id_siguiente es el 'after' de la página siguiente (None si no hay más).
+
+        Con cursor el recorrido empieza tras 'after' (bisect en las listas) y para al completar
+        la página. El total se cuenta en la primera página y se guarda mientras el índice no
+        cambie; las páginas siguientes solo lo recuentan si hubo cambios entretanto.
+        """
+        query, filters = self._normalize(query, filters)
+        with self._lock:
+            key = (self._version, query, collection, tuple(sorted(filters.items())))
+            total = self._totals.get(key)
+        # Primera página sin total guardado: el mismo recorrido da la página y el total
+        counting = total is None and after < 0
+        if total is None and not counting:
+            total = sum(1 for _ in self.iter_matches(query, collection, filters))
+
+        found = 0
+        matches = []
+        next_after = None
+        last_id = after
+        for doc_id, doc_collection, path, name in self.iter_matches(query, collection, filters, after):
+            found += 1
+            if offset:
+                offset -= 1
+                continue
+            if len(matches) < limit:
+                matches.append((doc_collection, path, name))
+                last_id = doc_id
+            elif next_after is None:
+                next_after = last_id
+                if not counting:
+                    break
+        if counting:
+            total = found
+        with self._lock:
+            self._totals[key] = total
+            self._totals.move_to_end(key)
+            while len(self._totals) > 64:
+                self._totals.popitem(last=False)
+        return total, matches, next_after
+
+    def top_matches(self, query: str, collection: Optional[str] = None, k: int = 500,
+                    filters: Optional[Dict[str, Any]] = None) -> Tuple[int, List[Tuple[str, str, str]]]:
+        """
+        Las 'k' coincidencias más relevantes (ver relevance()), ordenadas de mejor a peor, y el total exacto.
+        heapq.nlargest mantiene un montículo de tamaño k: solo se materializan esos k resultados.
+        """
+        query = query.lower()
+        total = 0
+
+        def scored():
+            nonlocal total
+            for doc_id, doc_collection, path, name in self.iter_matches(query, collection, filters):
+                total += 1
+                # A igual relevancia, primero el de menor id (orden de alta); la clave nunca se repite
+                yield relevance(query, name.lower()) + (-doc_id,), (doc_collection, path, name)
+
+        best = heapq.nlargest(k, scored())
+        return total, [match for _, match in best]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'building': self.building,
+                'roots': self.roots,
+                'files': self._data.live,
+                'trigrams': len(self._data.postings),
+                'publishers': len(self._data.publishers),
+                'deleted_slots': self._data.deleted,
+                'built_at': self.built_at,
+                'build_seconds': self.build_seconds,
+                'error': self.error
+            }
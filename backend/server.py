@@ -0,0 +1,73 @@
+"""
+Servidor WSGI de producción: un hilo de escucha y un pool acotado de hilos que atienden las
+conexiones, sin el recargador ni el depurador de app.run(debug=True).
+
+Así las peticiones de navegación y búsqueda se sirven en paralelo mientras corren copias y
+compresiones (que van en sus propios hilos, ver jobs.py). Con todos los hilos ocupados el
+hilo de escucha deja de aceptar conexiones y las nuevas esperan en la cola del socket, en
+lugar de crear un hilo por conexión sin límite como ThreadedWSGIServer.
+
+Cada conexión ocupa un hilo mientras está abierta: las conexiones keep-alive inactivas se
+cierran a los KEEPALIVE_TIMEOUT segundos y cada flujo de eventos (/api/jobs/events) abierto
+retiene un hilo, así que 'threads' debe cubrir los flujos abiertos más las peticiones normales.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Segundos que se espera la siguiente petición de una conexión keep-alive antes de cerrarla
+KEEPALIVE_TIMEOUT = 5
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 (keep-alive, respuestas por trozos) con límite de espera entre peticiones"""
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Servidor de werkzeug que reparte las conexiones entre 'threads' hilos"""
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int = 16):
+        super().__init__(host, port, app, handler=PooledRequestHandler)
+        self.threads = max(1, int(threads))
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix='http')
+        self._slots = threading.BoundedSemaphore(self.threads)
+
+    def process_request(self, request, client_address):
+        # Esperar un hilo libre antes de aceptar más conexiones
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._process, request, client_address)
+        except RuntimeError:
+            # Pool cerrado (apagando)
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+def make_server(app, host: str = '0.0.0.0', port: int = 5000, threads: int = 16) -> PooledWSGIServer:
+    """Crea el servidor (port=0: puerto libre, ver server_port) sin empezar a servir"""
+    return PooledWSGIServer(host, port, app, threads)
+
+
+def serve(app, host: str = '0.0.0.0', port: int = 5000, threads: int = 16):
+    """Sirve 'app' hasta Ctrl+C (serve_forever de werkzeug cierra el servidor al salir)"""
+    server = make_server(app, host, port, threads)
+    print(f"[SERVER] Producción: http://{host}:{server.server_port} con {server.threads} hilos")
+    server.serve_forever()
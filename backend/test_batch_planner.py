@@ -0,0 +1,96 @@
+"""
+Pruebas de la planificación de TEMP en varios procesos (batch_planner).
+
+- Un proceso del pool ('spawn') vuelve a importar app.py como __mp_main__: importar app.py
+  no abre el catálogo ni crea escáner, índice, vigilante o trabajos; eso solo lo hace
+  init_services() (y una sola vez).
+- El plan repartido en procesos es idéntico al plan en serie y sigue vigente al terminar.
+
+Uso: python test_batch_planner.py   (o con pytest)
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from batch_planner import BatchPlanner
+from scanner import DirectoryScanner
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+F_FOLDERS = ["F-FERNA", "FERRO - FLIPI", "FLIPP - FP", "FRA - FROZE", "FRUIT - FY-FY"]
+S_FOLDERS = ["SA - SHADOWF", "SHADOWS - SPEKKT", "SPEKKU - STARCRYS", "STARD - SZ"]
+TITLES = ["Fruity March", "Frozen", "Fernandez Must Die", "Springelr", "Zynaps", "Shadow Dancer"]
+
+# Lo mismo que hace multiprocessing.spawn en cada proceso nuevo antes de recibir trabajo
+# (y, con un cuarto argumento, lo que hace el arranque del servidor después de importar)
+WORKER_IMPORT = """
+import json, runpy, sys
+sys.path.insert(0, sys.argv[1])
+namespace = runpy.run_path(sys.argv[2], run_name=sys.argv[3])
+if len(sys.argv) > 4:
+    namespace['init_services']()
+    first = namespace['init_services'].__globals__['catalog']
+    namespace['init_services']()
+    assert namespace['init_services'].__globals__['catalog'] is first
+    namespace = namespace['init_services'].__globals__
+names = ('scanner', 'catalog', 'search_index', 'watcher', 'jobs')
+print(json.dumps(sorted(n for n in names if namespace.get(n) is not None)))
+"""
+
+
+def make_collection(base):
+    """Colección TS con carpetas de rango y TEMP con unas cuantas variantes de cada título"""
+    ts = os.path.join(base, 'TS')
+    tosec = os.path.join(ts, 'TOSEC_v41')
+    for parent, folders in ((os.path.join(tosec, '02 CLASICOS', 'ALFABETO CLASICOS', 'F', 'TAPs'), F_FOLDERS),
+                            (os.path.join(tosec, '00 CARPETAS', 'S'), S_FOLDERS)):
+        for folder in folders:
+            os.makedirs(os.path.join(parent, folder))
+    temp = os.path.join(base, 'TEMP')
+    os.makedirs(temp)
+    for title in TITLES:
+        for variant in ('', '[a]', '[a2]', '(Side B)'):
+            with open(os.path.join(temp, f"{title} (1987)(Ocean){variant}.tap"), 'w') as out:
+                out.write(title)
+    config = {'TS_PATH': ts, 'FE_PATH': os.path.join(base, 'FE'), 'TS_TOSEC_SUBPATH': 'TOSEC_v41',
+              'TEMP_PATH': temp}
+    return config, tosec
+
+
+def import_app(base, run_name, init=False):
+    """Servicios creados al importar app.py con run_name en otro proceso (y llamar a init_services())"""
+    env = dict(os.environ, ZX_CATALOG_PATH=os.path.join(base, 'catalog.db'), ZX_WATCH='off',
+               ZX_FE_PATH=os.path.join(base, 'FE'), ZX_TS_PATH=os.path.join(base, 'TS'),
+               ZX_TEMP_PATH=os.path.join(base, 'TEMP'))
+    output = subprocess.run([sys.executable, '-c', WORKER_IMPORT, BACKEND_DIR,
+                             os.path.join(BACKEND_DIR, 'app.py'), run_name] + (['init'] if init else []),
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_does_not_start_app(tmp_path):
+    for run_name in ('__mp_main__', 'app'):
+        assert import_app(tmp_path, run_name) == []
+        assert not os.path.exists(os.path.join(tmp_path, 'catalog.db'))
+    # El arranque del servidor (init_services) sí crea todo y abre el catálogo
+    assert import_app(tmp_path, 'app', init=True) == ['catalog', 'jobs', 'scanner', 'search_index', 'watcher']
+    assert os.path.exists(os.path.join(tmp_path, 'catalog.db'))
+
+
+def test_processes_match_serial(tmp_path):
+    config, tosec = make_collection(tmp_path)
+    scanner = DirectoryScanner(config)
+    serial = BatchPlanner(scanner, workers=1).plan(config['TEMP_PATH'])
+    shards = BatchPlanner(scanner, workers=2, threshold=1, shard_size=5).plan(config['TEMP_PATH'])
+    assert shards.files == serial.files
+    assert shards.folders == serial.folders
+    assert any(f['suggested_paths']['TS'] for f in shards.files)
+    assert shards.check(tosec) is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
@@ -0,0 +1,202 @@
+"""
+Pruebas del catálogo persistente (catalog.py) sobre árboles temporales.
+
+- rebuild() y reapertura: otra instancia sobre la misma base de datos ve la colección
+  catalogada con las mismas filas, conteos y estado.
+- refresh() tras crear, borrar y renombrar carpetas y añadir un archivo: changed_folders
+  y changed_paths señalan solo lo cambiado y el resultado coincide con un rebuild nuevo.
+- Las consultas por prefijo (count_files, search, extension_counts) no incluyen las
+  carpetas hermanas cuyo nombre empieza igual ('A B', 'A-1', 'A.old', 'A0', 'AB').
+- Un lector no espera a un escritor: las lecturas responden con una transacción de
+  escritura abierta y durante el rebuild de otra colección (que mientras dura no cuenta
+  como catalogada y no admite un segundo rebuild).
+
+Uso: python test_catalog.py   (o con pytest)
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from catalog import CollectionCatalog
+from scanner import DirectoryScanner
+
+
+def add_game(game, g, files=2, ext='.tap'):
+    os.makedirs(game)
+    for f in range(files):
+        with open(os.path.join(game, f"Game {g} (1985)(Soft)[a{f}]{ext}"), 'w') as out:
+            out.write('x' * (f + 1))
+
+
+def make_tree(base, letters='AB', games=3, files=2):
+    root = os.path.join(base, 'FE')
+    for letter in letters:
+        for g in range(games):
+            add_game(os.path.join(root, letter, f"GAME {g}"), g, files)
+    return root
+
+
+def open_catalog(db_path, parse_filename=None):
+    parse_filename = parse_filename or DirectoryScanner({})._parse_tosec_filename
+    return CollectionCatalog(str(db_path), parse_filename, DirectoryScanner.VALID_EXTENSIONS)
+
+
+def rows(catalog, collection):
+    """Filas de una colección sin el mtime (comparables entre catálogos construidos en momentos distintos)"""
+    with catalog._lock:
+        result = catalog._conn.execute(
+            'SELECT * FROM entries WHERE collection = ? ORDER BY path', (collection,)).fetchall()
+    return [tuple(v for k, v in dict(row).items() if k != 'mtime') for row in result]
+
+
+def test_rebuild_persists_across_reopen(tmp_path):
+    fe = make_tree(tmp_path)
+    catalog = open_catalog(tmp_path / 'catalog.db')
+    result = catalog.rebuild('FE', fe)
+    assert result['success'] and result['total_files'] == 12
+    assert result['changed_paths'] == sorted(os.path.join(fe, letter) for letter in 'AB')
+    expected = rows(catalog, 'FE')
+    catalog.close()
+
+    reopened = open_catalog(tmp_path / 'catalog.db')
+    try:
+        assert reopened.has_root('FE') and reopened.is_indexed(os.path.join(fe, 'A', 'GAME 1'))
+        assert reopened.collection_for(str(tmp_path)) is None
+        assert rows(reopened, 'FE') == expected
+        assert [e['name'] for e in reopened.list_folder(os.path.join(fe, 'A'))] == ['GAME 0', 'GAME 1', 'GAME 2']
+        game = reopened.list_folder(os.path.join(fe, 'A', 'GAME 1'))[0]
+        assert (game['title'], game['year_int'], game['publisher'], game['is_tosec']) == ('Game 1', 1985, 'Soft', 1)
+        assert reopened.count_files(fe) == 12 and reopened.count_direct_files(fe) == 0
+        assert reopened.has_subfolders(fe) and not reopened.has_subfolders(os.path.join(fe, 'A', 'GAME 1'))
+        status = reopened.status()
+        assert status['building'] == []
+        assert status['collections']['FE'] == dict(status['collections']['FE'], path=fe, files=12, folders=8)
+    finally:
+        reopened.close()
+
+
+def test_refresh_reports_only_changed(tmp_path, touch_folders):
+    fe = make_tree(tmp_path)
+    catalog = open_catalog(tmp_path / 'catalog.db')
+    catalog.rebuild('FE', fe)
+    a, b = os.path.join(fe, 'A'), os.path.join(fe, 'B')
+
+    unchanged = catalog.refresh('FE', fe)
+    assert (unchanged['changed_folders'], unchanged['changed_paths'], unchanged['dirs_rescanned']) == ([], [], 1)
+
+    add_game(os.path.join(a, 'GAME 9'), 9, files=3)
+    for name in os.listdir(os.path.join(b, 'GAME 0')):
+        os.remove(os.path.join(b, 'GAME 0', name))
+    os.rmdir(os.path.join(b, 'GAME 0'))
+    os.rename(os.path.join(b, 'GAME 1'), os.path.join(b, 'GAME 1 (v2)'))
+    new_file = os.path.join(b, 'GAME 2', 'Game 2 (1985)(Soft)[!].tap')
+    with open(new_file, 'w') as out:
+        out.write('x')
+    touch_folders(a, b, os.path.join(b, 'GAME 2'))
+
+    result = catalog.refresh('FE', fe)
+    assert result['success']
+    assert result['changed_folders'] == sorted([a, b, os.path.join(b, 'GAME 2')])
+    assert sorted(result['changed_paths']) == sorted([
+        os.path.join(a, 'GAME 9'), os.path.join(b, 'GAME 0'), os.path.join(b, 'GAME 1'),
+        os.path.join(b, 'GAME 1 (v2)'), new_file])
+    assert (result['added'], result['removed']) == (3, 2)
+    # Solo la raíz, las carpetas con otro mtime y nada más (GAME 9 entra completa al darla de alta)
+    assert result['dirs_rescanned'] == 4
+
+    assert catalog.count_files(fe) == 12 + 3 - 2 + 1
+    assert [e['name'] for e in catalog.list_folder(b)] == ['GAME 1 (v2)', 'GAME 2']
+    assert catalog.count_files(os.path.join(b, 'GAME 1 (v2)')) == 2
+    fresh = open_catalog(tmp_path / 'fresh.db')
+    fresh.rebuild('FE', fe)
+    assert rows(catalog, 'FE') == rows(fresh, 'FE')
+    fresh.close()
+    catalog.close()
+
+
+def test_prefix_queries_exclude_similar_siblings(tmp_path):
+    root = tmp_path / 'TS'
+    for name in ('A', 'A B', 'A-1', 'A.old', 'A0', 'AB'):
+        add_game(os.path.join(root, name, 'GAME'), 1, files=2, ext='.tzx' if name == 'A' else '.tap')
+    catalog = open_catalog(tmp_path / 'catalog.db')
+    catalog.rebuild('TS', str(root))
+    a = os.path.join(root, 'A')
+
+    assert catalog.count_files(a) == 2
+    assert catalog.count_files(a + os.sep) == 2
+    assert catalog.count_files(root) == 12
+    assert catalog.extension_counts(a) == {'.tzx': 2}
+    assert catalog.extension_counts(root) == {'.tzx': 2, '.tap': 10}
+    assert sorted(r['path'] for r in catalog.search('game 1', a)) == sorted(
+        os.path.join(a, 'GAME', f"Game 1 (1985)(Soft)[a{f}].tzx") for f in range(2))
+    assert len(catalog.search('GAME 1', str(root), limit=5)) == 5
+    catalog.close()
+
+
+def run_soon(func, *args):
+    """Ejecuta 'func' en otro hilo y devuelve su resultado (falla si tarda más de 5 s, sin esperar al hilo)"""
+    pool = ThreadPoolExecutor(1)
+    try:
+        return pool.submit(func, *args).result(timeout=5)
+    finally:
+        pool.shutdown(wait=False)
+
+
+def test_reader_not_blocked_by_open_write(tmp_path):
+    fe = make_tree(tmp_path)
+    catalog = open_catalog(tmp_path / 'catalog.db')
+    catalog.rebuild('FE', fe)
+    a = os.path.join(fe, 'A')
+
+    # Lote de escritura a medias (como un rebuild o refresh entre dos commits)
+    with catalog._writing(catalog._write_conn) as conn:
+        conn.execute('DELETE FROM entries WHERE parent = ?', (a,))
+        assert run_soon(catalog.count_files, fe) == 12
+        assert [e['name'] for e in run_soon(catalog.list_folder, a)] == ['GAME 0', 'GAME 1', 'GAME 2']
+        assert run_soon(catalog.is_indexed, a)
+        conn.rollback()
+    catalog.close()
+
+
+def test_reader_not_blocked_during_rebuild(tmp_path):
+    fe = make_tree(tmp_path / 'fe')
+    ts = make_tree(tmp_path / 'ts')
+    scanner = DirectoryScanner({})
+    parsing, release = threading.Event(), threading.Event()
+
+    def slow_parse(filename):
+        # Solo el rebuild de TS se queda parado a mitad del recorrido
+        if threading.current_thread().name == 'rebuild-TS':
+            parsing.set()
+            release.wait(10)
+        return scanner._parse_tosec_filename(filename)
+
+    catalog = open_catalog(tmp_path / 'catalog.db', slow_parse)
+    catalog.rebuild('FE', fe)
+    results = []
+    builder = threading.Thread(target=lambda: results.append(catalog.rebuild('TS', ts)), name='rebuild-TS')
+    builder.start()
+    try:
+        assert parsing.wait(5)
+        # TS a medio construir: no cuenta como catalogada y no admite otro rebuild
+        assert catalog.status()['building'] == ['TS']
+        assert not catalog.is_indexed(ts) and catalog.is_indexed(fe)
+        assert not catalog.rebuild('TS', ts)['success']
+        # Las lecturas y las sincronizaciones de FE siguen sin esperar
+        assert run_soon(catalog.count_files, fe) == 12
+        with open(os.path.join(fe, 'A', 'GAME 0', 'notas.txt'), 'w') as out:
+            out.write('x')
+        run_soon(catalog.sync_folders, [os.path.join(fe, 'A', 'GAME 0')])
+        assert catalog.count_files(fe) == 13
+    finally:
+        release.set()
+        builder.join(10)
+    assert results[0]['total_files'] == 12
+    assert catalog.is_indexed(ts) and catalog.status()['building'] == []
+    catalog.close()
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
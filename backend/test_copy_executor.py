@@ -0,0 +1,198 @@
+"""
+Pruebas del ejecutor de copias (copy_executor.CopyExecutor.run): copia incremental y
+colocación con enlaces duros / clones.
+
+- 'mtime': se salta un destino con el mismo tamaño y fecha que el origen.
+- 'hash': se salta un destino con el mismo contenido aunque tenga otra fecha (y se le
+  alinean los metadatos); con otro contenido del mismo tamaño y fecha se copia.
+- La comparación ocupa el dispositivo destino: nunca hay más comparaciones a la vez en un
+  dispositivo que escrituras permitidas (per_device).
+- 'hardlink': los destinos de un archivo en el mismo dispositivo son enlaces de una copia;
+  una copia normal posterior sobre uno de ellos (motor, fanout_copy o copy2) no cambia
+  los demás.
+- Sin soporte de enlaces o clones cada destino se copia y el dispositivo se recuerda.
+
+Uso: python test_copy_executor.py   (o con pytest)
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import copy_executor
+from copy_engine import CopyEngine
+from copy_executor import COPY, HARDLINK, REFLINK, SKIPPED, CopyExecutor, CopyTask
+
+
+def make_sources(base, count=4):
+    src = os.path.join(base, 'TEMP')
+    os.makedirs(src)
+    for i in range(count):
+        with open(os.path.join(src, f"Game {i} (1985)(Soft).tap"), 'wb') as out:
+            out.write(os.urandom(3000 + i))
+    return [os.path.join(src, name) for name in sorted(os.listdir(src))]
+
+
+def make_tasks(base, sources, destinations=('00 TOSEC ALL', '01 AÑOS')):
+    tasks = []
+    for folder in destinations:
+        os.makedirs(os.path.join(base, 'FE', folder), exist_ok=True)
+        tasks += [CopyTask(src, os.path.join(base, 'FE', folder, os.path.basename(src))) for src in sources]
+    return tasks
+
+
+def methods(results):
+    assert all(r.ok for r in results), [r.error for r in results if not r.ok]
+    return [r.method for r in results]
+
+
+def content(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_mtime_mode_skips_unchanged(tmp_path):
+    sources = make_sources(tmp_path)
+    tasks = make_tasks(tmp_path, sources)
+    executor = CopyExecutor(workers=4)
+    assert methods(executor.run(tasks)) == [COPY] * len(tasks)
+    assert methods(executor.run(tasks, incremental='mtime')) == [SKIPPED] * len(tasks)
+    assert methods(executor.run(tasks)) == [COPY] * len(tasks)
+
+    # Otro contenido (y tamaño) en un origen y solo otra fecha en otro
+    with open(sources[1], 'wb') as out:
+        out.write(os.urandom(5000))
+    os.utime(sources[2], (1, 1))
+    results = executor.run(tasks, incremental='mtime')
+    changed = {sources[1], sources[2]}
+    assert methods(results) == [COPY if t.src in changed else SKIPPED for t in tasks]
+    for task in tasks:
+        with open(task.src, 'rb') as a, open(task.dest, 'rb') as b:
+            assert a.read() == b.read()
+    summary = executor.summary(results)
+    assert (summary['copies'], summary['skipped']) == (4, 4)
+    assert summary['bytes_skipped'] == sum(os.path.getsize(t.src) for t in tasks if t.src not in changed)
+
+
+def test_hash_mode_compares_content(tmp_path):
+    sources = make_sources(tmp_path)
+    tasks = make_tasks(tmp_path, sources, ('00 TOSEC ALL',))
+    executor = CopyExecutor(workers=4)
+    executor.run(tasks)
+
+    # Mismo contenido, otra fecha: 'mtime' lo copiaría, 'hash' lo salta y alinea la fecha
+    os.utime(tasks[0].dest, (1, 1))
+    assert methods(executor.run(tasks, incremental='hash')) == [SKIPPED] * len(tasks)
+    assert os.stat(tasks[0].dest).st_mtime_ns == os.stat(tasks[0].src).st_mtime_ns
+    assert methods(executor.run(tasks, incremental='mtime')) == [SKIPPED] * len(tasks)
+
+    # Otro contenido con el mismo tamaño y fecha: 'mtime' no lo ve, 'hash' sí
+    st = os.stat(tasks[1].dest)
+    with open(tasks[1].dest, 'r+b') as out:
+        out.write(b'X')
+    os.utime(tasks[1].dest, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert methods(executor.run(tasks, incremental='mtime')) == [SKIPPED] * len(tasks)
+    expected = [COPY if i == 1 else SKIPPED for i in range(len(tasks))]
+    assert methods(executor.run(tasks, incremental='hash')) == expected
+    with open(tasks[1].src, 'rb') as a, open(tasks[1].dest, 'rb') as b:
+        assert a.read() == b.read()
+
+
+class CountingEngine(CopyEngine):
+    """Motor que cuenta cuántas comparaciones hay en marcha a la vez"""
+
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def unchanged(self, src, dest, mode, src_stat=None):
+        with self._count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.02)
+            return super().unchanged(src, dest, mode, src_stat)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+
+def test_hash_comparison_holds_device_slot(tmp_path):
+    sources = make_sources(tmp_path, count=8)
+    tasks = make_tasks(tmp_path, sources)
+    engine = CountingEngine()
+    executor = CopyExecutor(workers=8, per_device=2, engine=engine)
+    executor.run(tasks)
+    assert methods(executor.run(tasks, incremental='hash')) == [SKIPPED] * len(tasks)
+    # Todos los destinos están en el mismo dispositivo
+    assert engine.peak == 2, engine.peak
+
+
+def test_copy_over_hardlink_keeps_other_links(tmp_path):
+    sources = make_sources(tmp_path, count=3)
+    tasks = make_tasks(tmp_path, sources, ('00 TOSEC ALL', '01 AÑOS', '02 CLASICOS'))
+    placed = methods(CopyExecutor(workers=4, placement=HARDLINK).run(tasks))
+    assert placed.count(COPY) == 3 and placed.count(HARDLINK) == 6
+    links = {src: [t.dest for t in tasks if t.src == src] for src in sources}
+    old = {src: content(src) for src in sources}
+    for src in sources:
+        assert all(os.path.samefile(links[src][0], dest) for dest in links[src])
+        with open(src, 'wb') as out:
+            out.write(os.urandom(4000))
+
+    # Copia en abanico a dos de los tres enlaces, copia suelta con el motor y con copy2
+    fanout = [CopyTask(sources[0], dest) for dest in links[sources[0]][:2]]
+    assert methods(CopyExecutor(workers=4).run(fanout)) == [COPY, COPY]
+    CopyEngine().copy(sources[1], links[sources[1]][0])
+    assert methods(CopyExecutor(copy_function=shutil.copy2).run([CopyTask(sources[2], links[sources[2]][0])])) == [COPY]
+
+    for src, copied in ((sources[0], 2), (sources[1], 1), (sources[2], 1)):
+        for i, dest in enumerate(links[src]):
+            assert content(dest) == (content(src) if i < copied else old[src]), (src, dest)
+        assert os.stat(links[src][-1]).st_nlink == 3 - copied
+
+
+class FailingFcntl:
+    """fcntl de un sistema de archivos sin clones (FICLONE no soportado)"""
+
+    calls = 0
+
+    @classmethod
+    def ioctl(cls, *args):
+        cls.calls += 1
+        raise OSError(errno.EOPNOTSUPP, 'Operation not supported')
+
+
+@pytest.mark.parametrize('placement', [HARDLINK, REFLINK])
+def test_placement_falls_back_to_copy(tmp_path, monkeypatch, placement):
+    calls = []
+
+    def link(src, dst, *args, **kwargs):
+        calls.append(dst)
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(copy_executor.os, 'link', link)
+    monkeypatch.setattr(copy_executor, 'fcntl', FailingFcntl)
+    FailingFcntl.calls = 0
+    sources = make_sources(tmp_path, count=3)
+    tasks = make_tasks(tmp_path, sources, ('00 TOSEC ALL', '01 AÑOS', '02 CLASICOS'))
+    executor = CopyExecutor(workers=1, placement=placement)
+    assert methods(executor.run(tasks)) == [COPY] * len(tasks)
+    for task in tasks:
+        assert content(task.dest) == content(task.src)
+        assert os.stat(task.dest).st_nlink == 1
+    # Solo se intentó una vez: el dispositivo queda marcado como sin enlaces/clones
+    assert len(calls) + FailingFcntl.calls == 1
+    assert len(executor._no_links) == 1
+    summary = executor.summary(executor.run(tasks))
+    assert (summary['copies'], summary['hardlinks'], summary['reflinks'], summary['bytes_saved']) == (9, 0, 0, 0)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
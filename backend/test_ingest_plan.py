@@ -0,0 +1,84 @@
+"""
+Pruebas de la vigencia de los planes de ingesta de TEMP (ingest_plan.IngestPlan.check).
+
+Un plan calculado en la previsualización solo se ejecuta si nada de lo que lo decidió ha
+cambiado: ni el contenido de TEMP ni las carpetas destino que se consultaron, tampoco si
+cambiaron mientras se estaba planificando.
+
+Uso: python test_ingest_plan.py   (o con pytest)
+"""
+
+import os
+
+import pytest
+
+import listing_cache
+from scanner import DirectoryScanner
+
+F_FOLDERS = ["F-FERNA", "FERRO - FLIPI", "FLIPP - FP", "FRA - FROZE", "FRUIT - FY-FY"]
+
+
+def make_collection(base):
+    """TS con carpetas de rango en F y TEMP con varias versiones de 'Fruity March'"""
+    tosec = os.path.join(base, 'TS', 'TOSEC_v41')
+    ranges = os.path.join(tosec, '02 CLASICOS', 'ALFABETO CLASICOS', 'F', 'TAPs')
+    for folder in F_FOLDERS:
+        os.makedirs(os.path.join(ranges, folder))
+    temp = os.path.join(base, 'TEMP')
+    os.makedirs(temp)
+    for variant in ('', '[a]', '[a2]'):
+        with open(os.path.join(temp, f"Fruity March (1985)(Ultimate){variant}.tap"), 'w') as out:
+            out.write('x')
+    config = {'TS_PATH': os.path.join(base, 'TS'), 'FE_PATH': os.path.join(base, 'FE'),
+              'TS_TOSEC_SUBPATH': 'TOSEC_v41', 'TEMP_PATH': temp}
+    return DirectoryScanner(config), tosec, ranges, temp
+
+
+def test_plan_valid_while_nothing_changes(tmp_path):
+    scanner, tosec, ranges, temp = make_collection(tmp_path)
+    plan = scanner.plan_temp_files(temp)
+    assert ranges in plan.folders
+    assert any('FRA - FROZE' in p for f in plan.files for p in f['suggested_paths']['TS'])
+    assert plan.check(tosec) is None
+    assert plan.check(tosec) is None
+
+
+def test_stale_when_temp_changes(tmp_path):
+    scanner, tosec, _, temp = make_collection(tmp_path)
+    plan = scanner.plan_temp_files(temp)
+    with open(os.path.join(temp, 'Frozen (1986)(Ocean).tap'), 'w') as out:
+        out.write('x')
+    assert plan.check(tosec) == 'el contenido de TEMP cambió'
+
+
+def test_stale_when_destination_changes_after_planning(tmp_path, touch_folders):
+    scanner, tosec, ranges, temp = make_collection(tmp_path)
+    plan = scanner.plan_temp_files(temp)
+    # Una carpeta de rango nueva puede cambiar el destino sugerido
+    os.makedirs(os.path.join(ranges, 'FRUIT - FRUZ'))
+    touch_folders(ranges)
+    reason = plan.check(tosec)
+    assert reason is not None and os.path.relpath(ranges, tosec) in reason, reason
+
+
+def test_stale_when_destination_changes_while_planning(tmp_path, touch_folders, monkeypatch):
+    scanner, tosec, ranges, temp = make_collection(tmp_path)
+    listed = listing_cache.DirectorySnapshot.subfolders
+
+    def subfolders(snapshot, path):
+        # Alguien crea una carpeta justo después de que el plan liste la de rangos
+        names = listed(snapshot, path)
+        if os.path.normpath(path) == ranges and not os.path.isdir(os.path.join(ranges, 'FRUIT - FRUZ')):
+            os.makedirs(os.path.join(ranges, 'FRUIT - FRUZ'))
+            touch_folders(ranges)
+        return names
+
+    monkeypatch.setattr(listing_cache.DirectorySnapshot, 'subfolders', subfolders)
+    plan = scanner.plan_temp_files(temp)
+    monkeypatch.undo()
+    reason = plan.check(tosec)
+    assert reason is not None and os.path.relpath(ranges, tosec) in reason, reason
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
@@ -0,0 +1,182 @@
+"""
+Pruebas del registro de trabajos en segundo plano (jobs.JobRegistry).
+
+- Exclusión por clave: no se lanzan dos trabajos del mismo tipo con la misma clave a la vez,
+  tampoco si las peticiones llegan juntas; al terminar el primero se puede lanzar otro.
+- Cancelación: el trabajo se detiene en su siguiente comprobación, se ejecutan los avisos
+  de on_cancel() y el resultado es el de un trabajo cancelado (409).
+- Avisos (watch): miles de cambios de progreso por segundo se funden en una tanda cada
+  'interval' segundos con el último estado, y la última tanda es el estado final.
+
+Uso: python test_jobs.py   (o con pytest)
+"""
+
+import threading
+import time
+
+from jobs import CANCELLED, CANCELLED_MESSAGE, DONE, JobRegistry
+
+
+def blocked(release, started=None):
+    """Trabajo que no termina hasta que se suelta 'release' (avisa en 'started' al empezar)"""
+    def work(job):
+        if started is not None:
+            started.release()
+        release.wait(5)
+        return {'success': True}
+    return work
+
+
+def test_key_excludes_duplicate_running_jobs():
+    registry = JobRegistry()
+    release = threading.Event()
+    first = registry.submit('catalog', 'Catálogo', blocked(release), key='catalog')
+    assert first is not None
+    assert registry.submit('catalog', 'Catálogo', blocked(release), key='catalog') is None
+    # Otra clave u otro tipo sí se lanzan
+    other_kind = registry.submit('compress', 'FE', blocked(release), key='FE')
+    other_key = registry.submit('compress', 'TS', blocked(release), key='TS')
+    assert other_kind is not None and other_key is not None
+    assert registry.submit('compress', 'FE', blocked(release), key='FE') is None
+    # Sin clave no hay exclusión
+    assert registry.submit('catalog', 'Sin clave', blocked(release)) is not None
+
+    release.set()
+    for job in registry.list():
+        assert job.wait(5)
+        assert job.state == DONE
+    again = registry.submit('catalog', 'Catálogo', lambda job: {'success': True}, key='catalog')
+    assert again is not None and again.wait(5)
+
+
+def test_key_exclusion_with_simultaneous_submits(clients=16):
+    registry = JobRegistry()
+    release = threading.Event()
+    barrier = threading.Barrier(clients)
+    accepted = []
+
+    def submit():
+        barrier.wait()
+        job = registry.submit('catalog', 'Catálogo', blocked(release), key='catalog')
+        if job is not None:
+            accepted.append(job)
+
+    threads = [threading.Thread(target=submit) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    assert len(accepted) == 1
+    assert accepted[0].wait(5)
+
+
+def test_cancel_stops_job():
+    registry = JobRegistry()
+    started = threading.Event()
+    cancelled_callbacks = []
+
+    def work(job):
+        job.on_cancel(lambda: cancelled_callbacks.append(job.id))
+        job.set_totals(files=1000)
+        started.set()
+        for _ in range(1000):
+            job.check_cancelled()
+            job.advance()
+            time.sleep(0.005)
+        return {'success': True}
+
+    job = registry.submit('copy', 'Copia larga', work)
+    assert started.wait(5)
+    assert registry.cancel(job.id) is True
+    assert job.wait(5)
+    assert job.state == CANCELLED
+    assert job.error == CANCELLED_MESSAGE
+    assert job.status_code == 409 and job.result['cancelled']
+    assert cancelled_callbacks == [job.id]
+    assert job.files_done < 1000
+    snapshot = job.snapshot()
+    assert not snapshot['running'] and snapshot['cancel_requested']
+
+    # Terminado ya no se cancela; un id desconocido no existe
+    assert registry.cancel(job.id) is False
+    assert registry.cancel('no-such-job') is None
+
+
+def test_cancel_while_running_synchronously():
+    """run() registra el trabajo en este hilo: se puede cancelar desde otro (otra petición)"""
+    registry = JobRegistry()
+
+    def work(job):
+        threading.Thread(target=registry.cancel, args=(job.id,)).start()
+        for _ in range(500):
+            if job.cancelled:
+                break
+            time.sleep(0.01)
+        return {'success': True, 'partial': True}
+
+    job = registry.run('multicopy', 'Multicopia', work)
+    assert job.state == CANCELLED
+    # Lo que devolvió la función se conserva (respuesta parcial) junto con el error
+    assert job.result == {'success': True, 'partial': True}
+    assert job.error == CANCELLED_MESSAGE
+
+
+def test_watch_coalesces_progress(interval=0.05, updates=3000):
+    registry = JobRegistry()
+    release = threading.Event()
+
+    def work(job):
+        release.wait(5)
+        # Como 7-Zip con -bsp1: el porcentaje cambia muchas más veces que las que se envían
+        for i in range(1, updates + 1):
+            job.set_percent(100.0 * i / updates, f'{i}')
+            if i % 100 == 0:
+                time.sleep(0.005)
+        return {'success': True}
+
+    job = registry.submit('compress', 'Compresión', work)
+    batches = []
+    start = time.monotonic()
+    for batch in registry.watch(job.id, interval=interval):
+        batches.append(batch)
+        release.set()
+    elapsed = time.monotonic() - start
+
+    snapshots = [snapshot for batch in batches for snapshot in batch]
+    assert all(len(batch) <= 1 for batch in batches)
+    assert all(s['id'] == job.id for s in snapshots)
+    # Una tanda por intervalo como mucho (más la del estado inicial)
+    assert len(batches) <= elapsed / interval + 2, (len(batches), elapsed)
+    assert len(snapshots) < updates / 10
+    percents = [s['percent'] for s in snapshots]
+    assert percents == sorted(percents)
+    assert snapshots[-1]['state'] == DONE and snapshots[-1]['percent'] == 100.0
+    assert snapshots[-1]['message'] == str(updates)
+
+
+def test_watch_sends_only_changed_jobs():
+    registry = JobRegistry()
+    release = threading.Event()
+    started = threading.Semaphore(0)
+    idle = registry.submit('copy', 'Quieto', blocked(release, started))
+    busy = registry.submit('copy', 'Activo', blocked(release, started))
+    # Los dos ya en marcha: a partir de aquí solo cambia el que avanza
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    watcher = registry.watch(kind='copy', interval=0.01, heartbeat=0.2)
+    assert {s['id'] for s in next(watcher)} == {idle.id, busy.id}
+    busy.advance(1, 100)
+    assert [s['id'] for s in next(watcher)] == [busy.id]
+    # Sin cambios: latido con una lista vacía
+    assert next(watcher) == []
+    release.set()
+    for job in (idle, busy):
+        assert job.wait(5)
+
+
+if __name__ == "__main__":
+    for test in (test_key_excludes_duplicate_running_jobs, test_key_exclusion_with_simultaneous_submits,
+                 test_cancel_stops_job, test_cancel_while_running_synchronously,
+                 test_watch_coalesces_progress, test_watch_sends_only_changed_jobs):
+        test()
+        print(f"✅ {test.__name__}")
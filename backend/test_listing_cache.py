@@ -0,0 +1,96 @@
+"""
+Pruebas de la caché de listados y conteos (listing_cache) usada por DirectoryScanner.
+
+- Una entrada cuyo mtime ya no coincide se descarta al leerla (cambio externo).
+- Un archivo nuevo en una carpeta aparece en su listado sin invalidar nada a mano.
+- Tras un refresh del catálogo (notify_catalog_changes) solo se descartan las carpetas
+  cambiadas y los conteos de sus ancestros: las ramas hermanas siguen en caché.
+
+Uso: python test_listing_cache.py   (o con pytest)
+"""
+
+import os
+
+import pytest
+
+from listing_cache import COUNTS, LISTING, ListingCache
+from scanner import DirectoryScanner
+
+
+def make_tree(base, letters='AB', games=3, files=2):
+    fe = os.path.join(base, 'FE')
+    for letter in letters:
+        for g in range(games):
+            game = os.path.join(fe, letter, f"GAME {g}")
+            os.makedirs(game)
+            for f in range(files):
+                with open(os.path.join(game, f"Game {g} (1985)(Soft)[a{f}].tap"), 'w') as out:
+                    out.write('x')
+    config = {'FE_PATH': fe, 'TS_PATH': os.path.join(base, 'TS'), 'TS_TOSEC_SUBPATH': 'TOSEC_v41'}
+    return config, fe
+
+
+def item(listing, name):
+    return next(i for i in listing['items'] if i['name'] == name)
+
+
+def test_entry_dropped_when_mtime_changes():
+    cache = ListingCache()
+    cache.put(LISTING, '/c/FE/A', ['GAME 0'], 100.0)
+    assert cache.get(LISTING, '/c/FE/A', 100.0) == ['GAME 0']
+    assert cache.get(LISTING, '/c/FE/A', 101.0) is None
+    # Descartada: ni siquiera con el mtime antiguo vuelve
+    assert cache.get(LISTING, '/c/FE/A', 100.0) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 0)
+
+
+def test_external_change_refreshes_listing(tmp_path, touch_folders):
+    config, fe = make_tree(tmp_path)
+    scanner = DirectoryScanner(config, cache=ListingCache())
+    game = os.path.join(fe, 'A', 'GAME 1')
+    assert scanner.get_folder_contents(game, collection='FE')['file_count'] == 2
+    assert scanner.get_folder_contents(game, collection='FE')['file_count'] == 2
+    assert scanner.cache.stats()['by_kind'][LISTING]['hits'] == 1
+
+    with open(os.path.join(game, 'Game 1 (1985)(Soft)[a9].tap'), 'w') as out:
+        out.write('x')
+    touch_folders(game)
+    listing = scanner.get_folder_contents(game, collection='FE')
+    assert listing['file_count'] == 3
+    assert 'Game 1 (1985)(Soft)[a9].tap' in [i['name'] for i in listing['items']]
+
+
+def test_catalog_refresh_invalidates_only_changed(tmp_path, touch_folders):
+    config, fe = make_tree(tmp_path)
+    cache = ListingCache()
+    scanner = DirectoryScanner(config, cache=cache)
+    for folder in (fe, os.path.join(fe, 'A'), os.path.join(fe, 'B')):
+        scanner.get_folder_contents(folder, collection='FE')
+    assert item(scanner.get_folder_contents(fe, collection='FE'), 'A')['file_count'] == 6
+
+    # Cambio externo dos niveles por debajo: el mtime de FE/A no cambia, el catálogo lo ve
+    game = os.path.join(fe, 'A', 'GAME 1')
+    new_file = os.path.join(game, 'Game 1 (1985)(Soft)[a9].tap')
+    with open(new_file, 'w') as out:
+        out.write('x')
+    touch_folders(game)
+    entries = cache.stats()['entries']
+    scanner.notify_catalog_changes([game], [new_file])
+
+    # Fuera: el listado de la carpeta cambiada y los conteos de ella y de sus ancestros
+    for kind, path in ((LISTING, game), (COUNTS, game), (COUNTS, os.path.join(fe, 'A'))):
+        assert cache.get(kind, path) is None, (kind, path)
+    # Siguen: la rama hermana y los juegos de FE/A que no cambiaron
+    for kind, path in ((LISTING, os.path.join(fe, 'B')), (COUNTS, os.path.join(fe, 'B')),
+                       (COUNTS, os.path.join(fe, 'B', 'GAME 0')), (COUNTS, os.path.join(fe, 'A', 'GAME 0'))):
+        assert cache.get(kind, path) is not None, (kind, path)
+    assert cache.stats()['entries'] < entries
+
+    assert item(scanner.get_folder_contents(fe, collection='FE'), 'A')['file_count'] == 7
+    assert item(scanner.get_folder_contents(os.path.join(fe, 'A'), collection='FE'), 'GAME 1')['file_count'] == 3
+    assert item(scanner.get_folder_contents(fe, collection='FE'), 'B')['file_count'] == 6
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
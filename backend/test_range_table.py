@@ -0,0 +1,158 @@
+"""
+Corpus de pruebas de las tablas de rangos (range_table) con los casos de
+test_range_logic.py y test_springelr.py.
+
+Comprueba que la búsqueda con bisect da EXACTAMENTE lo mismo que el recorrido
+lineal original (incluido el desempate por prefijo común) y mide los dos.
+
+Uso: python test_range_table.py   (o con pytest)
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from range_table import RangeTable
+from scanner import DirectoryScanner
+
+F_FOLDERS = ["F-FERNA", "FERRO - FLIPI", "FLIPP - FP", "FRA - FROZE", "FRUIT - FY-FY"]
+N_FOLDERS = ["NA - NE", "NIGHTFL - NY"]
+S_FOLDERS = ["SA - SHADOWF", "SHADOWS - SPEKKT", "SPEKKU - STARCRYS", "STARD - SZ"]
+MIXED_CASE = ["a - c", "B - D", "E - k", "m-z"]  # fuerza el recorrido lineal
+
+# (carpetas, título, esperado). 'F-FERNA' y 'FRUIT - FY-FY' no son rangos para las regex
+# (límite de 3 caracteres sin espacios, guion dentro del límite): los resultados son los
+# del algoritmo lineal actual, no los "esperados" que imprime test_range_logic.py
+CASES = [
+    (F_FOLDERS, "Fruity March", "FRA - FROZE"),
+    (F_FOLDERS, "Frozen", "FRA - FROZE"),
+    (F_FOLDERS, "Fernandez Must Die", "FERRO - FLIPI"),
+    (F_FOLDERS, "Aaargh", "FERRO - FLIPI"),
+    (N_FOLDERS, "Nightfall", "NIGHTFL - NY"),
+    (N_FOLDERS, "Nebulus", "NA - NE"),
+    (S_FOLDERS, "Springelr", "SPEKKU - STARCRYS"),
+    (S_FOLDERS, "Zynaps", "STARD - SZ"),
+]
+
+
+def legacy_find_range(subfolders, title):
+    """Copia literal del _find_range_folder anterior (recorrido lineal) como referencia"""
+    scanner = DirectoryScanner({})
+    range_folders = [f for f in subfolders if scanner._is_range_folder(f)]
+    if not range_folders:
+        return None
+    title_upper = title.upper()
+    sorted_ranges = sorted(range_folders)
+    first_start, _ = scanner._parse_range_folder(sorted_ranges[0])
+    if title_upper < first_start:
+        return sorted_ranges[0]
+    for i in range(len(sorted_ranges)):
+        current_folder = sorted_ranges[i]
+        current_start, current_end = scanner._parse_range_folder(current_folder)
+        if i == len(sorted_ranges) - 1:
+            return current_folder
+        next_folder = sorted_ranges[i + 1]
+        next_start, _ = scanner._parse_range_folder(next_folder)
+        if title_upper >= current_start and title_upper < next_start:
+            if title_upper <= current_end:
+                return current_folder
+            lcp_prev = len(scanner._longest_common_prefix(title_upper, current_end))
+            lcp_next = len(scanner._longest_common_prefix(title_upper, next_start))
+            if lcp_next > lcp_prev:
+                return next_folder
+            else:
+                return current_folder
+    return sorted_ranges[-1]
+
+
+def sweep_titles(folders, count=300, seed=1):
+    """Títulos de prueba: límites de cada rango, sus vecinos y títulos aleatorios"""
+    random.seed(seed)
+    titles = []
+    for folder in folders:
+        for bound in DirectoryScanner({})._parse_range_folder(folder):
+            titles += [bound, bound + 'A', bound[:-1], bound[:-1] + 'Z', bound + ' 2']
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 '
+    for _ in range(count):
+        titles.append(random.choice('FNS') + ''.join(random.choice(alphabet) for _ in range(random.randint(0, 10))))
+    return titles
+
+
+def generated_folders(n=200, seed=2):
+    """Directorio grande de rangos consecutivos ('AAA - AAF', 'AAG - AAK', ...)"""
+    random.seed(seed)
+    words = sorted({''.join(random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(random.randint(2, 8)))
+                    for _ in range(n * 2)})
+    return [f"{words[i]} - {words[i + 1]}" for i in range(0, len(words) - 1, 2)]
+
+
+def test_named_cases():
+    for folders, title, expected in CASES:
+        assert RangeTable(folders).find(title) == expected, (title, expected)
+        assert legacy_find_range(folders, title) == expected, (title, expected)
+
+
+def test_matches_linear_scan():
+    for folders in (F_FOLDERS, N_FOLDERS, S_FOLDERS, MIXED_CASE, generated_folders()):
+        table = RangeTable(folders)
+        for title in sweep_titles(folders):
+            assert table.find(title) == legacy_find_range(folders, title), (folders[:3], title)
+    assert not RangeTable(MIXED_CASE).monotonic
+    assert RangeTable(["R-TYPE", "QUIVIRA - THE ADVENTURE"]).find("R-Type") is None
+
+
+def test_scanner_uses_tables():
+    """Los casos de test_range_logic.py y test_springelr.py sobre carpetas reales"""
+    base = tempfile.mkdtemp(prefix='zx_ranges_')
+    try:
+        ts = os.path.join(base, 'TS')
+        config = {'TS_PATH': ts, 'FE_PATH': os.path.join(base, 'FE'), 'TS_TOSEC_SUBPATH': 'TOSEC_v41'}
+        layout = {
+            os.path.join(ts, 'TOSEC_v41', '02 CLASICOS', 'ALFABETO CLASICOS', 'F', 'TAPs'): F_FOLDERS,
+            os.path.join(ts, 'TOSEC_v41', '02 CLASICOS', 'ALFABETO CLASICOS', 'N', 'TAPs'): N_FOLDERS,
+            os.path.join(ts, 'TOSEC_v41', '00 CARPETAS', 'S'): S_FOLDERS,
+        }
+        for parent, folders in layout.items():
+            for folder in folders:
+                os.makedirs(os.path.join(parent, folder))
+        scanner = DirectoryScanner(config)
+        f_path, n_path, _ = layout
+        assert scanner._find_range_folder(f_path, "Fruity March") == "FRA - FROZE"
+        assert scanner._find_range_folder(n_path, "Nightfall") == "NIGHTFL - NY"
+        assert scanner._find_range_folder(f_path, "Frozen") == "FRA - FROZE"
+
+        filename = "Springelr (1988-2025)(Microbyte).tap"
+        suggestions = scanner._suggest_destination(scanner._parse_tosec_filename(filename), '.tap', filename)
+        carpetas = [p for p in suggestions['TS'] if '00 CARPETAS' in p][0]
+        assert 'SPEKKU - STARCRYS' in carpetas, carpetas
+
+        # Una carpeta de rango nueva cambia el mtime del padre: la tabla se recompila
+        os.makedirs(os.path.join(f_path, 'FZ - FZZ'))
+        assert scanner._find_range_folder(f_path, "Fzzap") == "FZ - FZZ"
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def benchmark(lookups=2000):
+    folders = generated_folders(400)
+    titles = sweep_titles(folders, count=lookups)[:lookups]
+    start = time.perf_counter()
+    for title in titles:
+        legacy_find_range(folders, title)
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    table = RangeTable(folders)
+    for title in titles:
+        table.find(title)
+    new = time.perf_counter() - start
+    print(f"{len(folders)} rangos, {len(titles)} búsquedas: lineal {legacy * 1000:.0f} ms, "
+          f"tabla+bisect {new * 1000:.1f} ms ({legacy / new:.0f}x)")
+
+
+if __name__ == "__main__":
+    for test in (test_named_cases, test_matches_linear_scan, test_scanner_uses_tables):
+        test()
+        print(f"✅ {test.__name__}")
+    benchmark()
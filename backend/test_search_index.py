@@ -0,0 +1,156 @@
+"""
+Pruebas del índice de trigramas de /api/search (search_index).
+
+- Tras renombrar, mover y borrar archivos y carpetas (update_paths) el índice coincide con
+  el disco y las búsquedas por el nombre antiguo ya no encuentran nada.
+- Los cambios externos que encuentra un refresh del catálogo se aplican sin reconstruir
+  (la generación no cambia, así que los cursores abiertos siguen valiendo).
+- Recorrer los resultados página a página con el cursor (after) da exactamente la lista
+  completa, sin duplicados ni huecos, también si el índice cambia entre páginas.
+
+Uso: python test_search_index.py   (o con pytest)
+"""
+
+import os
+import shutil
+
+import pytest
+
+from catalog import CollectionCatalog
+from scanner import DirectoryScanner
+from search_index import TrigramIndex
+
+
+def make_tree(base, letters='ABC', games=20, files=4):
+    fe = os.path.join(base, 'FE')
+    for letter in letters:
+        for g in range(games):
+            game = os.path.join(fe, letter, f"GAME {letter}{g}")
+            os.makedirs(game)
+            for f in range(files):
+                open(os.path.join(game, f"Game {letter}{g} (198{f})(Soft).tap"), 'w').close()
+    return fe
+
+
+def make_index(fe):
+    scanner = DirectoryScanner({})
+    index = TrigramIndex(None, scanner._parse_tosec_filename, DirectoryScanner.FILE_TYPES)
+    index.build({'FE': fe})
+    return scanner, index
+
+
+def on_disk(root):
+    return sorted(os.path.join(folder, name) for folder, _, files in os.walk(root) for name in files)
+
+
+def indexed(index):
+    return sorted(path for _, _, path, _ in index.iter_matches(''))
+
+
+def test_rename_and_delete_keep_index_consistent(tmp_path):
+    fe = make_tree(tmp_path)
+    _, index = make_index(fe)
+    assert indexed(index) == on_disk(fe)
+    assert index.search('game b7 ')[0] == 4
+
+    # Archivo renombrado, carpeta movida a otra letra, archivo y carpeta borrados
+    old_file = os.path.join(fe, 'A', 'GAME A1', 'Game A1 (1980)(Soft).tap')
+    new_file = os.path.join(fe, 'A', 'GAME A1', 'Zorro (1980)(Soft).tap')
+    os.rename(old_file, new_file)
+    old_folder, new_folder = os.path.join(fe, 'B', 'GAME B7'), os.path.join(fe, 'C', 'MOVED B7')
+    os.rename(old_folder, new_folder)
+    deleted_file = os.path.join(fe, 'C', 'GAME C3', 'Game C3 (1982)(Soft).tap')
+    os.remove(deleted_file)
+    deleted_folder = os.path.join(fe, 'A', 'GAME A5')
+    shutil.rmtree(deleted_folder)
+    index.update_paths([old_file, new_file, old_folder, new_folder, deleted_file, deleted_folder])
+
+    assert indexed(index) == on_disk(fe)
+    assert index.search('zorro')[0] == 1
+    assert index.search('game a1 (1980)')[0] == 0
+    assert index.search('game a5 ')[0] == 0
+    assert index.search('game c3 (1982)')[0] == 0
+    # Los archivos de la carpeta movida conservan el nombre pero cambian de ruta
+    total, matches, _ = index.search('game b7 ')
+    assert total == 4 and all(path.startswith(new_folder + os.sep) for _, path, _ in matches)
+
+
+def test_catalog_refresh_updates_index(tmp_path, touch_folders):
+    fe = make_tree(tmp_path)
+    scanner, index = make_index(fe)
+    catalog = CollectionCatalog(os.path.join(tmp_path, 'catalog.db'), scanner._parse_tosec_filename,
+                                DirectoryScanner.VALID_EXTENSIONS)
+    catalog.rebuild('FE', fe)
+    generation = index.generation
+
+    # Cambios externos (sin pasar por la aplicación) que solo ve el refresh del catálogo
+    os.rename(os.path.join(fe, 'A', 'GAME A2'), os.path.join(fe, 'B', 'RENAMED A2'))
+    shutil.rmtree(os.path.join(fe, 'C', 'GAME C4'))
+    os.remove(os.path.join(fe, 'B', 'GAME B1', 'Game B1 (1983)(Soft).tap'))
+    open(os.path.join(fe, 'C', 'GAME C9', 'Extra (1991)(Other).tap'), 'w').close()
+    touch_folders(*(os.path.join(fe, *parts) for parts in (('A',), ('B',), ('C',), ('B', 'GAME B1'), ('C', 'GAME C9'))))
+    result = catalog.refresh('FE', fe)
+    assert result['changed_paths'] and result['changed_folders']
+    index.update_paths(result['changed_paths'])
+    index.sync_folders(result['changed_folders'])
+
+    assert indexed(index) == on_disk(fe)
+    assert index.generation == generation
+    assert index.search('extra')[0] == 1
+    assert index.search('game c4 ')[0] == 0
+
+    # Sin cambios: el refresh no informa de nada y el índice sigue igual
+    result = catalog.refresh('FE', fe)
+    assert (result['changed_paths'], result['changed_folders']) == ([], [])
+
+
+def all_pages(index, query='', limit=7, filters=None, between_pages=None):
+    """Rutas de todas las páginas siguiendo el cursor y los totales que dio cada página"""
+    paths, totals, after = [], [], -1
+    while True:
+        total, matches, next_after = index.search(query, limit=limit, filters=filters, after=after)
+        totals.append(total)
+        paths += [path for _, path, _ in matches]
+        if next_after is None:
+            return paths, totals
+        assert len(matches) == limit
+        after = next_after
+        if between_pages is not None:
+            between_pages(len(totals))
+
+
+def test_cursor_pages_have_no_gaps_or_duplicates(tmp_path):
+    fe = make_tree(tmp_path)
+    _, index = make_index(fe)
+    for query, filters in (('', None), ('game', None), ('game b', None), ('', {'year_from': 1982, 'year_to': 1983}),
+                           ('1983', None), ('zzz', None)):
+        expected = [path for _, _, path, _ in index.iter_matches(query, filters=filters)]
+        paths, totals = all_pages(index, query, filters=filters)
+        assert paths == expected, (query, filters)
+        assert len(set(paths)) == len(paths)
+        assert set(totals) == {len(expected)}, (query, totals)
+
+
+def test_cursor_pages_across_index_changes(tmp_path):
+    fe = make_tree(tmp_path)
+    _, index = make_index(fe)
+    before = [path for _, _, path, _ in index.iter_matches('game')]
+    removed = before[-5]
+    added = os.path.join(fe, 'A', 'GAME A0', 'Game Late (1990)(Soft).tap')
+
+    def change(page):
+        # Tras la tercera página: se borra un archivo aún no visto y se añade otro
+        if page == 3:
+            os.remove(removed)
+            open(added, 'w').close()
+            index.update_paths([removed, added])
+
+    paths, totals = all_pages(index, 'game', between_pages=change)
+    assert len(set(paths)) == len(paths)
+    assert paths == [p for p in before if p != removed] + [added]
+    assert totals[0] == len(before) and totals[-1] == len(before)
+    assert index.search('game')[0] == len(before)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
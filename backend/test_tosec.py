@@ -0,0 +1,113 @@
+"""
+Pruebas del parser de nombres TOSEC (tosec.py).
+
+- Gramática de flags de volcado: [!], [a2], [cr Grupo], [t +2], [tr es], [h Team] y los
+  corchetes que no son flags ([re-release]) van a 'more_info'.
+- Campos entre paréntesis clasificados por contenido: (Side A), (ES), (es), (48K), (PD),
+  (beta) y (demo-playable) en el título.
+- parse_tosec_dict() coincide con el registro y devuelve un diccionario nuevo en cada
+  llamada: modificarlo (también su lista 'years') no cambia las siguientes.
+
+Uso: python test_tosec.py   (o con pytest)
+"""
+
+import pytest
+
+from tosec import DumpFlag, parse_tosec, parse_tosec_dict
+
+
+@pytest.mark.parametrize('suffix, flags', [
+    ('[!]', [DumpFlag('!', 0, '')]),
+    ('[a]', [DumpFlag('a', 0, '')]),
+    ('[a2]', [DumpFlag('a', 2, '')]),
+    ('[cr Grupo]', [DumpFlag('cr', 0, 'Grupo')]),
+    ('[t +2]', [DumpFlag('t', 0, '+2')]),
+    ('[t2 +3 Hackers]', [DumpFlag('t', 2, '+3 Hackers')]),
+    ('[tr es]', [DumpFlag('tr', 0, 'es')]),
+    ('[cr Grupo][t +2][!]', [DumpFlag('cr', 0, 'Grupo'), DumpFlag('t', 0, '+2'), DumpFlag('!', 0, '')]),
+])
+def test_dump_flags(suffix, flags):
+    name = parse_tosec(f"Elite (1985)(Firebird){suffix}.tzx")
+    assert list(name.flags) == flags
+    assert name.more_info == ()
+    assert parse_tosec_dict(f"Elite (1985)(Firebird){suffix}.tzx")['flags'] == tuple(map(str, flags))
+
+
+def test_flag_meaning_and_lookup():
+    name = parse_tosec("Manic Miner (1983)(Bug-Byte)[cr Grupo][t +2][!].tap")
+    assert [f.meaning for f in name.flags] == ['cracked', 'trained', 'verified']
+    assert name.verified and name.has_flag('cr') and not name.has_flag('a')
+    assert [str(f) for f in name.flags] == ['cr Grupo', 't +2', '!']
+    assert not parse_tosec("Manic Miner (1983)(Bug-Byte)[a2].tap").verified
+
+
+def test_non_flag_brackets_go_to_more_info():
+    name = parse_tosec("Manic Miner (1983)(Bug-Byte)[re-release][a2][Prueba de grabación].tap")
+    assert name.flags == (DumpFlag('a', 2, ''),)
+    assert name.more_info == ('re-release', 'Prueba de grabación')
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ('(Side A)', {'media': ('Side A',)}),
+    ('(Tape 1 of 2)(Side B)', {'media': ('Tape 1 of 2', 'Side B')}),
+    ('(ES)', {'country': 'ES'}),
+    ('(es)', {'language': 'es'}),
+    ('(48K)(ES)(en-es)', {'system': '48K', 'country': 'ES', 'language': 'en-es'}),
+    ('(PD)(beta)(PAL)', {'copyright': 'PD', 'development': 'beta', 'video': 'PAL'}),
+    # El primero de cada tipo gana; lo que no se reconoce va a 'info'
+    ('(ES)(FR)(Release 2)', {'country': 'ES', 'info': ('FR', 'Release 2')}),
+])
+def test_paren_fields(fields, expected):
+    info = parse_tosec_dict(f"Head over Heels (1987)(Ocean){fields}[a].tap")
+    extras = {k: v for k, v in info.items() if k not in ('title', 'year', 'year_int', 'years', 'publisher',
+                                                          'category', 'is_tosec', 'flags')}
+    assert extras == expected
+    assert info['flags'] == ('a',)
+
+
+def test_demo_in_title():
+    name = parse_tosec("Knight Lore (demo-playable) (1984)(Ultimate)(Side A)[!].z80")
+    assert name.demo == 'demo-playable'
+    assert name.title == 'Knight Lore (demo-playable)'
+    assert (name.year_int, name.publisher, name.category) == (1984, 'Ultimate', 'classic')
+    assert name.media == ('Side A',) and name.verified
+    assert parse_tosec("Knight Lore (1984)(Ultimate).z80").demo is None
+
+
+def test_basic_fields_and_non_tosec_names():
+    name = parse_tosec("Dizzy (1988-2025)(Codemasters)(ES)[a2].tap")
+    assert (name.title, name.year, name.years, name.category) == ('Dizzy', '1988-2025', (1988, 2025), 'both')
+    assert parse_tosec("Dizzy (19xx)(-).tap")[1:7] == ('19xx', 0, (), '-', 'unknown', True)
+    info = parse_tosec_dict("notas.txt")
+    assert info == {'title': 'notas', 'year': 'unknown', 'year_int': 0, 'years': [], 'publisher': 'unknown',
+                    'category': 'unknown', 'is_tosec': False}
+
+
+@pytest.mark.parametrize('filename', [
+    "Elite (1985)(Firebird)(ES)[cr Grupo][t +2].tzx",
+    "Elite (1985)(Firebird)(ES)[cr Grupo][t +2].tap",
+    "Knight Lore (demo-playable) (1984)(Ultimate)(48K)(PD)(beta)(Side A)(Extra)[h Team][re-release].z80",
+    "Knight Lore (1984)(Ultimate)",
+    "sin fecha.tap",
+])
+def test_dict_matches_record(filename):
+    assert list(parse_tosec_dict(filename).items()) == list(parse_tosec(filename).to_dict().items())
+
+
+def test_dict_is_fresh_on_every_call():
+    filename = "Elite (1985)(Firebird)(ES)[cr Grupo][t +2].tzx"
+    first = parse_tosec_dict(filename)
+    expected = dict(first, years=list(first['years']))
+    first['years'].append(2020)
+    first['title'] = 'Otro'
+    first['flags'] += ('!',)
+    first['media'] = ['Side A']
+    assert parse_tosec_dict(filename) == expected
+    assert parse_tosec_dict(filename) is not parse_tosec_dict(filename)
+    # Otro nombre con los mismos campos extra (otra extensión) tampoco ve los cambios
+    assert parse_tosec_dict("Elite (1985)(Firebird)(ES)[cr Grupo][t +2].tap")['flags'] == ('cr Grupo', 't +2')
+    assert parse_tosec(filename).to_dict() == expected
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
@@ -0,0 +1,216 @@
+"""
+Pruebas de la copia de árboles en paralelo (tree_copy.py) sobre árboles temporales.
+
+- Esqueleto: se crean todas las carpetas (también las vacías) con sus metadatos; sobre un
+  destino que ya existe en parte solo cuentan como creadas las carpetas nuevas y las
+  existentes conservan sus metadatos.
+- Orden por tamaño: con un hilo, primero los grandes (de mayor a menor) y luego los
+  pequeños; con varios, nunca más de 'large_workers' grandes a la vez mientras quedan
+  pequeños.
+- Cancelación: al cancelar el trabajo los hilos dejan de tomar archivos.
+- snapshot(): totales, copiados, omitidos en incremental, fallos y porcentaje, y el
+  trabajo asociado recibe fase y avance.
+
+Uso: python test_tree_copy.py   (o con pytest)
+"""
+
+import os
+import threading
+
+import pytest
+
+from copy_engine import CopyEngine
+from jobs import Job
+from tree_copy import TreeCopier, TreeCopyProgress
+
+
+class RecordingEngine(CopyEngine):
+    """Motor de copia real que anota el orden de los archivos y puede esperar o fallar en algunos"""
+
+    def __init__(self, on_copy=None):
+        super().__init__()
+        self.on_copy = on_copy
+        self.order = []
+        self._order_lock = threading.Lock()
+
+    def copy(self, src, dest):
+        with self._order_lock:
+            self.order.append(os.path.basename(src))
+        if self.on_copy is not None:
+            self.on_copy(src)
+        return super().copy(src, dest)
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as out:
+        out.write(os.urandom(size))
+
+
+def make_tree(base):
+    """Árbol de origen: 3 letras con juegos, una carpeta vacía y archivos de tamaños distintos"""
+    source = os.path.join(base, 'SRC')
+    for letter in 'ABC':
+        for g in range(2):
+            for f in range(2):
+                write(os.path.join(source, letter, f"GAME {g}", f"Game {g} (1985)(Soft)[a{f}].tap"), 100 + f)
+    os.makedirs(os.path.join(source, 'VACIA'))
+    write(os.path.join(source, 'Leeme.txt'), 10)
+    return source
+
+
+def tree(root):
+    """Carpetas y (archivo, contenido) bajo 'root', con rutas relativas"""
+    dirs, files = [], {}
+    for path, subdirs, names in os.walk(root):
+        rel = os.path.relpath(path, root)
+        dirs.extend(os.path.normpath(os.path.join(rel, d)) for d in subdirs)
+        for name in names:
+            with open(os.path.join(path, name), 'rb') as f:
+                files[os.path.normpath(os.path.join(rel, name))] = f.read()
+    return sorted(dirs), files
+
+
+def test_skeleton_created_and_counted(tmp_path):
+    source = make_tree(tmp_path)
+    os.utime(os.path.join(source, 'A', 'GAME 0'), (1000000000, 1000000000))
+    dest = os.path.join(tmp_path, 'DEST')
+    progress = TreeCopier(CopyEngine(), workers=4).copy(source, dest)
+
+    assert tree(dest) == tree(source)
+    assert os.path.isdir(os.path.join(dest, 'VACIA'))
+    assert os.stat(os.path.join(dest, 'A', 'GAME 0')).st_mtime == 1000000000
+    snap = progress.snapshot()
+    assert (snap['dirs_total'], snap['dirs_created']) == (10, 10)
+
+
+def test_skeleton_over_existing_dest_counts_only_new(tmp_path):
+    source = make_tree(tmp_path)
+    dest = os.path.join(tmp_path, 'DEST')
+    for rel in ('A', os.path.join('A', 'GAME 0'), 'B'):
+        os.makedirs(os.path.join(dest, rel))
+    os.utime(os.path.join(dest, 'B'), (1000000000, 1000000000))
+
+    progress = TreeCopier(CopyEngine(), workers=2).copy(source, dest)
+    assert tree(dest) == tree(source)
+    snap = progress.snapshot()
+    assert (snap['dirs_total'], snap['dirs_created']) == (10, 7)
+    # Las carpetas que ya existían no reciben los metadatos del origen
+    assert os.stat(os.path.join(dest, 'B')).st_mtime != os.stat(os.path.join(source, 'B')).st_mtime
+
+    # Segunda pasada sobre el destino completo: no se crea ninguna carpeta
+    again = TreeCopier(CopyEngine(), workers=2).copy(source, dest, incremental='mtime')
+    assert again.snapshot()['dirs_created'] == 0
+
+
+def test_single_worker_takes_large_first_then_small(tmp_path):
+    source = os.path.join(tmp_path, 'SRC')
+    for name, size in (('s1', 10), ('L2', 3000), ('s3', 30), ('L1', 5000), ('s2', 20), ('L3', 2000)):
+        write(os.path.join(source, name), size)
+    engine = RecordingEngine()
+    TreeCopier(engine, workers=1, large_file=1000).copy(source, os.path.join(tmp_path, 'DEST'))
+    assert engine.order == ['L1', 'L2', 'L3', 's1', 's2', 's3']
+
+
+def test_large_workers_limit_while_small_remain(tmp_path):
+    source = os.path.join(tmp_path, 'SRC')
+    for i in range(3):
+        write(os.path.join(source, 'BIG', f"big{i}.img"), 2000 + i)
+    for i in range(30):
+        write(os.path.join(source, 'TAP', f"small{i:02}.tap"), 10)
+
+    small_done = threading.Event()
+    lock = threading.Lock()
+    state = {'small': 0, 'large': 0, 'large_at_half': None}
+
+    def on_copy(src):
+        with lock:
+            if src.endswith('.img'):
+                state['large'] += 1
+            else:
+                state['small'] += 1
+                if state['small'] == 15:
+                    # Quedan 15 pequeños por tomar: solo puede haber empezado un grande
+                    state['large_at_half'] = state['large']
+                if state['small'] == 30:
+                    small_done.set()
+        if src.endswith('.img'):
+            small_done.wait(5)  # Un grande "lento": ocupa su hilo hasta que acaban los pequeños
+
+    engine = RecordingEngine(on_copy)
+    progress = TreeCopier(engine, workers=4, large_workers=1, large_file=1000).copy(
+        source, os.path.join(tmp_path, 'DEST'))
+    assert progress.snapshot()['files_copied'] == 33
+    assert state['large_at_half'] <= 1
+    # El primero en empezar es el más grande
+    assert [n for n in engine.order if n.endswith('.img')][0] == 'big2.img'
+
+
+def test_cancel_stops_taking_files(tmp_path):
+    source = os.path.join(tmp_path, 'SRC')
+    for i in range(10):
+        write(os.path.join(source, f"game{i}.tap"), 100 + i)
+    job = Job('1', 'copy-folder')
+    engine = RecordingEngine(lambda src: len(engine.order) == 3 and job.cancel())
+    progress = TreeCopyProgress(source, os.path.join(tmp_path, 'DEST'), job)
+    TreeCopier(engine, workers=1).copy(source, progress.dest, progress=progress)
+
+    snap = progress.snapshot()
+    assert snap['cancelled'] and snap['phase'] == 'done' and not snap['running']
+    assert (snap['files_total'], snap['files_done'], snap['files_copied']) == (10, 3, 3)
+    # El archivo en curso al cancelar termina completo
+    assert sorted(os.listdir(progress.dest)) == ['game0.tap', 'game1.tap', 'game2.tap']
+    assert os.path.getsize(os.path.join(progress.dest, 'game2.tap')) == 102
+
+
+def test_cancel_before_copying(tmp_path):
+    source = make_tree(tmp_path)
+    job = Job('1', 'copy-folder')
+    job.cancel()
+    engine = RecordingEngine()
+    progress = TreeCopier(engine, workers=4).copy(source, os.path.join(tmp_path, 'DEST'),
+                                                  progress=TreeCopyProgress(source, '', job))
+    assert engine.order == []
+    assert progress.snapshot()['files_done'] == 0
+
+
+def test_progress_snapshot(tmp_path):
+    source = make_tree(tmp_path)
+    dest = os.path.join(tmp_path, 'DEST')
+    total = 12 * 100 + 6 + 10  # 12 TAP de 100 o 101 bytes y el Leeme.txt
+
+    job = Job('1', 'copy-folder')
+    progress = TreeCopier(CopyEngine(), workers=4).copy(source, dest, progress=TreeCopyProgress(source, dest, job))
+    snap = progress.snapshot()
+    assert (snap['source'], snap['dest'], snap['phase'], snap['running']) == (source, dest, 'done', False)
+    assert (snap['files_total'], snap['files_done'], snap['files_copied'], snap['files_skipped']) == (13, 13, 13, 0)
+    assert (snap['bytes_total'], snap['bytes_done'], snap['bytes_copied']) == (total, total, total)
+    assert (snap['percent'], snap['eta'], snap['errors']) == (100.0, None, [])
+    assert snap['current'] in tree(source)[1]
+    job_snap = job.snapshot()
+    assert (job_snap['phase'], job_snap['files_total'], job_snap['files_done']) == ('done', 13, 13)
+    assert (job_snap['bytes_total'], job_snap['bytes_done']) == (total, total)
+
+    # Incremental sobre el mismo destino: todo omitido, nada copiado
+    again = TreeCopier(CopyEngine(), workers=4).copy(source, dest, incremental='mtime').snapshot()
+    assert (again['files_copied'], again['files_skipped'], again['bytes_saved'], again['bytes_copied']) == \
+        (0, 13, total, 0)
+    assert again['percent'] == 100.0 and again['rate'] == 0
+
+
+def test_progress_reports_failed_files(tmp_path):
+    source = make_tree(tmp_path)
+
+    def fail_leeme(src):
+        if src.endswith('Leeme.txt'):
+            raise PermissionError('Permiso denegado')
+
+    progress = TreeCopier(RecordingEngine(fail_leeme), workers=2).copy(source, os.path.join(tmp_path, 'DEST'))
+    snap = progress.snapshot()
+    assert (snap['files_done'], snap['files_copied'], snap['files_failed']) == (13, 12, 1)
+    assert snap['errors'] == [{'file': 'Leeme.txt', 'error': 'Permiso denegado'}]
+    assert snap['bytes_done'] == snap['bytes_total'] and snap['bytes_copied'] == snap['bytes_total'] - 10
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
@@ -0,0 +1,141 @@
+"""
+Pruebas del vigilante de colecciones (watcher.py).
+
+- Sondeo: crear, borrar y renombrar carpetas de juego (y un archivo suelto) se aplica al
+  scanner tras un flush: listados y conteos coinciden con un escaneo nuevo del disco,
+  con y sin catálogo.
+- Si inotify falla ya en marcha (ENOSPC al añadir el watch de una carpeta nueva) el hilo
+  no muere: status() muestra el error, el vigilante sigue en marcha con sondeo y los
+  cambios se siguen aplicando.
+
+Uso: python test_watcher.py   (o con pytest)
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+import watcher as watcher_module
+from catalog import CollectionCatalog
+from listing_cache import ListingCache
+from scanner import DirectoryScanner
+from watcher import CollectionWatcher, _PollingBackend
+
+
+def make_tree(base, letters='AB', games=3, files=2):
+    fe = os.path.join(base, 'FE')
+    for letter in letters:
+        for g in range(games):
+            add_game(os.path.join(fe, letter, f"GAME {g}"), g, files)
+    config = {'FE_PATH': fe, 'TS_PATH': os.path.join(base, 'TS'), 'TS_TOSEC_SUBPATH': 'TOSEC_v41'}
+    return config, fe
+
+
+def add_game(game, g, files=2):
+    os.makedirs(game)
+    for f in range(files):
+        with open(os.path.join(game, f"Game {g} (1985)(Soft)[a{f}].tap"), 'w') as out:
+            out.write('x')
+
+
+def make_scanner(tmp_path, config, fe, with_catalog):
+    scanner = DirectoryScanner(config, cache=ListingCache())
+    if with_catalog:
+        catalog = CollectionCatalog(str(tmp_path / 'catalog.db'), scanner._parse_tosec_filename,
+                                    DirectoryScanner.VALID_EXTENSIONS)
+        catalog.rebuild('FE', fe)
+        scanner.catalog = catalog
+    return scanner
+
+
+def browse(scanner, fe):
+    """Listados de FE y de sus letras (nombre, tipo y número de archivos de cada entrada)"""
+    result = {}
+    for folder in [fe] + [os.path.join(fe, letter) for letter in sorted(os.listdir(fe))]:
+        listing = scanner.get_folder_contents(folder, collection='FE')
+        result[folder] = sorted((i['name'], i['type'], i.get('file_count')) for i in listing['items'])
+    return result
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.parametrize('with_catalog', [False, True], ids=['disco', 'catalogo'])
+def test_polling_applies_create_delete_rename(tmp_path, touch_folders, with_catalog):
+    config, fe = make_tree(tmp_path)
+    scanner = make_scanner(tmp_path, config, fe, with_catalog)
+    before = browse(scanner, fe)  # Listados y conteos en caché
+    assert [(n, c) for n, _, c in before[fe]] == [('A', 6), ('B', 6)]
+
+    watcher = CollectionWatcher(scanner, [fe], mode='poll', poll_interval=0, debounce=0)
+    backend = _PollingBackend(watcher)
+    backend.start(watcher.roots)
+
+    a, b = os.path.join(fe, 'A'), os.path.join(fe, 'B')
+    add_game(os.path.join(a, 'GAME 9'), 9, files=3)          # carpeta nueva
+    for name in os.listdir(os.path.join(b, 'GAME 0')):        # carpeta borrada
+        os.remove(os.path.join(b, 'GAME 0', name))
+    os.rmdir(os.path.join(b, 'GAME 0'))
+    os.rename(os.path.join(b, 'GAME 1'), os.path.join(b, 'GAME 1 (v2)'))  # carpeta renombrada
+    with open(os.path.join(b, 'GAME 2', 'Game 2 (1985)(Soft)[!].tap'), 'w') as out:
+        out.write('x')                                        # archivo nuevo dos niveles por debajo
+    touch_folders(a, b, os.path.join(b, 'GAME 2'))
+
+    assert backend.poll(timeout=0)
+    assert watcher.events == 3
+    watcher._flush(force=True)
+    assert watcher.flushes == 1
+
+    after = browse(scanner, fe)
+    assert after == browse(DirectoryScanner(config), fe)  # escaneo nuevo del disco, sin caché
+    assert [(n, c) for n, _, c in after[fe]] == [('A', 9), ('B', 5)]
+    assert [(n, c) for n, _, c in after[b]] == [('GAME 1 (v2)', 2), ('GAME 2', 3)]
+    assert ('GAME 9', 'folder', 3) in after[a]
+
+    # Sin cambios nuevos la siguiente pasada no anota nada
+    assert not backend.poll(timeout=0)
+    assert watcher.events == 3
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify solo existe en Linux')
+def test_inotify_failure_falls_back_to_polling(tmp_path, monkeypatch):
+    config, fe = make_tree(tmp_path)
+    scanner = make_scanner(tmp_path, config, fe, False)
+    browse(scanner, fe)
+    watcher = CollectionWatcher(scanner, [fe], mode='inotify', poll_interval=0.1, debounce=0.05)
+    watcher.start()
+    try:
+        assert wait_for(lambda: watcher.backend is not None and watcher.backend.name == 'inotify')
+
+        # Se agota fs.inotify.max_user_watches al vigilar la carpeta nueva
+        def no_watches(self, path):
+            raise OSError(28, 'Límite de inotify alcanzado (fs.inotify.max_user_watches)')
+        monkeypatch.setattr(watcher_module._InotifyBackend, '_add_watch', no_watches)
+        add_game(os.path.join(fe, 'A', 'GAME 9'), 9, files=3)
+
+        assert wait_for(lambda: watcher.status()['backend'] == 'polling')
+        status = watcher.status()
+        assert status['running'] and 'max_user_watches' in status['error']
+        assert status['watched_dirs'] == len(list(watcher_module._walk_dirs(fe)))
+        # La re-sincronización de las raíces recoge el cambio que disparó el fallo...
+        assert wait_for(lambda: ('A', 'folder', 9) in browse(scanner, fe)[fe])
+
+        # ...y el sondeo aplica los siguientes
+        os.rename(os.path.join(fe, 'B', 'GAME 1'), os.path.join(fe, 'B', 'GAME 1 (v2)'))
+        assert wait_for(lambda: ('GAME 1 (v2)', 'folder', 2) in browse(scanner, fe)[os.path.join(fe, 'B')])
+        assert watcher.status()['running']
+    finally:
+        watcher.stop()
+    assert not watcher.status()['running']
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, '-v']))
@@ -0,0 +1,298 @@
+"""
+Parser de nombres de archivo TOSEC precompilado y memoizado.
+
+    Título (demo) (Fecha)(Editor)(Sistema)(Vídeo)(País)(Idioma)(Copyright)(Desarrollo)(Medio)(Etiqueta)[flags][más info].ext
+
+Título, fecha, editor y categoría se obtienen exactamente igual que el parser original
+de DirectoryScanner (de ellos dependen las carpetas destino). El resto de campos entre
+paréntesis se clasifican por su contenido y los flags de volcado entre corchetes
+([!], [a2], [cr Grupo], [t +2], [tr es], [h], [b]...) se devuelven estructurados.
+
+parse_tosec() está memoizado con lru_cache (seguro entre hilos: lo llaman los hilos del
+walker al construir catálogo e índice) y devuelve un registro inmutable (TosecName);
+parse_many() parsea lotes de decenas de miles de nombres por llamada.
+
+parse_tosec_dict() da la forma de diccionario que usan escáner, catálogo e índice (acaba en
+las respuestas JSON como 'tosec_info'). Devuelve un diccionario nuevo en cada llamada: solo
+se memoizan los campos que siguen a (Fecha)(Editor), que se repiten mucho entre nombres
+(sin la extensión: '(Side A)[a2]' es el mismo texto en el .tap y en el .tzx).
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+CACHE_SIZE = 65536
+
+# 'fields': lo que sigue a (Fecha)(Editor) hasta el último ')' o ']' (sin la extensión)
+TOSEC_RE = re.compile(r'^(?P<title>.*?)\s*\((?P<year>\d{4}(?:-\d{4})?|19xx|20xx)\)\((?P<publisher>.*?)\)'
+                      r'(?P<fields>.*[)\]])?')
+FIELD_RE = re.compile(r'\(([^)]*)\)|\[([^\]]*)\]')
+DEMO_RE = re.compile(r'\((demo(?:-[a-z]+)?)\)$')
+# Flags de volcado: código, número opcional (a2, t2...) y detalle opcional ("cr Grupo", "t +2", "tr es")
+DUMP_FLAG_RE = re.compile(r'^(cr|tr|[abfhmoptuv])(\d*)(?:\s+(.+))?$')
+COUNTRY_RE = re.compile(r'^[A-Z]{2}(?:-[A-Z]{2})*$')
+LANGUAGE_RE = re.compile(r'^(?:[a-z]{2}(?:-[a-z]{2})*|M\d)$')
+MEDIA_RE = re.compile(r'^(?:Disc|Disk|File|Part|Side|Tape)\b')
+
+VIDEO = frozenset({'PAL', 'NTSC', 'PAL-NTSC', 'PAL-60', 'SECAM', 'CGA', 'EGA', 'MCGA', 'VGA', 'SVGA', 'XGA', 'MDA', 'HGC'})
+COPYRIGHT = frozenset({'CW', 'CW-R', 'FW', 'GW', 'GW-R', 'LW', 'PD', 'SW', 'SW-R'})
+DEVELOPMENT = frozenset({'alpha', 'beta', 'preview', 'pre-release', 'proto'})
+SYSTEMS = frozenset({'16K', '48K', '48K-128K', '128K', '+2', '+2A', '+2a', '+3', 'Pentagon', 'Pentagon 128',
+                     'Scorpion', 'TC2048', 'TC2068', 'TS2068', 'TS 2068', 'Timex', 'Next', 'ZX81'})
+
+DUMP_FLAGS = {
+    '!': 'verified', 'a': 'alternate', 'b': 'bad', 'cr': 'cracked', 'f': 'fixed', 'h': 'hacked',
+    'm': 'modified', 'o': 'overdump', 'p': 'pirate', 't': 'trained', 'tr': 'translated',
+    'u': 'underdump', 'v': 'virus'
+}
+
+
+class DumpFlag(NamedTuple):
+    code: str        # 'a', 'cr', 't', '!'...
+    number: int      # [a2] -> 2, [a] -> 0
+    detail: str      # [t +2] -> '+2', [cr Grupo] -> 'Grupo'
+
+    @property
+    def meaning(self) -> str:
+        return DUMP_FLAGS.get(self.code, self.code)
+
+    def __str__(self) -> str:
+        text = self.code + (str(self.number) if self.number else '')
+        return f"{text} {self.detail}" if self.detail else text
+
+
+class TosecName(NamedTuple):
+    """Registro compacto e inmutable de un nombre TOSEC (compartido por la caché: no modificar)"""
+    title: str
+    year: str
+    year_int: int
+    years: Tuple[int, ...]
+    publisher: str
+    category: str
+    is_tosec: bool
+    demo: Optional[str] = None
+    system: Optional[str] = None
+    video: Optional[str] = None
+    country: Optional[str] = None
+    language: Optional[str] = None
+    copyright: Optional[str] = None
+    development: Optional[str] = None
+    media: Tuple[str, ...] = ()
+    info: Tuple[str, ...] = ()          # paréntesis sin clasificar
+    flags: Tuple[DumpFlag, ...] = ()
+    more_info: Tuple[str, ...] = ()     # corchetes que no son flags estándar
+
+    @property
+    def verified(self) -> bool:
+        return any(f.code == '!' for f in self.flags)
+
+    def has_flag(self, code: str) -> bool:
+        return any(f.code == code for f in self.flags)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Diccionario nuevo con las claves de siempre y, solo si aparecen, los campos extra"""
+        info = {
+            'title': self.title,
+            'year': self.year,
+            'year_int': self.year_int,
+            'years': list(self.years),
+            'publisher': self.publisher,
+            'category': self.category,
+            'is_tosec': self.is_tosec
+        }
+        extras = self[7:]
+        if extras != _NO_EXTRAS:
+            info.update(_json_fields(_EXTRA_FIELDS, extras))
+        return info
+
+
+_EXTRA_FIELDS = TosecName._fields[7:]
+_NO_EXTRAS = TosecName('', '', 0, (), '', '', False)[7:]
+
+
+def _json_fields(fields: Tuple[str, ...], values: tuple) -> Dict[str, Any]:
+    """Campos no vacíos listos para JSON (valores inmutables: str y tuplas)"""
+    info = {field: value for field, value in zip(fields, values) if value}
+    flags = info.get('flags')
+    if flags:
+        info['flags'] = tuple(map(str, flags))
+    return info
+
+
+@lru_cache(maxsize=512)
+def _parse_year(year_str: str) -> Tuple[Tuple[int, ...], int, str]:
+    """(años, primer año, categoría) de '1985', '1988-2025' o '19xx'"""
+    if 'xx' in year_str:
+        return (), 0, 'unknown'
+    years = tuple(int(y) for y in year_str.split('-'))
+    has_classic = any(1982 <= y <= 1993 for y in years)
+    has_homebrew = any(1994 <= y <= 2025 for y in years)
+    if has_classic and has_homebrew:
+        category = 'both'
+    elif has_classic:
+        category = 'classic'
+    elif has_homebrew:
+        category = 'homebrew'
+    else:
+        category = 'unknown'
+    return years, years[0], category
+
+
+@lru_cache(maxsize=4096)
+def _classify_paren(value: str) -> str:
+    """Campo TOSEC al que corresponde el contenido de un paréntesis"""
+    if value in VIDEO:
+        return 'video'
+    if value.upper() in COPYRIGHT:
+        return 'copyright'
+    if value in DEVELOPMENT:
+        return 'development'
+    if MEDIA_RE.match(value):
+        return 'media'
+    if value in SYSTEMS:
+        return 'system'
+    if COUNTRY_RE.match(value):
+        return 'country'
+    if LANGUAGE_RE.match(value):
+        return 'language'
+    return 'info'
+
+
+@lru_cache(maxsize=4096)
+def _parse_bracket(text: str) -> Optional[DumpFlag]:
+    """Flag de volcado de un corchete (None si es 'más info')"""
+    if text == '!':
+        return DumpFlag('!', 0, '')
+    m = DUMP_FLAG_RE.match(text)
+    if m:
+        return DumpFlag(m.group(1), int(m.group(2) or 0), (m.group(3) or '').strip())
+    return None
+
+
+_SINGLE = ('system', 'video', 'country', 'language', 'copyright', 'development')
+_NO_FIELDS = (None,) * len(_SINGLE) + ((), (), (), ())
+
+
+def _split_fields(rest: str) -> Tuple[Dict[str, str], list, list, list, list]:
+    """
+    Campos opcionales tras (Fecha)(Editor): (únicos, media, info, flags, más info).
+    Los paréntesis se clasifican por contenido (el primero de cada tipo gana; los que no
+    encajan van a 'info') y los corchetes son flags de volcado o 'más info'.
+    """
+    single: Dict[str, str] = {}
+    media, info, flags, more_info = [], [], [], []
+    for paren, bracket in FIELD_RE.findall(rest):
+        if bracket:
+            bracket = bracket.strip()
+            flag = _parse_bracket(bracket)
+            if flag is not None:
+                flags.append(flag)
+            else:
+                more_info.append(bracket)
+            continue
+        value = paren.strip()
+        if not value:
+            continue
+        field = _classify_paren(value)
+        if field == 'media':
+            media.append(value)
+        elif field != 'info' and field not in single:
+            single[field] = value
+        else:
+            info.append(value)
+    return single, media, info, flags, more_info
+
+
+@lru_cache(maxsize=16384)
+def _parse_fields(rest: str) -> tuple:
+    """Campos opcionales tras (Fecha)(Editor), en el orden de TosecName desde 'system'"""
+    if '(' not in rest and '[' not in rest:
+        return _NO_FIELDS
+    single, media, info, flags, more_info = _split_fields(rest)
+    return tuple(map(single.get, _SINGLE)) + (tuple(media), tuple(info), tuple(flags), tuple(more_info))
+
+
+@lru_cache(maxsize=16384)
+def _fields_dict(rest: str) -> Dict[str, Any]:
+    """
+    Los mismos campos listos para JSON, solo los que aparecen (lo copia parse_tosec_dict:
+    no modificar). Se construye sin pasar por la tupla de _parse_fields.
+    """
+    single, media, info, flags, more_info = _split_fields(rest)
+    fields = {field: single[field] for field in _SINGLE if field in single} if single else {}
+    if media:
+        fields['media'] = tuple(media)
+    if info:
+        fields['info'] = tuple(info)
+    if flags:
+        fields['flags'] = tuple(map(str, flags))
+    if more_info:
+        fields['more_info'] = tuple(more_info)
+    return fields
+
+
+# Construir el registro desde la tupla completa se salta el __new__ con argumentos de NamedTuple
+_new_record = tuple.__new__
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_tosec(filename: str) -> TosecName:
+    """Parsea un nombre de archivo TOSEC (memoizado)"""
+    match = TOSEC_RE.match(filename)
+    if not match:
+        return TosecName(os.path.splitext(filename)[0], 'unknown', 0, (), 'unknown', 'unknown', False)
+
+    title, year_str, publisher, fields = match.groups()
+    title = title.strip()
+    years, year_int, category = _parse_year(year_str)
+    demo = DEMO_RE.search(title) if '(demo' in title else None
+    return _new_record(TosecName, (title, year_str, year_int, years, publisher.strip(), category, True,
+                                   demo.group(1) if demo else None) + _parse_fields(fields or ''))
+
+
+def parse_tosec_dict(filename: str) -> Dict[str, Any]:
+    """
+    Igual que parse_tosec(filename).to_dict(): un diccionario nuevo en cada llamada (se puede
+    modificar). Se construye desde el match sin pasar por el registro, que en frío (catálogo
+    e índice parsean cada nombre una vez) costaba más que el parser original.
+    """
+    match = TOSEC_RE.match(filename)
+    if not match:
+        return parse_tosec(filename).to_dict()
+
+    title, year_str, publisher, fields = match.groups()
+    title = title.strip()
+    years, year_int, category = _parse_year(year_str)
+    info = {
+        'title': title,
+        'year': year_str,
+        'year_int': year_int,
+        'years': list(years),
+        'publisher': publisher.strip(),
+        'category': category,
+        'is_tosec': True
+    }
+    demo = DEMO_RE.search(title) if '(demo' in title else None
+    if demo:
+        info['demo'] = demo.group(1)
+    if fields:
+        extras = _fields_dict(fields)
+        if extras:
+            info.update(extras)
+    return info
+
+
+def parse_many(filenames: Iterable[str]) -> List[TosecName]:
+    """Parsea un lote de nombres (decenas de miles por llamada); los repetidos salen de la caché"""
+    parse = parse_tosec
+    return [parse(name) for name in filenames]
+
+
+def cache_info() -> Dict[str, int]:
+    """Aciertos y tamaño de la caché de registros (parse_tosec) y de la de campos extra (parse_tosec_dict)"""
+    info = parse_tosec.cache_info()
+    fields = _fields_dict.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize,
+            'fields_hits': fields.hits, 'fields_misses': fields.misses, 'fields_size': fields.currsize}
@@ -0,0 +1,264 @@
+"""
+Copia de árboles de carpetas en paralelo (/api/copy-folder).
+
+1. Inventario: el origen se recorre con ParallelTreeWalker (listados en paralelo, con
+   tamaño de cada archivo) antes de copiar nada, así el progreso conoce desde el
+   principio cuántos archivos y bytes hay.
+2. Esqueleto: todas las carpetas destino se crean de una pasada, de arriba abajo, con un
+   os.mkdir por carpeta (el padre ya existe; os.makedirs por archivo repetiría los stat
+   de toda la ruta).
+3. Archivos: un pool acotado de hilos copia con el motor de copia (CopyEngine). Los
+   archivos se ordenan por tamaño: los hilos toman los pequeños de uno en uno y solo
+   'large_workers' hilos a la vez se dedican a las imágenes grandes (las más grandes
+   primero), así una imagen de disco de cientos de MB no deja parados a miles de TAPs.
+4. Metadatos de las carpetas creadas (copystat, como shutil.copytree), de abajo arriba.
+
+TreeCopyProgress lleva los contadores (archivos, bytes, velocidad) protegidos por un lock;
+snapshot() devuelve una copia coherente para el endpoint de estado que consulta el frontend.
+Con un jobs.Job asociado le pasa también fase, totales y avance, y si el trabajo se cancela
+los hilos dejan de tomar archivos (los que están en curso terminan).
+"""
+
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from copy_engine import CopyEngine
+from jobs import Job
+from tree_walker import ParallelTreeWalker
+
+# A partir de este tamaño un archivo cuenta como "grande" (imágenes de disco, no TAP/TZX/DSK)
+LARGE_FILE = 8 * 1024 * 1024
+# Errores que se guardan para la respuesta (el resto solo se cuentan)
+MAX_ERRORS = 20
+
+
+class TreeCopyProgress:
+    """Contadores de una copia de árbol, actualizados desde los hilos de copia"""
+
+    def __init__(self, source: str = '', dest: str = '', job: Optional[Job] = None):
+        self._lock = threading.Lock()
+        self.source = source
+        self.dest = dest
+        self.job = job
+        self.phase = 'pending'          # pending -> scanning -> folders -> copying -> done
+        self.dirs_total = 0
+        self.dirs_created = 0
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.files_copied = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.bytes_done = 0
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+        self.current = ''
+        self.errors: List[Tuple[str, str]] = []
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job is not None and self.job.cancelled
+
+    def set_phase(self, phase: str):
+        with self._lock:
+            self.phase = phase
+            if phase == 'done':
+                self.finished = time.time()
+        if self.job is not None:
+            self.job.set_phase(phase)
+
+    def set_totals(self, dirs: int, files: int, total_bytes: int):
+        with self._lock:
+            self.dirs_total, self.files_total, self.bytes_total = dirs, files, total_bytes
+        if self.job is not None:
+            self.job.set_totals(files, total_bytes)
+
+    def dir_created(self):
+        with self._lock:
+            self.dirs_created += 1
+
+    def file_done(self, rel_path: str, size: int, outcome: str, error: Optional[str] = None):
+        """outcome: 'copied', 'skipped' o 'failed'"""
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += size
+            self.current = rel_path
+            if outcome == 'copied':
+                self.files_copied += 1
+                self.bytes_copied += size
+            elif outcome == 'skipped':
+                self.files_skipped += 1
+                self.bytes_skipped += size
+            else:
+                self.files_failed += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append((rel_path, error or ''))
+        if self.job is not None:
+            self.job.advance(1, size, rel_path)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = (self.finished or time.time()) - self.started
+            rate = self.bytes_copied / elapsed if elapsed > 0 else 0.0
+            remaining = self.bytes_total - self.bytes_done
+            return {
+                'source': self.source,
+                'dest': self.dest,
+                'phase': self.phase,
+                'running': self.phase != 'done',
+                'cancelled': self.cancelled,
+                'dirs_total': self.dirs_total,
+                'dirs_created': self.dirs_created,
+                'files_total': self.files_total,
+                'files_done': self.files_done,
+                'files_copied': self.files_copied,
+                'files_skipped': self.files_skipped,
+                'files_failed': self.files_failed,
+                'bytes_total': self.bytes_total,
+                'bytes_done': self.bytes_done,
+                'bytes_copied': self.bytes_copied,
+                'bytes_saved': self.bytes_skipped,
+                'percent': round(100.0 * self.bytes_done / self.bytes_total, 1) if self.bytes_total else
+                           (100.0 if self.phase == 'done' else 0.0),
+                'rate': round(rate),
+                'eta': round(remaining / rate, 1) if rate > 0 and remaining > 0 else None,
+                'elapsed': round(elapsed, 2),
+                'current': self.current,
+                'errors': [{'file': f, 'error': e} for f, e in self.errors]
+            }
+
+
+class TreeCopier:
+    """Copia un árbol de carpetas: inventario, esqueleto de carpetas y archivos en paralelo"""
+
+    def __init__(self, engine: CopyEngine, workers: int = 4, walker: Optional[ParallelTreeWalker] = None,
+                 large_workers: Optional[int] = None, large_file: int = LARGE_FILE):
+        self.engine = engine
+        self.workers = max(1, int(workers))
+        self.walker = walker or ParallelTreeWalker(self.workers)
+        # Hilos que pueden estar a la vez con archivos grandes mientras queden pequeños
+        self.large_workers = max(1, large_workers if large_workers is not None else self.workers // 4)
+        self.large_file = large_file
+
+    def inventory(self, source: str) -> Tuple[List[str], List[Tuple[int, str]]]:
+        """(carpetas relativas, [(tamaño, archivo relativo)]) del árbol bajo 'source'"""
+        def process(path: str, entries: List[os.DirEntry]):
+            files = []
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        files.append((entry.stat().st_size, entry.path))
+                except OSError:
+                    files.append((0, entry.path))
+            return files
+
+        dirs = []
+        files = []
+        for path, folder_files in self.walker.walk(source, process, follow_symlinks=True):
+            rel = os.path.relpath(path, source)
+            if rel != '.':
+                dirs.append(rel)
+            files.extend((size, os.path.relpath(p, source)) for size, p in folder_files)
+        # Padres antes que hijos
+        dirs.sort(key=lambda d: (d.count(os.sep), d))
+        return dirs, files
+
+    def copy(self, source: str, dest: str, incremental: str = 'off',
+             progress: Optional[TreeCopyProgress] = None) -> TreeCopyProgress:
+        """Copia 'source' en 'dest' (que puede existir); devuelve el progreso final"""
+        progress = progress or TreeCopyProgress(source, dest)
+        progress.set_phase('scanning')
+        dirs, files = self.inventory(source)
+        progress.set_totals(len(dirs), len(files), sum(size for size, _ in files))
+
+        progress.set_phase('folders')
+        created = self._make_skeleton(dest, dirs, progress)
+
+        progress.set_phase('copying')
+        if not progress.cancelled:
+            self._copy_files(source, dest, files, incremental, progress)
+
+        # Metadatos de carpetas como shutil.copytree (de abajo arriba: crear archivos cambia el mtime del padre)
+        for rel in reversed(created):
+            try:
+                shutil.copystat(os.path.join(source, rel) if rel != '.' else source,
+                                os.path.join(dest, rel) if rel != '.' else dest)
+            except OSError:
+                pass
+        progress.set_phase('done')
+        return progress
+
+    def _make_skeleton(self, dest: str, dirs: List[str], progress: TreeCopyProgress) -> List[str]:
+        """Crea 'dest' y todas sus subcarpetas; devuelve las que no existían ('.' = la raíz)"""
+        created = []
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+            created.append('.')
+        for rel in dirs:
+            try:
+                os.mkdir(os.path.join(dest, rel))
+            except FileExistsError:
+                continue  # ya estaba (copia sobre un destino existente): no cuenta como creada
+            created.append(rel)
+            progress.dir_created()
+        return created
+
+    def _copy_files(self, source: str, dest: str, files: List[Tuple[int, str]], incremental: str,
+                    progress: TreeCopyProgress):
+        pending = deque(sorted(files))
+        lock = threading.Lock()
+        state = {'large_running': 0}
+
+        def take() -> Optional[Tuple[int, str, bool]]:
+            with lock:
+                if not pending or progress.cancelled:
+                    return None
+                # Quedan pequeños: solo 'large_workers' hilos con grandes a la vez (los más grandes primero)
+                if pending[-1][0] >= self.large_file and state['large_running'] < self.large_workers:
+                    state['large_running'] += 1
+                    return pending.pop() + (True,)
+                if pending[0][0] >= self.large_file:
+                    # Ya solo quedan grandes: sin límite
+                    state['large_running'] += 1
+                    return pending.pop() + (True,)
+                return pending.popleft() + (False,)
+
+        def worker():
+            while True:
+                item = take()
+                if item is None:
+                    return
+                size, rel, large = item
+                try:
+                    self._copy_file(os.path.join(source, rel), os.path.join(dest, rel), rel, size,
+                                    incremental, progress)
+                finally:
+                    if large:
+                        with lock:
+                            state['large_running'] -= 1
+
+        if self.workers == 1 or len(files) < 2:
+            worker()
+            return
+        threads = [threading.Thread(target=worker, name=f'tree-copy-{i}', daemon=True)
+                   for i in range(min(self.workers, len(files)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _copy_file(self, src: str, dst: str, rel: str, size: int, incremental: str, progress: TreeCopyProgress):
+        try:
+            if incremental != 'off' and self.engine.unchanged(src, dst, incremental):
+                progress.file_done(rel, size, 'skipped')
+                return
+            self.engine.copy(src, dst)
+            progress.file_done(rel, size, 'copied')
+        except Exception as e:
+            progress.file_done(rel, size, 'failed', str(e))
@@ -0,0 +1,194 @@
+"""
+Recorrido de árboles de carpetas en paralelo con robo de trabajo (work-stealing).
+
+En almacenamiento en red (NAS) los recorridos completos están limitados por la
+latencia de cada listado, no por la CPU: os.scandir libera el GIL, así que varios
+hilos listando carpetas a la vez solapan esas esperas.
+
+Los hilos del pool se crean una vez (en el primer recorrido en paralelo) y atienden
+todos los recorridos en curso, también varios a la vez (catálogo, índice de búsqueda,
+conteos...). Cada recorrido tiene una cola (deque) por hilo: el hilo saca trabajo de
+su extremo derecho (LIFO, recorrido en profundidad con buena localidad) y, cuando se
+queda sin trabajo, roba del extremo izquierdo de la cola de otro hilo (las carpetas más
+altas del árbol, que suelen ser las que más trabajo esconden). Los hilos sin trabajo
+esperan en una condición y se despiertan cuando alguien añade carpetas.
+
+Los resultados llegan en orden no determinista; quien consume los agrega de forma
+que el resultado final es idéntico al del recorrido en serie (workers=1).
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
+
+# process(ruta_carpeta, lista_de_DirEntry) -> valor por carpeta
+ProcessFunc = Callable[[str, List[os.DirEntry]], Any]
+# prune(ruta_subcarpeta) -> True para no entrar en ella
+PruneFunc = Callable[[str], bool]
+
+_DONE = object()
+
+
+def _list_dir(path: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except (PermissionError, OSError):
+        return []
+
+
+def _is_loop(entry: os.DirEntry) -> bool:
+    """True si 'entry' es un enlace a una carpeta que la contiene (seguirlo no terminaría nunca)"""
+    if not entry.is_symlink():
+        return False
+    target = os.path.realpath(entry.path)
+    parent = os.path.realpath(os.path.dirname(entry.path))
+    return parent == target or parent.startswith(target.rstrip(os.sep) + os.sep)
+
+
+def _default_process(path: str, entries: List[os.DirEntry]) -> List[os.DirEntry]:
+    return entries
+
+
+class _Walk:
+    """Estado de un recorrido en curso: colas por hilo, carpetas pendientes y resultados"""
+
+    def __init__(self, workers: int, roots: List[str], process: ProcessFunc, subdirs_of):
+        self.deques = [deque() for _ in range(workers)]
+        for i, root in enumerate(roots):
+            self.deques[i % workers].append(root)
+        self.pending = len(roots)
+        self.process = process
+        self.subdirs_of = subdirs_of
+        self.results: 'queue.Queue' = queue.Queue()
+        self.error: Optional[BaseException] = None
+        self.finished = False
+
+    def take(self, index: int) -> Optional[str]:
+        try:
+            return self.deques[index].pop()
+        except IndexError:
+            pass
+        # Robar del extremo opuesto de las colas de los demás
+        for offset in range(1, len(self.deques)):
+            try:
+                return self.deques[(index + offset) % len(self.deques)].popleft()
+            except IndexError:
+                continue
+        return None
+
+
+class ParallelTreeWalker:
+    """Recorre árboles de carpetas con un pool de hilos configurable (persistente y compartido)"""
+
+    def __init__(self, workers: int = 4):
+        self.workers = max(1, int(workers))
+        # Protege los recorridos en curso y sus colas; los hilos libres esperan en ella
+        self._cond = threading.Condition()
+        self._walks: List[_Walk] = []
+        self._threads: List[threading.Thread] = []
+
+    def walk(self, roots: Union[str, List[str]], process: Optional[ProcessFunc] = None,
+             prune: Optional[PruneFunc] = None, follow_symlinks: bool = False) -> Iterator[Tuple[str, Any]]:
+        """
+        Recorre todas las carpetas bajo 'roots' (incluidas) y devuelve (ruta, process(ruta, entradas))
+        por cada carpeta, según se van completando. 'process' y 'prune' se ejecutan en los hilos
+        del pool: deben ser seguros entre hilos y hacer allí el trabajo de E/S (p. ej. entry.stat()).
+        Por defecto no entra en enlaces simbólicos a carpetas (igual que os.walk).
+        """
+        if isinstance(roots, str):
+            roots = [roots]
+        process = process or _default_process
+
+        def subdirs_of(entries: List[os.DirEntry]) -> List[str]:
+            subdirs = [e.path for e in entries
+                       if e.is_dir(follow_symlinks=follow_symlinks) and not (follow_symlinks and _is_loop(e))]
+            if prune is not None:
+                subdirs = [d for d in subdirs if not prune(d)]
+            return subdirs
+
+        if self.workers == 1:
+            return self._walk_serial(roots, process, subdirs_of)
+        return self._walk_parallel(roots, process, subdirs_of)
+
+    def _walk_serial(self, roots: List[str], process: ProcessFunc, subdirs_of) -> Iterator[Tuple[str, Any]]:
+        stack = list(reversed(roots))
+        while stack:
+            path = stack.pop()
+            entries = _list_dir(path)
+            stack.extend(subdirs_of(entries))
+            yield path, process(path, entries)
+
+    def _walk_parallel(self, roots: List[str], process: ProcessFunc, subdirs_of) -> Iterator[Tuple[str, Any]]:
+        if not roots:
+            return
+        walk = _Walk(self.workers, roots, process, subdirs_of)
+        with self._cond:
+            if not self._threads:
+                self._threads = [threading.Thread(target=self._worker, args=(i,), name=f'tree-walker-{i}',
+                                                  daemon=True) for i in range(self.workers)]
+                for thread in self._threads:
+                    thread.start()
+            self._walks.append(walk)
+            self._cond.notify_all()
+        try:
+            while True:
+                item = walk.results.get()
+                if item is _DONE:
+                    break
+                yield item
+            if walk.error is not None:
+                raise walk.error
+        finally:
+            # También si quien consume abandona el generador a medias: las carpetas que queden no se listan
+            with self._cond:
+                self._finish(walk)
+
+    def _finish(self, walk: _Walk):
+        """Da por terminado un recorrido (con _cond tomado)"""
+        if walk.finished:
+            return
+        walk.finished = True
+        self._walks.remove(walk)
+        walk.results.put(_DONE)
+
+    def _next(self, index: int) -> Optional[Tuple[_Walk, str]]:
+        for walk in self._walks:
+            path = walk.take(index)
+            if path is not None:
+                return walk, path
+        return None
+
+    def _worker(self, index: int):
+        while True:
+            with self._cond:
+                item = self._next(index)
+                while item is None:
+                    self._cond.wait()
+                    item = self._next(index)
+            walk, path = item
+            try:
+                entries = _list_dir(path)
+                subdirs = walk.subdirs_of(entries)
+                if subdirs:
+                    with self._cond:
+                        if not walk.finished:
+                            walk.pending += len(subdirs)
+                            walk.deques[index].extend(subdirs)
+                            self._cond.notify(len(subdirs))
+                value = walk.process(path, entries)
+            except Exception as e:
+                with self._cond:
+                    if walk.error is None:
+                        walk.error = e
+                    self._finish(walk)
+                continue
+            with self._cond:
+                if walk.finished:
+                    continue
+                walk.results.put((path, value))
+                walk.pending -= 1
+                if walk.pending == 0:
+                    self._finish(walk)
@@ -0,0 +1,362 @@
+"""
+Vigilancia opcional de las raíces de las colecciones (FE, TS, TEMP, UPDATES_TOSEC).
+
+Las colecciones cambian también desde fuera de la aplicación (Explorer, rsync...).
+El vigilante aplica esos cambios de forma incremental al scanner (catálogo y caché
+de listados/conteos) para que /api/browse no necesite un re-escaneo completo:
+
+- inotify (Linux): eventos de creación/borrado/renombrado por archivo, vía ctypes.
+- Sondeo (resto de sistemas o si inotify no está disponible): compara periódicamente
+  el mtime de todas las carpetas y re-sincroniza las que han cambiado.
+
+Si inotify falla ya en marcha (p. ej. se agota fs.inotify.max_user_watches al aparecer
+carpetas nuevas) el vigilante no se detiene: anota el error, pasa a sondeo y re-sincroniza
+las raíces completas (los eventos de ese momento se han perdido).
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set
+
+# Constantes de <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _walk_dirs(root: str):
+    """Itera todas las carpetas bajo 'root' (incluida) sin seguir enlaces"""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        yield current
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except (PermissionError, OSError):
+            continue
+
+
+class _InotifyBackend:
+    """Vigilancia con inotify: un watch por carpeta, añadidos según aparecen carpetas nuevas"""
+
+    name = 'inotify'
+
+    def __init__(self, watcher: 'CollectionWatcher'):
+        self.watcher = watcher
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falló')
+        self._wd_to_path: Dict[int, str] = {}
+
+    def _add_watch(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == 28:  # ENOSPC: se agotó fs.inotify.max_user_watches
+                raise OSError(err, 'Límite de inotify alcanzado (fs.inotify.max_user_watches)')
+            return False
+        self._wd_to_path[wd] = path
+        return True
+
+    def _add_tree(self, root: str):
+        for folder in _walk_dirs(root):
+            self._add_watch(folder)
+
+    def _forget_tree(self, path: str):
+        prefix = path.rstrip(os.sep) + os.sep
+        for wd, watched in list(self._wd_to_path.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._wd_to_path.pop(wd, None)
+
+    def start(self, roots: List[str]):
+        for root in roots:
+            self._add_tree(root)
+
+    @property
+    def watched_dirs(self) -> int:
+        return len(self._wd_to_path)
+
+    def poll(self, timeout: float) -> bool:
+        """Lee los eventos pendientes y los entrega al vigilante. Devuelve False si no hubo eventos"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Se perdieron eventos: re-sincronizar las raíces completas
+                for root in self.watcher.roots:
+                    self.watcher.record(root, is_dir=True)
+                continue
+            if mask & IN_IGNORED:
+                self._wd_to_path.pop(wd, None)
+                continue
+
+            folder = self._wd_to_path.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            is_dir = bool(mask & IN_ISDIR)
+
+            if is_dir:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self._forget_tree(path)
+                elif not mask & IN_DELETE:
+                    continue  # cambio de atributos de la carpeta: no altera listados ni conteos
+            self.watcher.record(path, is_dir=is_dir)
+        return True
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _PollingBackend:
+    """Vigilancia por sondeo: compara el mtime de cada carpeta con el de la pasada anterior"""
+
+    name = 'polling'
+
+    def __init__(self, watcher: 'CollectionWatcher'):
+        self.watcher = watcher
+        self._mtimes: Dict[str, float] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._last_poll = 0.0
+
+    def _snapshot_tree(self, root: str):
+        """Registra 'root' y todas sus subcarpetas con su mtime actual"""
+        for folder in _walk_dirs(root):
+            try:
+                self._mtimes[folder] = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            parent = os.path.dirname(folder)
+            if folder != root or parent in self._mtimes:
+                self._children.setdefault(parent, set()).add(folder)
+
+    def _forget_tree(self, path: str):
+        for child in self._children.pop(path, set()):
+            self._forget_tree(child)
+        self._mtimes.pop(path, None)
+
+    def start(self, roots: List[str]):
+        for root in roots:
+            self._snapshot_tree(root)
+        self._last_poll = time.time()
+
+    @property
+    def watched_dirs(self) -> int:
+        return len(self._mtimes)
+
+    def poll(self, timeout: float) -> bool:
+        wait = self.watcher.poll_interval - (time.time() - self._last_poll)
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            return False
+        self._last_poll = time.time()
+
+        changed = False
+        for folder, old_mtime in list(self._mtimes.items()):
+            if folder not in self._mtimes:
+                continue  # olvidada durante esta misma pasada
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue  # la carpeta padre detectará el borrado
+            if mtime == old_mtime:
+                continue
+
+            self._mtimes[folder] = mtime
+            changed = True
+            # Actualizar la lista de subcarpetas conocidas
+            try:
+                with os.scandir(folder) as it:
+                    current = {e.path for e in it if e.is_dir(follow_symlinks=False)}
+            except OSError:
+                current = set()
+            known = self._children.get(folder, set())
+            for gone in known - current:
+                self._forget_tree(gone)
+            for new in current - known:
+                self._snapshot_tree(new)
+                self._children.setdefault(folder, set()).add(new)
+            self._children[folder] = current
+            self.watcher.record_folder(folder)
+        return changed
+
+    def close(self):
+        self._mtimes.clear()
+        self._children.clear()
+
+
+class CollectionWatcher:
+    """Vigila las raíces de las colecciones y aplica los cambios externos al scanner"""
+
+    def __init__(self, scanner, roots: List[str], mode: str = 'auto', poll_interval: float = 10.0, debounce: float = 0.5):
+        self.scanner = scanner
+        self.roots = [os.path.normpath(r) for r in roots if r and os.path.isdir(r)]
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.backend = None
+        self.error: Optional[str] = None
+        self.events = 0
+        self.flushes = 0
+        self.last_event: Optional[float] = None
+        self._pending_paths: Set[str] = set()
+        self._pending_dirs: Set[str] = set()
+        self._pending_folders: Set[str] = set()
+        self._pending_since: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _create_backend(self):
+        if self.mode in ('auto', 'inotify') and sys.platform.startswith('linux'):
+            try:
+                backend = _InotifyBackend(self)
+                backend.start(self.roots)
+                return backend
+            except (OSError, AttributeError) as e:
+                if self.mode == 'inotify':
+                    raise
+                print(f"[WATCHER] inotify no disponible ({e}), usando sondeo")
+        backend = _PollingBackend(self)
+        backend.start(self.roots)
+        return backend
+
+    def record(self, path: str, is_dir: bool = False):
+        """Anota un cambio de una ruta concreta (se aplica agrupado tras 'debounce' segundos)"""
+        with self._lock:
+            (self._pending_dirs if is_dir else self._pending_paths).add(path)
+            self._mark_pending()
+
+    def record_folder(self, folder: str):
+        """Anota que cambió el contenido de una carpeta sin saber qué entradas"""
+        with self._lock:
+            self._pending_folders.add(folder)
+            self._mark_pending()
+
+    def _mark_pending(self):
+        self.events += 1
+        self.last_event = time.time()
+        if self._pending_since is None:
+            self._pending_since = self.last_event
+
+    def _flush(self, force: bool = False):
+        with self._lock:
+            if self._pending_since is None:
+                return
+            if not force and time.time() - self._pending_since < self.debounce:
+                return
+            paths, dirs, folders = self._pending_paths, self._pending_dirs, self._pending_folders
+            self._pending_paths, self._pending_dirs, self._pending_folders = set(), set(), set()
+            self._pending_since = None
+
+        try:
+            if paths:
+                self.scanner.notify_changes(sorted(paths))
+            if dirs:
+                self.scanner.notify_changes(sorted(dirs), recursive=True)
+            if folders:
+                self.scanner.notify_folders_changed(sorted(folders))
+            self.flushes += 1
+        except Exception as e:
+            print(f"[WATCHER] Error aplicando cambios: {e}")
+
+    def _run(self):
+        try:
+            self.backend = self._create_backend()
+            print(f"[WATCHER] Vigilando {self.backend.watched_dirs} carpetas con {self.backend.name}")
+        except Exception as e:
+            self.error = str(e)
+            print(f"[WATCHER] No se pudo iniciar: {e}")
+            return
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.backend.poll(timeout=self.debounce)
+                except Exception as e:
+                    self._backend_failed(e)
+                self._flush()
+            self._flush(force=True)
+        finally:
+            self.backend.close()
+
+    def _backend_failed(self, error: Exception):
+        """El backend falló en marcha: pasar a sondeo (o reintentar si ya es sondeo) en lugar de parar"""
+        self.error = f"{self.backend.name}: {error}"
+        if isinstance(self.backend, _PollingBackend):
+            print(f"[WATCHER] Error en el sondeo: {error}")
+            self._stop.wait(self.debounce)
+            return
+        print(f"[WATCHER] Error en {self.backend.name} ({error}), usando sondeo")
+        self.backend.close()
+        backend = _PollingBackend(self)
+        backend.start(self.roots)
+        self.backend = backend
+        # Los eventos del momento del fallo se han perdido: re-sincronizar las raíces completas
+        for root in self.roots:
+            self.record(root, is_dir=True)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='collection-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'backend': self.backend.name if self.backend else None,
+            'roots': self.roots,
+            'watched_dirs': self.backend.watched_dirs if self.backend else 0,
+            'events': self.events,
+            'flushes': self.flushes,
+            'last_event': self.last_event,
+            'error': self.error
+        }